@@ -0,0 +1,83 @@
+import asyncio
+import traceback
+from concurrent.futures import Executor
+from typing import Callable
+
+from .ExceptionHandling import reroute_exceptions
+
+
+def _describe_context(context: dict) -> str:
+    """
+    Text about where an asyncio-exception happened (task, future, callback, ...)
+    :param context: Context passed to the loop's exception-handler
+    :return:
+    """
+    lines = [f"Asyncio exception: {context.get('message', 'Unhandled exception in event loop')}"]
+
+    task = context.get("task") or context.get("future")
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        lines.append(f"Task: {task.get_name()} ({getattr(coro, '__qualname__', coro)})")
+    elif task is not None:
+        lines.append(f"Future: {task!r}")
+
+    for key in ("handle", "protocol", "transport", "socket", "asyncgen"):
+        if key in context:
+            lines.append(f"{key.capitalize()}: {context[key]!r}")
+
+    source_traceback = context.get("source_traceback") or getattr(task, "_source_traceback", None)
+    if source_traceback:    # Only available in debug-mode
+        lines.append("Created at (most recent call last):")
+        lines.append("".join(traceback.format_list(source_traceback)).rstrip())
+
+    return "\n".join(lines) + "\n"
+
+
+def reroute_asyncio_exceptions(
+        catch: Callable = None,
+        loop: asyncio.AbstractEventLoop = None,
+        *,
+        in_executor: bool = True,
+        executor: Executor = None,
+        call_default_handler: bool = False,
+) -> Callable:
+    """
+    Catch exceptions the event-loop can't pass to anyone (tasks that were never awaited, failing callbacks, ...) and log them.
+    Call this inside the running loop, e.g. at the start of your main coroutine:
+
+        async def main():
+            sgl.reroute_asyncio_exceptions(catch)
+            ...
+
+    :param catch: The function returned by reroute_exceptions or Configs.exceptions_to_file. If None, reroute_exceptions is set up for the root-logger (without hooking anything else)
+    :param loop: The loop to hook. Defaults to the running loop
+    :param in_executor: True, if catch (and so the crash-log) should run in an executor, so the loop doesn't need to wait for it
+    :param executor: Executor to use. Defaults to the loop's default executor
+    :param call_default_handler: True, if asyncio's default handler should still be called (it prints the exception to stderr)
+    :return: The exception-handler that was installed
+    """
+    if catch is None:
+        catch = reroute_exceptions(include_main_thread=False, include_threads=False, include_tkinter=False)
+
+    if loop is None:
+        loop = asyncio.get_running_loop()
+
+    def exception_handler(loop: asyncio.AbstractEventLoop, context: dict):
+        exception = context.get("exception")
+
+        if call_default_handler or exception is None:
+            loop.default_exception_handler(context)
+
+        if exception is None:
+            return  # Nothing to log, e.g. "Task was destroyed but it is pending!"
+
+        args = (type(exception), exception, exception.__traceback__, _describe_context(context))
+
+        if in_executor and not loop.is_closed():
+            loop.run_in_executor(executor, catch, *args)
+        else:
+            catch(*args)
+
+    loop.set_exception_handler(exception_handler)
+    return exception_handler
+
@@ -0,0 +1,70 @@
+import atexit
+import queue
+import threading
+import traceback
+from typing import Callable
+
+
+class BackgroundWriter:
+
+    def __init__(self, max_queue: int = 64, name: str = "SwiftGUI_Logging-Writer"):
+        """
+        A single thread that executes jobs (like writing crash-logs) in the order they were submitted.
+        The submitting thread doesn't need to wait for the job to finish.
+
+        All remaining jobs are executed when the interpreter exits.
+
+        :param max_queue: How many jobs may wait at once. If the queue is full, submitting waits until there is space again, so memory stays bounded
+        :param name: Name of the thread
+        """
+        self._queue = queue.Queue(max_queue)
+        self._name = name
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        atexit.register(self.join)
+
+    def _start(self):
+        """
+        Start the thread, if it isn't running yet
+        :return:
+        """
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            function, args = self._queue.get()
+            try:
+                function(*args)
+            except Exception:
+                traceback.print_exc()   # Logging this could cause the same error again
+            finally:
+                self._queue.task_done()
+
+    def submit(self, function: Callable, *args):
+        """
+        Execute function(*args) on the writer-thread
+        :param function:
+        :param args:
+        :return:
+        """
+        if threading.current_thread() is self._thread:
+            function(*args)     # Waiting for yourself would never end
+            return
+
+        self._start()
+        self._queue.put((function, args))
+
+    def join(self):
+        """
+        Wait until every submitted job is done
+        :return:
+        """
+        if threading.current_thread() is self._thread or self._thread is None:
+            return
+
+        self._queue.join()
+
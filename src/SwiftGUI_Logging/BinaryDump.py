@@ -0,0 +1,598 @@
+import functools
+import logging
+import operator
+import os
+import re
+import struct
+import sys
+from datetime import datetime as dt
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .Retention import CrashLogRetention
+    from .CrashArchive import CrashIndex
+    from .CollectorShipping import CrashDumpShipper
+
+from .CrashFileHandler import CrashFileHandler, _record_formatter, _open_dump, _read_dump
+from .MemoryHandlerRotatingBuffer import _lazy_record_defaults, _start_time
+
+# File-layout: A sequence of entries, each starting with its kind.
+#   Magic: Starts a dump. All ids defined before are forgotten (a file may contain multiple dumps)
+#   Format: formatter-format, datefmt and start-time of the process that wrote the dump
+#   String: Text that gets the next free string-id
+#   Source: Where a record comes from (logger, level, message, code-location, thread, process). Gets the next free source-id
+#   Record: time, source-id, args, then exception- and stack-text if there are any
+# Everything that is the same for a lot of records is only written once per dump, so a record only takes up a few bytes.
+_MAGIC = b"SGLDUMP1"
+_KIND_STRING = 1
+_KIND_RECORD = 2
+_KIND_FORMAT = 3
+_KIND_SOURCE = 4
+_KIND_MAGIC = _MAGIC[0]
+
+_LENGTH = struct.Struct("<I")
+_FORMAT = struct.Struct("<BIId")     # kind, length of format, length of datefmt, start-time
+_STRING = struct.Struct("<BI")  # kind, length
+_SOURCE = struct.Struct("<BHIQIIIIIII")  # kind, levelno, lineno, thread, process, ids of name, msg, pathname, funcName, threadName, processName
+_RECORD = struct.Struct("<BdIBB")   # kind, created, source-id, flags, arg-count
+
+# Flags of a record
+_MAPPING_ARGS = 1   # args is a dict, saved as pairs of key and value
+_HAS_EXC_TEXT = 2
+_HAS_STACK_INFO = 4
+
+# A single argument: type and length, then the data
+_ARG = struct.Struct("<BH")
+_ARG_INT64 = struct.Struct("<BHq")
+_ARG_FLOAT64 = struct.Struct("<BHd")
+_INT64 = struct.Struct("<q")
+_FLOAT64 = struct.Struct("<d")
+_ARG_STR = 0
+_ARG_INT = 1    # As text, for ints that don't fit into 64 bits
+_ARG_FLOAT = 2
+_ARG_REPR = 3
+_ARG_INT_64 = 4
+_MAX_ARG_LENGTH = 0xFFFF    # Longer arguments are cut off
+_MAX_ARGS = 0xFF
+
+_NATIVE_ARGS = (str, int, float)  # Saved as they are, everything else is converted like the message's placeholder would
+
+# A placeholder of a %-style message: key, "*" for width and precision, conversion
+_placeholder = re.compile(r"%(?:\((?P<key>[^)]*)\))?[#0+ -]*(?P<width>\*|\d+)?(?:\.(?P<precision>\*|\d+))?[hlL]?(?P<conversion>[diouxXeEfFgGcrsa%])")
+
+_get_source = operator.itemgetter("levelno", "lineno", "thread", "process", "name", "msg", "pathname", "funcName", "threadName", "processName")
+_get_texts = operator.itemgetter("exc_info", "exc_text", "stack_info")
+
+class _ReprArg:
+    """
+    Stands in for an argument that was saved as its repr
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    __repr__ = __str__
+
+
+@functools.lru_cache(maxsize=1024)
+def _conversions(msg: str) -> tuple[tuple[str, ...], dict[str, str]]:
+    """
+    Conversion of every placeholder in a %-style message.
+    :param msg:
+    :return: (conversions of positional arguments in order, key: conversion for mapping-arguments)
+    """
+    positional = []
+    mapping = dict()
+    for match in _placeholder.finditer(msg):
+        key, width, precision, conversion = match.group("key", "width", "precision", "conversion")
+        if conversion == "%":
+            continue
+        if key is not None:
+            mapping[key] = conversion
+            continue
+
+        positional.extend("d" for star in (width, precision) if star == "*")  # Takes an int-argument itself
+        positional.append(conversion)
+
+    return tuple(positional), mapping
+
+
+def _encode_arg(arg, conversion: str = "r") -> bytes:
+    """
+    Encode a single argument.
+    str, int and float are saved as they are.
+    Other objects are converted the way the placeholder they are used for would convert them (str for %s, int for %d, ...).
+    :param arg:
+    :param conversion: Conversion-character of the placeholder
+    :return:
+    """
+    arg_type = type(arg)
+    if arg_type is str:
+        data = arg.encode("utf-8", "replace")[:_MAX_ARG_LENGTH]
+        return _ARG.pack(_ARG_STR, len(data)) + data
+    if arg_type is int:
+        try:
+            return _ARG_INT64.pack(_ARG_INT_64, 8, arg)
+        except struct.error:
+            data = repr(arg).encode()[:_MAX_ARG_LENGTH]
+            return _ARG.pack(_ARG_INT, len(data)) + data
+    if arg_type is float:
+        return _ARG_FLOAT64.pack(_ARG_FLOAT, 8, arg)
+
+    try:
+        if conversion in "diouxXc":
+            return _encode_arg(int(arg))
+        if conversion in "eEfFgG":
+            return _encode_arg(float(arg))
+        if conversion == "s":
+            return _encode_arg(str(arg))
+
+        text = ascii(arg) if conversion == "a" else repr(arg)
+    except Exception:
+        try:
+            text = repr(arg)
+        except Exception:
+            text = f"<unrepresentable {arg_type.__qualname__}>"
+    data = text.encode("utf-8", "replace")[:_MAX_ARG_LENGTH]
+    return _ARG.pack(_ARG_REPR, len(data)) + data
+
+
+def _encode_args(msg, args: tuple) -> bytes:
+    """
+    Encode positional arguments. The message is only parsed if an argument isn't str, int or float
+    """
+    conversions = None
+    parts = []
+    for i, arg in enumerate(args):
+        if type(arg) in _NATIVE_ARGS:
+            parts.append(_encode_arg(arg))
+            continue
+
+        if conversions is None:
+            conversions = _conversions(str(msg))[0]
+        parts.append(_encode_arg(arg, conversions[i] if i < len(conversions) else "r"))
+
+    return b"".join(parts)
+
+
+def _encode_mapping_args(msg, args: list[tuple]) -> bytes:
+    """
+    Encode mapping-arguments as key, value, key, value, ...
+    """
+    conversions = None
+    parts = []
+    for key, value in args:
+        parts.append(_encode_arg(key))
+        if type(value) in _NATIVE_ARGS:
+            parts.append(_encode_arg(value))
+            continue
+
+        if conversions is None:
+            conversions = _conversions(str(msg))[1]
+        parts.append(_encode_arg(value, conversions.get(key, "r")))
+
+    return b"".join(parts)
+
+
+def _decode_arg(arg_type: int, data: bytes):
+    if arg_type == _ARG_STR:
+        return data.decode("utf-8", "replace")
+    if arg_type == _ARG_INT_64:
+        return _INT64.unpack(data)[0]
+    if arg_type == _ARG_FLOAT:
+        return _FLOAT64.unpack(data)[0]
+
+    text = data.decode("utf-8", "replace")
+    if arg_type == _ARG_INT:
+        try:
+            return int(text)
+        except ValueError:
+            pass
+    return _ReprArg(text)
+
+
+class BinaryCrashFileHandler(CrashFileHandler):
+
+    def __init__(
+            self,
+            filepath: str | Path,
+            datetime_format: str = "_%Y-%m-%d_%H-%M-%S",
+            batch_size: int = 1000,
+            compression: str = None,
+            retention: "CrashLogRetention" = None,
+            index: "CrashIndex" = None,
+            shipper: "CrashDumpShipper" = None,
+    ):
+        """
+        Same as CrashFileHandler, but writes a binary dump instead of text.
+        Records aren't formatted, only their fields are copied into the file, which is a lot less work at crash-time.
+        Logger-names, messages and such are only written once per file.
+
+        Turn the file back into text with render_binary_dump, or from the command line:
+            python -m SwiftGUI_Logging render <file>
+
+        :param filepath: Path to the file WITHOUT THE TIMESTAMP. The timestamp is added at the end before the suffix
+        :param datetime_format: Format of the timestamp that extends the filename
+        :param batch_size: How many encoded records are collected before writing them to the file
+        :param compression: None, "gzip" or "lzma". The file is compressed while it's written and gets an additional suffix (.gz/.xz)
+        :param retention: Finished files are reported to it, so old ones can be deleted
+        :param index: Crash-records (at or above the index's level) are added to it, with the file and their position in it
+        :param shipper: Finished files are passed to it, so they are sent to a collector
+        """
+        super().__init__(filepath, datetime_format, batch_size, compression, retention, index, shipper)
+
+        # Ids that were already written to the current file
+        self._strings: dict[str, int] = dict()
+        self._sources: dict[tuple, int] = dict()
+
+    def _open_file(self):
+        self._file_path = self._dump_path()
+        self._file = _open_dump(self._file_path, "ab", self.compression)
+        self._strings.clear()
+        self._sources.clear()
+
+        # Save the format, so the dump can be rendered like a normal crash-file
+        formatter = self.formatter or logging._defaultFormatter
+        fmt = (formatter._fmt or "").encode("utf-8", "replace")
+        datefmt = (formatter.datefmt or "").encode("utf-8", "replace")
+        self._batch.append(_MAGIC + _FORMAT.pack(_KIND_FORMAT, len(fmt), len(datefmt), _start_time) + fmt + datefmt)
+
+    def _string_id(self, text) -> int:
+        """
+        Id of a string. New strings are added to the batch
+        :param text:
+        :return:
+        """
+        text = str(text)
+        strings = self._strings
+        string_id = strings.get(text)
+        if string_id is None:
+            string_id = strings[text] = len(strings)
+            data = text.encode("utf-8", "replace")
+            self._batch.append(_STRING.pack(_KIND_STRING, len(data)) + data)
+        return string_id
+
+    def _source_id(self, source: tuple) -> int:
+        """
+        Id of a source (see _get_source). New sources are added to the batch
+        """
+        levelno, lineno, thread, process, *texts = source
+        string_id = self._string_id
+        entry = _SOURCE.pack(_KIND_SOURCE, levelno, lineno or 0, thread or 0, process or 0, *map(string_id, texts))
+
+        source_id = self._sources[source] = len(self._sources)
+        self._batch.append(entry)
+        return source_id
+
+    def _encode(self, record: logging.LogRecord) -> bytes:
+        """
+        Turn the record into bytes.
+        Strings and sources are added to the batch as a side effect, so the returned bytes must be added to the batch right after
+        :param record:
+        :return:
+        """
+        d = record.__dict__
+
+        source = _get_source(d)
+        try:
+            source_id = self._sources.get(source)
+        except TypeError:   # Unhashable message
+            source = source[:5] + (str(source[5]),) + source[6:]
+            source_id = self._sources.get(source)
+        if source_id is None:
+            source_id = self._source_id(source)
+
+        flags = 0
+        args = d["args"]
+        if not args:
+            encoded_args = b""
+            arg_count = 0
+        elif isinstance(args, dict):
+            args = list(args.items())[:_MAX_ARGS // 2]
+            encoded_args = _encode_mapping_args(d["msg"], args)
+            arg_count = len(args) * 2
+            flags = _MAPPING_ARGS
+        elif len(args) == 1 and type(args[0]) in _NATIVE_ARGS:
+            encoded_args = _encode_arg(args[0])
+            arg_count = 1
+        else:
+            args = args[:_MAX_ARGS]
+            encoded_args = _encode_args(d["msg"], args)
+            arg_count = len(args)
+
+        exc_info, exc_text, stack_info = _get_texts(d)
+        if not (exc_info or exc_text or stack_info):
+            return _RECORD.pack(_KIND_RECORD, d["created"], source_id, flags, arg_count) + encoded_args
+
+        if exc_info and not exc_text:
+            exc_text = record.exc_text = logging._defaultFormatter.formatException(exc_info)
+
+        texts = b""
+        for flag, text in ((_HAS_EXC_TEXT, exc_text), (_HAS_STACK_INFO, stack_info)):
+            if text:
+                flags |= flag
+                data = text.encode("utf-8", "replace")
+                texts += _LENGTH.pack(len(data)) + data
+
+        return _RECORD.pack(_KIND_RECORD, d["created"], source_id, flags, arg_count) + encoded_args + texts
+
+    def emit(self, record):
+        try:
+            if self._file is None:
+                self._open_file()
+
+            if self.index is not None and record.levelno >= self.index.level:
+                self._add_to_index(record)
+
+            self._batch.append(self._encode(record))
+
+            if len(self._batch) >= self.batch_size:
+                self._write_batch()
+        except Exception:
+            self.handleError(record)
+
+    def handle_batch(self, records: Iterable[logging.LogRecord]):
+        """
+        Write a lot of records at once, only acquiring the lock once
+        :param records:
+        :return:
+        """
+        self.acquire()
+        try:
+            batch = self._batch
+            batch_size = self.batch_size
+            filters = self.filters
+            encode = self._encode
+            index_level = self.index.level if self.index is not None else None
+
+            for record in records:
+                if filters and not self.filter(record):
+                    continue
+
+                try:
+                    if self._file is None:
+                        self._open_file()
+
+                    if index_level is not None and record.levelno >= index_level:
+                        self._add_to_index(record)
+
+                    batch.append(encode(record))
+
+                    if len(batch) >= batch_size:
+                        self._write_batch()
+                except Exception:
+                    self.handleError(record)
+        finally:
+            self.release()
+
+
+def _read_exactly(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise EOFError("The dump ends in the middle of an entry")
+    return data
+
+
+def _logger_matches(name: str, loggers: tuple[str, ...]) -> bool:
+    for logger in loggers:
+        if not logger or name == logger or name.startswith(logger + "."):
+            return True
+    return False
+
+
+def _message(msg: str, args) -> tuple[str, tuple | dict | None]:
+    """
+    msg and args to put into a decoded record.
+    If the saved args don't fit the message anymore (e.g. %d with an arg that was saved as its repr), they are added to the message instead
+    """
+    if not args:
+        return msg, None
+
+    try:
+        msg % args
+        return msg, args
+    except Exception:
+        if isinstance(args, dict):
+            args = args.values()
+        return f"{msg} (args: {', '.join(map(repr, args))})", None
+
+
+def iter_binary_dump(
+        filepath: str | Path,
+        *,
+        level: int | str = None,
+        loggers: Iterable[str] = None,
+        since: float | dt = None,
+        until: float | dt = None,
+) -> Iterator[logging.LogRecord]:
+    """
+    Read the records of a binary dump, one after another.
+    The file is streamed, so it doesn't need to fit into memory.
+    Records that are filtered out are skipped without decoding them.
+
+    :param filepath: The binary dump
+    :param level: Only records at or above this level
+    :param loggers: Only records of these loggers (and their children)
+    :param since: Only records created at or after this time (datetime or timestamp)
+    :param until: Only records created at or before this time (datetime or timestamp)
+    :return:
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown level {level}")
+    level = level or 0
+
+    loggers = tuple(loggers) if loggers else None
+    since = since.timestamp() if isinstance(since, dt) else since
+    until = until.timestamp() if isinstance(until, dt) else until
+
+    strings: list[str] = []
+    sources: list[dict] = []     # Attributes of the records, ready to be put into their __dict__
+    sources_wanted: list[bool] = []     # False, if the level or logger of the source is filtered out
+    start_time = 0.0
+
+    with _read_dump(filepath) as file:
+        while True:
+            kind_data = file.read(1)
+            if not kind_data:
+                return
+
+            kind = kind_data[0]
+
+            if kind == _KIND_RECORD:
+                _, created, source_id, flags, arg_count = _RECORD.unpack(kind_data + _read_exactly(file, _RECORD.size - 1))
+
+                if (
+                        not sources_wanted[source_id]
+                        or (since is not None and created < since)
+                        or (until is not None and created > until)
+                ):
+                    for _ in range(arg_count):
+                        _, length = _ARG.unpack(_read_exactly(file, _ARG.size))
+                        file.seek(length, os.SEEK_CUR)
+                    for flag in (_HAS_EXC_TEXT, _HAS_STACK_INFO):
+                        if flags & flag:
+                            length, = _LENGTH.unpack(_read_exactly(file, _LENGTH.size))
+                            file.seek(length, os.SEEK_CUR)
+                    continue
+
+                args = []
+                for _ in range(arg_count):
+                    arg_type, length = _ARG.unpack(_read_exactly(file, _ARG.size))
+                    args.append(_decode_arg(arg_type, _read_exactly(file, length)))
+
+                texts = []
+                for flag in (_HAS_EXC_TEXT, _HAS_STACK_INFO):
+                    text = None
+                    if flags & flag:
+                        length, = _LENGTH.unpack(_read_exactly(file, _LENGTH.size))
+                        text = _read_exactly(file, length).decode("utf-8", "replace")
+                    texts.append(text)
+
+                if flags & _MAPPING_ARGS:
+                    args = dict(zip(args[::2], args[1::2]))
+                else:
+                    args = tuple(args)
+
+                source = sources[source_id]
+                msg, args = _message(source["msg"], args)
+
+                # Filling the __dict__ directly skips all the lookups LogRecord.__init__ would do
+                record = logging.LogRecord.__new__(logging.LogRecord)
+                d = record.__dict__
+                d.update(_lazy_record_defaults)
+                d.update(source)
+                d.update(
+                    msg=msg,
+                    args=args,
+                    created=created,
+                    msecs=int((created - int(created)) * 1000) + 0.0,
+                    relativeCreated=(created - start_time) * 1000,
+                    exc_text=texts[0],
+                    stack_info=texts[1],
+                )
+                yield record
+
+            elif kind == _KIND_STRING:
+                length, = _LENGTH.unpack(_read_exactly(file, _LENGTH.size))
+                strings.append(_read_exactly(file, length).decode("utf-8", "replace"))
+
+            elif kind == _KIND_SOURCE:
+                (
+                    _, levelno, lineno, thread, process, name, msg, pathname, func_name, thread_name, process_name,
+                ) = _SOURCE.unpack(kind_data + _read_exactly(file, _SOURCE.size - 1))
+                name = strings[name]
+                pathname = strings[pathname]
+                filename = os.path.basename(pathname)
+
+                sources.append({
+                    "name": name,
+                    "msg": strings[msg],
+                    "levelno": levelno,
+                    "levelname": logging.getLevelName(levelno),
+                    "pathname": pathname,
+                    "filename": filename,
+                    "module": os.path.splitext(filename)[0],
+                    "lineno": lineno,
+                    "funcName": strings[func_name],
+                    "thread": thread,
+                    "threadName": strings[thread_name],
+                    "process": process,
+                    "processName": strings[process_name],
+                })
+                sources_wanted.append(levelno >= level and (loggers is None or _logger_matches(name, loggers)))
+
+            elif kind == _KIND_MAGIC:
+                if kind_data + file.read(len(_MAGIC) - 1) != _MAGIC:
+                    raise ValueError("Not a SwiftGUI_Logging binary dump")
+                strings.clear()
+                sources.clear()
+                sources_wanted.clear()
+
+            elif kind == _KIND_FORMAT:
+                _, fmt_length, datefmt_length, start_time = _FORMAT.unpack(kind_data + _read_exactly(file, _FORMAT.size - 1))
+                file.seek(fmt_length + datefmt_length, os.SEEK_CUR)
+
+            else:
+                raise ValueError(f"Unknown entry {kind} in binary dump, the file might be damaged")
+
+
+def binary_dump_format(filepath: str | Path) -> tuple[str | None, str | None]:
+    """
+    Formatter-format and datefmt the dump was written with
+    :param filepath:
+    :return: (None, None) if the dump doesn't contain a format
+    """
+    with _read_dump(filepath) as file:
+        header = file.read(len(_MAGIC) + _FORMAT.size)
+        if len(header) < len(_MAGIC) + _FORMAT.size or not header.startswith(_MAGIC) or header[len(_MAGIC)] != _KIND_FORMAT:
+            return None, None
+
+        _, fmt_length, datefmt_length, _ = _FORMAT.unpack_from(header, len(_MAGIC))
+        fmt = file.read(fmt_length).decode("utf-8")
+        datefmt = file.read(datefmt_length).decode("utf-8")
+
+    return fmt or None, datefmt or None
+
+
+def render_binary_dump(
+        filepath: str | Path,
+        output: TextIO = None,
+        fmt: str = None,
+        datefmt: str = None,
+        **filters,
+) -> int:
+    """
+    Write a binary dump as text, like CrashFileHandler would have.
+
+    :param filepath: The binary dump
+    :param output: Where to write the text. Defaults to stdout
+    :param fmt: Format of the records. Defaults to the format the dump was written with
+    :param datefmt: Format of asctime. Defaults to the one the dump was written with
+    :param filters: level, loggers, since, until. See iter_binary_dump
+    :return: How many records were written
+    """
+    if output is None:
+        output = sys.stdout
+
+    saved_fmt, saved_datefmt = binary_dump_format(filepath)
+    format_record = _record_formatter(logging.Formatter(fmt or saved_fmt, datefmt or saved_datefmt))
+
+    count = 0
+    batch = []
+    for record in iter_binary_dump(filepath, **filters):
+        batch.append(format_record(record) + "\n")
+        count += 1
+
+        if len(batch) >= 1000:
+            output.writelines(batch)
+            batch.clear()
+
+    output.writelines(batch)
+    return count
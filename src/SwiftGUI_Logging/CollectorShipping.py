@@ -0,0 +1,365 @@
+import gzip
+import http.client
+import os
+import shutil
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# A batch is _BATCH_MAGIC, followed by (_ENTRY, name, data) for every dump.
+# Over HTTP it is the body of a POST (Content-Encoding: gzip, if compressed).
+# Over TCP every batch is (_TCP_HEADER, batch), the collector answers every batch with _TCP_ACK.
+_BATCH_MAGIC = b"SGLSHIP1"
+_ENTRY = struct.Struct("<HI")    # Length of the name, length of the data
+_TCP_HEADER = struct.Struct("<BQ")   # Compressed (0/1), length of the batch
+_TCP_ACK = b"\x06"
+
+_SPOOL_SUFFIX = ".spool"
+
+
+def encode_crash_batch(dumps: list[tuple[str, bytes]], compress: bool = True) -> bytes:
+    """
+    Pack multiple dumps into a single batch
+    :param dumps: (filename, content) of every dump
+    :param compress: True, if the batch should be gzipped
+    :return:
+    """
+    parts = [_BATCH_MAGIC]
+    for name, data in dumps:
+        name = name.encode("utf-8", "replace")
+        parts.append(_ENTRY.pack(len(name), len(data)))
+        parts.append(name)
+        parts.append(data)
+
+    batch = b"".join(parts)
+    return gzip.compress(batch, compresslevel=6) if compress else batch
+
+
+def decode_crash_batch(batch: bytes, compressed: bool = True) -> list[tuple[str, bytes]]:
+    """
+    Unpack a batch from encode_crash_batch, e.g. on the collector
+    :param batch:
+    :param compressed: True, if the batch is gzipped
+    :return: (filename, content) of every dump
+    """
+    if compressed:
+        batch = gzip.decompress(batch)
+
+    if not batch.startswith(_BATCH_MAGIC):
+        raise ValueError("Not a crash-batch")
+
+    dumps = []
+    position = len(_BATCH_MAGIC)
+    while position < len(batch):
+        name_length, data_length = _ENTRY.unpack_from(batch, position)
+        position += _ENTRY.size
+        name = batch[position:position + name_length].decode("utf-8", "replace")
+        position += name_length
+        dumps.append((name, batch[position:position + data_length]))
+        position += data_length
+
+    return dumps
+
+
+class _Rejected(Exception):
+    """
+    The collector refused a batch. Sending it again won't help
+    """
+
+
+class CrashDumpShipper:
+
+    def __init__(
+            self,
+            url: str,
+            spool_dir: str | Path,
+            *,
+            max_spool_bytes: int = 50_000_000,
+            max_spool_files: int = 1000,
+            batch_bytes: int = 1_000_000,
+            compress: bool = True,
+            timeout: float = 10,
+            retry_delay: float = 1,
+            max_retry_delay: float = 60,
+            headers: dict[str, str] = None,
+    ):
+        """
+        Sends finished crash-files to a collector, on its own thread.
+
+        Every file is put into a spool-directory first (hard-linked if possible), which is all add does, so crash-handling never waits for the network.
+        The sender-thread packs small dumps into batches, compresses them and sends them over a connection that is kept open.
+        That's a single connection, not a pool: There is only one sender-thread, so more connections wouldn't send anything faster.
+        If the collector can't be reached, the dumps stay in the spool and are sent later (also after a restart of the program).
+        The spool is limited, the oldest dumps are dropped first.
+        Its files and bytes are counted in memory, the directory is only listed once when the shipper is created.
+
+        :param url: "http://host:port/path", "https://..." (POST) or "tcp://host:port"
+        :param spool_dir: Where dumps wait until they are sent
+        :param max_spool_bytes: Keep at most this many bytes in the spool. The newest dump is always kept
+        :param max_spool_files: Keep at most this many dumps in the spool
+        :param batch_bytes: Dumps are combined into one request until it would get larger than this (uncompressed). Larger dumps are sent on their own
+        :param compress: True, if batches should be gzipped
+        :param timeout: Seconds until a connection-attempt or request fails
+        :param retry_delay: Seconds to wait after the first failure. Doubles with every further failure
+        :param max_retry_delay: Longest wait between two attempts
+        :param headers: Additional HTTP-headers, e.g. for authentication
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https", "tcp"):
+            raise ValueError(f"Unsupported url {url!r}, use http://, https:// or tcp://")
+
+        self.url = url
+        self.spool_dir = Path(spool_dir)
+        self.max_spool_bytes = max_spool_bytes
+        self.max_spool_files = max_spool_files
+        self.batch_bytes = batch_bytes
+        self.compress = compress
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.headers = headers or dict()
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self._connection: http.client.HTTPConnection | socket.socket | None = None
+
+        # Counters, for statistics
+        self.sent = 0
+        self.dropped = 0    # Didn't fit into the spool
+        self.rejected = 0   # Refused by the collector
+        self.failures = 0   # Failed attempts, that will be repeated
+
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+        # (spool-file, bytes) of every spooled dump, oldest first
+        self._spool: deque[tuple[Path, int]] = deque()
+        self._spool_bytes = 0
+        for file in self._spooled():    # Left over from the last run
+            try:
+                size = file.stat().st_size
+            except OSError:
+                continue
+            self._spool.append((file, size))
+            self._spool_bytes += size
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+
+        if self._spool:
+            self._start()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="SwiftGUI_Logging-Shipper", daemon=True)
+            self._thread.start()
+
+    def _spooled(self) -> list[Path]:
+        """
+        All dumps in the spool-directory, oldest first. Only used once, afterwards the spool is tracked in memory
+        :return:
+        """
+        return sorted(self.spool_dir.glob("*" + _SPOOL_SUFFIX))
+
+    def add(self, path: str | Path):
+        """
+        Put a finished file into the spool and wake up the sender.
+        Only touches the local disk.
+        :param path:
+        :return:
+        """
+        path = Path(path)
+
+        with self._lock:
+            self._counter += 1
+            spooled = self.spool_dir / f"{time.time_ns():020}-{self._counter:06}-{path.name}{_SPOOL_SUFFIX}"
+            try:
+                os.link(path, spooled)  # Free, and the dump survives if retention deletes the original
+            except OSError:
+                try:
+                    shutil.copyfile(path, spooled)
+                except OSError:
+                    return
+
+            try:
+                size = spooled.stat().st_size
+            except OSError:
+                return
+            self._spool.append((spooled, size))
+            self._spool_bytes += size
+
+            self._limit_spool()
+            self._idle.clear()
+
+        self._start()
+        self._wake.set()
+
+    def _limit_spool(self):
+        """
+        Drop the oldest dumps until the spool fits its limits again.
+        Must be called with the lock
+        :return:
+        """
+        spool = self._spool
+        while len(spool) > 1 and (len(spool) > self.max_spool_files or self._spool_bytes > self.max_spool_bytes):
+            file, size = spool.popleft()
+            file.unlink(missing_ok=True)
+            self._spool_bytes -= size
+            self.dropped += 1
+
+    def _forget(self, files: set[Path]):
+        """
+        Remove sent (or vanished) dumps from the spool.
+        They are the oldest ones, unless they were dropped in the meantime
+        :param files:
+        :return:
+        """
+        with self._lock:
+            spool = self._spool
+            while spool and spool[0][0] in files:
+                _, size = spool.popleft()
+                self._spool_bytes -= size
+
+    def _next_batch(self) -> list[tuple[Path, str, bytes]]:
+        """
+        The oldest dumps that fit into one batch
+        :return: (spool-file, original filename, content)
+        """
+        with self._lock:
+            spooled = [file for file, _ in self._spool]
+
+        batch = []
+        size = 0
+        vanished = set()
+        for file in spooled:
+            try:
+                data = file.read_bytes()
+            except OSError:     # Dropped in the meantime
+                vanished.add(file)
+                continue
+
+            if batch and size + len(data) > self.batch_bytes:
+                break
+
+            name = file.name.split("-", 2)[2][:-len(_SPOOL_SUFFIX)]
+            batch.append((file, name, data))
+            size += len(data)
+
+        if vanished:
+            self._forget(vanished)
+        return batch
+
+    def _run(self):
+        delay = self.retry_delay
+
+        while not self._closed.is_set():
+            batch = self._next_batch()
+            if not batch:
+                with self._lock:    # add can't spool something in between
+                    if not self._spool:
+                        self._idle.set()
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            try:
+                self._send(encode_crash_batch([(name, data) for _, name, data in batch], self.compress), len(batch))
+            except _Rejected:
+                self.rejected += len(batch)
+            except (OSError, http.client.HTTPException):
+                self.failures += 1
+                self._disconnect()
+                self._closed.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            else:
+                self.sent += len(batch)
+
+            delay = self.retry_delay
+            for file, _, _ in batch:
+                file.unlink(missing_ok=True)
+            self._forget({file for file, _, _ in batch})
+
+        self._disconnect()
+
+    def _send(self, payload: bytes, count: int):
+        """
+        Send a batch over the open connection, open one if necessary
+        :param payload:
+        :param count: How many dumps the batch contains
+        :return:
+        """
+        if self._scheme == "tcp":
+            self._send_tcp(payload)
+        else:
+            self._send_http(payload, count)
+
+    def _send_http(self, payload: bytes, count: int):
+        if self._connection is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._connection = cls(self._host, self._port, timeout=self.timeout)
+
+        headers = {
+            "Content-Type": "application/x-swiftgui-crash-batch",
+            "X-Crash-Dumps": str(count),
+            **self.headers,
+        }
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+
+        self._connection.request("POST", self._path, body=payload, headers=headers)
+        response = self._connection.getresponse()
+        response.read()     # The connection can only be reused once the response is read
+
+        if response.will_close:
+            self._disconnect()
+
+        if 200 <= response.status < 300:
+            return
+        if 400 <= response.status < 500 and response.status not in (408, 429):
+            raise _Rejected(response.status)
+        raise http.client.HTTPException(f"Collector answered {response.status}")
+
+    def _send_tcp(self, payload: bytes):
+        if self._connection is None:
+            self._connection = socket.create_connection((self._host, self._port), timeout=self.timeout)
+
+        self._connection.sendall(_TCP_HEADER.pack(self.compress, len(payload)) + payload)
+        if self._connection.recv(1) != _TCP_ACK:
+            raise ConnectionError("Collector didn't confirm the batch")
+
+    def _disconnect(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except OSError:
+                pass
+            self._connection = None
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until the spool is empty
+        :param timeout: Seconds to wait at most
+        :return: False, if there are still dumps left
+        """
+        if self._thread is None:
+            return not self._spool
+        return self._idle.wait(timeout)
+
+    def close(self):
+        """
+        Stop the sender. Dumps that weren't sent stay in the spool for the next run
+        :return:
+        """
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout)
@@ -1,11 +1,10 @@
-from typing import Callable
+from typing import Callable, Any
 
 import SwiftGUI_Logging as sgl
 from pathlib import Path
 import logging
-from datetime import datetime as dt
-import io
-import shutil
+import glob
+import sys
 
 def exceptions_to_file(
         filepath: str | Path,
@@ -19,6 +18,28 @@ def exceptions_to_file(
         reraise: bool = False,
         datetime_format: str = "_%Y-%m-%d_%H-%M-%S",
         formatter_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        compact_buffer: bool = False,
+        buffer_bytes: int = None,
+        buffer_seconds: float = None,
+        level_buffer_sizes: dict[int, int] = None,
+        per_thread_buffers: bool = False,
+        background_writer: bool = False,
+        deduplicate_window: float = None,
+        post_trigger_records: int = None,
+        post_trigger_seconds: float = None,
+        crash_survivable: bool = False,
+        traceback_formatter: Callable = None,
+        binary_dump: bool = False,
+        compression: str = None,
+        max_files: int = None,
+        max_total_bytes: int = None,
+        max_age: float = None,
+        crash_index: bool = False,
+        stats_interval: float = None,
+        stats_report: Callable[[dict], Any] = None,
+        shared_buffer: bool = False,
+        collector_url: str = None,
+        collector_spool_bytes: int = 50_000_000,
 ) -> Callable:
     """
     Buffers the last n logging-entries.
@@ -40,8 +61,38 @@ def exceptions_to_file(
     :param reraise: True, if the exception should still be raised, even though it was logged. Good for debugging purposes
     :param datetime_format: Format of the timestamp that extends the filename
     :param formatter_format: Format of the log-entries in the file
-    :return: Returns the function that gets called with the exception-info. You may use it to add your own exception-"catching"
+    :param compact_buffer: True, if buffered records should be stored in a compact form. Uses less memory, but flushing takes a bit longer
+    :param buffer_bytes: Approximate amount of memory the buffer may take up. The oldest reports are removed once this is exceeded, even if buffer_size isn't reached yet
+    :param buffer_seconds: If provided, only reports of the last buffer_seconds seconds are kept (but still at most buffer_size), so the file doesn't contain old, unrelated reports. Can't be combined with per_thread_buffers
+    :param level_buffer_sizes: If provided, every level gets its own buffer, e.g. {logging.DEBUG: 5000, logging.INFO: 20000, logging.WARNING: 50000}. Many DEBUG-reports can't push out the important ones that way. Replaces buffer_size and can't be combined with buffer_bytes, buffer_seconds or per_thread_buffers
+    :param per_thread_buffers: True, if every thread should buffer into its own ring (buffer_size PER THREAD). Logging from many threads doesn't block each other anymore. Can't be combined with buffer_bytes
+    :param background_writer: True, if the file should be written by a separate thread, so the thread that caused the write doesn't need to wait for it. Pending writes are finished before the program exits
+    :param deduplicate_window: If provided, the same error (same exception-type and code-locations) only causes one file-write every deduplicate_window seconds. How often it was suppressed is added to the next file, or written on its own if no file follows within deduplicate_window seconds (and at exit)
+    :param post_trigger_records: If provided, the file is only written after this many more reports arrived, so it also contains what happened after the trigger. All triggers in the meantime go into the same file
+    :param post_trigger_seconds: Same as post_trigger_records, but waits this many seconds. If both are provided, whatever happens first writes the file
+    :param crash_survivable: True, if the reports should also be saved in a memory-mapped file next to the log-files. If the program is killed or crashes hard (segfault, ...), the next call of this function writes those reports to a "..._recovered"-file
+    :param traceback_formatter: Function that turns exceptions into text, e.g. a TracebackFormatter for deep or recursive stacks. Defaults to traceback.format_exception
+    :param binary_dump: True, if the files should be binary dumps instead of text. Writing them is a lot faster. The suffix of filepath is replaced by ".sgld". Turn them into text with "python -m SwiftGUI_Logging render <file>"
+    :param compression: None, "gzip" or "lzma". Files are compressed while they are written and get an additional suffix (.gz/.xz)
+    :param max_files: Keep at most this many crash-files, the oldest ones are deleted
+    :param max_total_bytes: Keep at most this many bytes of crash-files, the oldest ones are deleted
+    :param max_age: Delete crash-files that are older than this many seconds. Checked when a new file is written
+    :param crash_index: True, if every crash-record should be saved in a SQLite-database next to the files (exception-type, module, logger, file, ...), so they can be searched with CrashIndex.query or "python -m SwiftGUI_Logging query <database>"
+    :param stats_interval: If provided, statistics of the buffer (records captured/evicted, flushes, bytes written, flush-times, ...) are reported every stats_interval seconds
+    :param stats_report: Receives the statistics as a dict. If not provided, they are logged to the logger "SwiftGUI_Logging.stats"
+    :param shared_buffer: True, if all calls with shared_buffer=True should share one process-wide buffer (attached to the root-logger) and one exception-hook. Every record is only buffered once, each call only writes the reports of its own logger (and unhandled exceptions) to its own files. The buffer gets the largest buffer_size, compact_buffer, buffer_bytes and buffer_seconds are taken from the first call. The logger must propagate to the root-logger. Can't be combined with level_buffer_sizes, per_thread_buffers or post_trigger_...
+    :param collector_url: If provided, every crash-file is also sent to a collector ("http://host:port/path", "https://..." or "tcp://host:port") by a background-thread. Crash-handling never waits for it. Files that can't be sent yet wait in a spool-directory next to the files and are sent later, even after a restart
+    :param collector_spool_bytes: Maximum size of the spool-directory. The oldest unsent files are dropped first
+    :return: Returns the function that gets called with the exception-info. You may use it to add your own exception-"catching". Its attribute stats_snapshot returns the current statistics of the buffer
     """
+    # Checked before anything is created, so a wrong combination doesn't leave hooks, threads or files behind
+    if level_buffer_sizes is not None and (buffer_bytes is not None or buffer_seconds is not None or per_thread_buffers):
+        raise ValueError("level_buffer_sizes can't be combined with buffer_bytes, buffer_seconds or per_thread_buffers")
+    if per_thread_buffers and buffer_bytes is not None:
+        raise ValueError("buffer_bytes can't be combined with per_thread_buffers")
+    if per_thread_buffers and buffer_seconds is not None:
+        raise ValueError("buffer_seconds can't be combined with per_thread_buffers")
+
     filepath = Path(filepath)
     filepath.parent.mkdir(parents=True, exist_ok=True)
 
@@ -50,42 +101,228 @@ def exceptions_to_file(
 
     logger.setLevel(log_level)
 
-    stream = io.StringIO()
-    stream_handler = logging.StreamHandler(stream)
-    stream_handler.setFormatter(
+    if shared_buffer:
+        if level_buffer_sizes is not None or per_thread_buffers:
+            raise ValueError("shared_buffer can't be combined with level_buffer_sizes or per_thread_buffers")
+        if post_trigger_records is not None or post_trigger_seconds is not None:
+            raise ValueError("shared_buffer can't be combined with post_trigger_records or post_trigger_seconds")
+
+        node = logger
+        while node.parent is not None:
+            if not node.propagate:
+                raise ValueError(f"shared_buffer needs the logger {logger.name!r} to propagate to the root-logger")
+            node = node.parent
+
+    if binary_dump:
+        filepath = filepath.with_suffix(".sgld")
+    file_handler_class = sgl.BinaryCrashFileHandler if binary_dump else sgl.CrashFileHandler
+
+    index = sgl.CrashIndex(filepath.parent / (filepath.stem + ".sqlite3"), trigger_level) if crash_index else None
+
+    retention = None
+    if max_files is not None or max_total_bytes is not None or max_age is not None:
+        retention = sgl.CrashLogRetention(
+            filepath.parent / (filepath.stem + ".manifest"),
+            max_files=max_files,
+            max_bytes=max_total_bytes,
+            max_age=max_age,
+            pattern=glob.escape(filepath.stem) + "*" + glob.escape(filepath.suffix) + "*",
+            on_delete=index.forget if index is not None else None,
+        )
+
+    shipper = None
+    if collector_url is not None:
+        shipper = sgl.CrashDumpShipper(
+            collector_url,
+            filepath.parent / (filepath.stem + ".spool"),
+            max_spool_bytes=collector_spool_bytes,
+        )
+
+    file_handler = file_handler_class(
+        filepath,
+        datetime_format,
+        compression=compression,
+        retention=retention,
+        index=index,
+        shipper=shipper,
+    )
+    file_handler.setFormatter(
         logging.Formatter(formatter_format)
     )
+    exception_occured = file_handler.finish_file
 
-    def exception_occured(*_):
-        nonlocal stream
-        stream.seek(0)
+    if crash_survivable:
+        # Every instance (and forked child) gets its own ring, so a running instance isn't mistaken for a crashed one
+        ring_path = filepath.parent / (filepath.stem + ".{pid}.ring")
 
-        if not stream.read(1):
-            # Nothing to report
-            return
+        # Earlier runs might have crashed without being able to write their log
+        recovered_handler = file_handler_class(
+            filepath.parent / (filepath.stem + "_recovered" + filepath.suffix),
+            datetime_format,
+            compression=compression,
+            retention=retention,
+            index=index,
+            shipper=shipper,
+        )
+        recovered_handler.setFormatter(
+            logging.Formatter(formatter_format)
+        )
+        for pattern in (glob.escape(filepath.stem) + ".*.ring", glob.escape(filepath.stem) + ".ring"):  # .ring is from older versions
+            sgl.recover_mmap_rings(filepath.parent, pattern, recovered_handler)
+        recovered_handler.close()
 
-        # Add current datetime to filename
-        actual_filepath = filepath.parent / (filepath.stem + dt.now().strftime(datetime_format) + filepath.suffix)
+        logger.addHandler(sgl.MmapRingHandler(ring_path))
 
-        with open(actual_filepath, "a") as f:
-            stream.seek(0)
-            shutil.copyfileobj(stream, f)
+    writer = sgl.BackgroundWriter() if background_writer else None
+    deduplicator = None
+    if deduplicate_window is not None:
+        deduplicator = sgl.TriggerDeduplicator(deduplicate_window, summary_interval=deduplicate_window)
 
-        stream.close()
-        stream = io.StringIO()  # "Clear" the buffer
-        stream_handler.setStream(stream)
+    if shared_buffer:
+        return _shared_exceptions_to_file(
+            logger,
+            file_handler,
+            buffer_size=buffer_size,
+            trigger_level=trigger_level,
+            log_level=log_level,
+            include_main_thread=include_main_thread,
+            include_threads=include_threads,
+            include_tkinter=include_tkinter,
+            reraise=reraise,
+            compact_buffer=compact_buffer,
+            buffer_bytes=buffer_bytes,
+            buffer_seconds=buffer_seconds,
+            writer=writer,
+            deduplicator=deduplicator,
+            traceback_formatter=traceback_formatter,
+            stats_interval=stats_interval,
+            stats_report=stats_report,
+        )
 
-    buffer_handler = sgl.MemoryHandlerRotatingBuffer(buffer_size, trigger_level, target=stream_handler, call_after_flushing=exception_occured)
+    if level_buffer_sizes is not None:
+        buffer_handler = sgl.MemoryHandlerLevelTieredBuffer(
+            level_buffer_sizes,
+            trigger_level,
+            target=file_handler,
+            call_after_flushing=exception_occured,
+            compact=compact_buffer,
+            writer=writer,
+            deduplicator=deduplicator,
+            post_trigger_records=post_trigger_records,
+            post_trigger_seconds=post_trigger_seconds,
+        )
+    elif per_thread_buffers:
+        buffer_handler = sgl.MemoryHandlerThreadLocalBuffer(
+            buffer_size,
+            trigger_level,
+            target=file_handler,
+            call_after_flushing=exception_occured,
+            compact=compact_buffer,
+            writer=writer,
+            deduplicator=deduplicator,
+            post_trigger_records=post_trigger_records,
+            post_trigger_seconds=post_trigger_seconds,
+        )
+    else:
+        buffer_handler = sgl.MemoryHandlerRotatingBuffer(
+            buffer_size,
+            trigger_level,
+            target=file_handler,
+            call_after_flushing=exception_occured,
+            compact=compact_buffer,
+            max_bytes=buffer_bytes,
+            max_age=buffer_seconds,
+            writer=writer,
+            deduplicator=deduplicator,
+            post_trigger_records=post_trigger_records,
+            post_trigger_seconds=post_trigger_seconds,
+        )
 
     logger.addHandler(buffer_handler)
 
-    return sgl.reroute_exceptions(
+    if stats_interval is not None:
+        buffer_handler.report_stats(stats_interval, stats_report)
+
+    pass_text_to_function = exception_occured
+    if writer is not None:
+        # The file must only be touched by the writer
+        pass_text_to_function = lambda *_: writer.submit(exception_occured)
+
+    catch = sgl.reroute_exceptions(
         logger,
         reraise=reraise,
         loglevel=trigger_level,
-        pass_text_to_function=exception_occured,
+        pass_text_to_function=pass_text_to_function,
         include_main_thread=include_main_thread,
         include_threads=include_threads,
         include_tkinter=include_tkinter,
+        traceback_formatter=traceback_formatter,
     )
 
+    post_trigger = post_trigger_records is not None or post_trigger_seconds is not None
+    if (writer is not None or post_trigger) and include_main_thread:
+        # The program ends after an unhandled exception, so the crash-log has to be written first
+        excepthook = sys.excepthook
+        def excepthook_and_wait(*args):
+            excepthook(*args)
+            buffer_handler.flush_pending()
+
+            if writer is not None:
+                writer.join()
+
+        sys.excepthook = excepthook_and_wait
+
+    catch.stats_snapshot = buffer_handler.stats_snapshot
+    return catch
+
+
+
+def _shared_exceptions_to_file(
+        logger: logging.Logger,
+        file_handler: logging.Handler,
+        *,
+        buffer_size: int,
+        trigger_level: int,
+        log_level: int,
+        include_main_thread: bool,
+        include_threads: bool,
+        include_tkinter: bool,
+        reraise: bool,
+        compact_buffer: bool,
+        buffer_bytes: int | None,
+        buffer_seconds: float | None,
+        writer,
+        deduplicator,
+        traceback_formatter: Callable | None,
+        stats_interval: float | None,
+        stats_report: Callable[[dict], Any] | None,
+) -> Callable:
+    """
+    exceptions_to_file with shared_buffer=True: Add a sink for the logger to the process-wide buffer
+    """
+    buffer = sgl.shared_capture_buffer(buffer_size, compact=compact_buffer, max_bytes=buffer_bytes, max_age=buffer_seconds)
+
+    catch_exceptions = include_main_thread or include_threads or include_tkinter
+    buffer.add_sink(sgl.CaptureSink(
+        logger.name if logger is not logging.getLogger() else "",
+        log_level,
+        trigger_level,
+        target=file_handler,
+        call_after_flushing=file_handler.finish_file,
+        writer=writer,
+        deduplicator=deduplicator,
+        catch_exceptions=catch_exceptions,
+    ))
+
+    if stats_interval is not None:
+        buffer.report_stats(stats_interval, stats_report)
+
+    catch = buffer.catch_exceptions(
+        include_main_thread=include_main_thread,
+        include_threads=include_threads,
+        include_tkinter=include_tkinter,
+        reraise=reraise,
+        traceback_formatter=traceback_formatter,
+    )
+    catch.stats_snapshot = buffer.stats_snapshot
+    return catch
@@ -0,0 +1,242 @@
+import logging
+import shutil
+import sqlite3
+import sys
+import threading
+from datetime import datetime as dt
+from pathlib import Path
+from typing import Iterable, NamedTuple, TextIO
+
+from .CrashFileHandler import _read_dump
+from .Deduplication import record_fingerprint
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crashes (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    level INTEGER NOT NULL,
+    logger TEXT NOT NULL,
+    thread TEXT,
+    module TEXT,
+    exception_type TEXT,
+    fingerprint TEXT,
+    message TEXT,
+    file TEXT NOT NULL,
+    offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS crashes_created ON crashes (created);
+CREATE INDEX IF NOT EXISTS crashes_exception_type ON crashes (exception_type, created);
+CREATE INDEX IF NOT EXISTS crashes_fingerprint ON crashes (fingerprint, created);
+CREATE INDEX IF NOT EXISTS crashes_module ON crashes (module, created);
+CREATE INDEX IF NOT EXISTS crashes_logger ON crashes (logger, created);
+CREATE INDEX IF NOT EXISTS crashes_file ON crashes (file);
+"""
+
+_MAX_MESSAGE = 500  # Only the start of the message is saved, the rest is in the dump
+
+
+class CrashEntry(NamedTuple):
+    created: float
+    level: int
+    logger: str
+    thread: str | None
+    module: str | None
+    exception_type: str | None
+    fingerprint: str | None
+    message: str | None
+    file: str
+    offset: int | None    # Where the record starts in the (uncompressed) file. None, if unknown
+
+
+class CrashIndex:
+
+    def __init__(self, database_path: str | Path, level: int = logging.ERROR):
+        """
+        SQLite-database of all crash-records (records at or above level) in all crash-files.
+        Pass it to a CrashFileHandler (or exceptions_to_file(crash_index=True)) and it is filled while the files are written.
+
+        Search it with query, or from the command line:
+            python -m SwiftGUI_Logging query <database> --type ZeroDivisionError --since 2024-01-01
+
+        :param database_path: Where to save the database. Usually next to the crash-files
+        :param level: Records at or above this level are added
+        """
+        self.database_path = Path(database_path)
+        self.level = level
+
+        self._connection: sqlite3.Connection = None    # Opened when needed
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.database_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.database_path, timeout=10, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")     # Readers don't block the crashing program
+            self._connection.execute("PRAGMA synchronous=NORMAL")   # Still safe with WAL, but doesn't wait for the disk on every crash
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def entry(self, record: logging.LogRecord, file: str | Path = "", offset: int = None) -> CrashEntry:
+        """
+        What is saved about a record.
+        Exceptions logged by reroute_exceptions carry their type and module, other records use their exc_info or where they were logged
+        :param record:
+        :param file: The crash-file
+        :param offset: Where the record starts in the file
+        :return:
+        """
+        exception_type = getattr(record, "exception_type", None)
+        module = getattr(record, "exception_module", None)
+
+        if exception_type is None and record.exc_info and record.exc_info[0]:
+            exception_type = record.exc_info[0].__qualname__
+            tb = record.exc_info[2]
+            while tb is not None and tb.tb_next is not None:
+                tb = tb.tb_next
+            if tb is not None:
+                module = tb.tb_frame.f_globals.get("__name__")
+
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = str(record.msg)
+
+        return CrashEntry(
+            created=record.created,
+            level=record.levelno,
+            logger=record.name,
+            thread=record.threadName,
+            module=module or record.module,
+            exception_type=exception_type,
+            fingerprint=record_fingerprint(record),
+            message=message[:_MAX_MESSAGE],
+            file=str(file),
+            offset=offset,
+        )
+
+    def add(self, file: str | Path, entries: Iterable[CrashEntry]):
+        """
+        Save entries of a finished crash-file
+        :param file: Replaces the file of the entries
+        :param entries:
+        :return:
+        """
+        rows = [entry._replace(file=str(file)) for entry in entries]
+        if not rows:
+            return
+
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    f"INSERT INTO crashes ({', '.join(CrashEntry._fields)}) VALUES ({', '.join('?' * len(CrashEntry._fields))})",
+                    rows,
+                )
+
+    def forget(self, file: str | Path):
+        """
+        Remove all entries of a file, e.g. because it was deleted
+        :param file:
+        :return:
+        """
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM crashes WHERE file = ?", (str(file),))
+
+    def query(
+            self,
+            *,
+            exception_type: str = None,
+            fingerprint: str = None,
+            logger: str = None,
+            module: str = None,
+            thread: str = None,
+            level: int = None,
+            since: float | dt = None,
+            until: float | dt = None,
+            limit: int = None,
+    ) -> list[CrashEntry]:
+        """
+        Find crash-records, newest first.
+        All given conditions must match.
+
+        :param exception_type: Name of the exception-class, e.g. "ZeroDivisionError"
+        :param fingerprint: See exception_fingerprint
+        :param logger: Name of the logger, including its children
+        :param module: Module the exception was raised in (or the record was logged from), including its submodules
+        :param thread: Name of the thread
+        :param level: Minimum level
+        :param since: Only records at or after this time (datetime or timestamp)
+        :param until: Only records at or before this time (datetime or timestamp)
+        :param limit: Return at most this many entries
+        :return:
+        """
+        conditions = []
+        parameters = []
+
+        for column, value in (("exception_type", exception_type), ("fingerprint", fingerprint), ("thread", thread)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+
+        for column, value in (("logger", logger), ("module", module)):
+            if value is not None:
+                # Children are everything from "name." to "name/" ("/" comes right after "."), which can use the index
+                conditions.append(f"({column} = ? OR ({column} >= ? AND {column} < ?))")
+                parameters += [value, value + ".", value + "/"]
+
+        for condition, value in (("level >= ?", level), ("created >= ?", since), ("created <= ?", until)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value.timestamp() if isinstance(value, dt) else value)
+
+        sql = f"SELECT {', '.join(CrashEntry._fields)} FROM crashes"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+
+        with self._lock:
+            return [CrashEntry(*row) for row in self._connect().execute(sql, parameters)]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def stream_dumps(entries: Iterable[CrashEntry], output: TextIO = None) -> int:
+    """
+    Write the crash-files of some entries as text, each one only once.
+    Binary dumps are rendered, compressed files decompressed.
+
+    :param entries: E.g. from CrashIndex.query
+    :param output: Defaults to stdout
+    :return: How many files were written
+    """
+    if output is None:
+        output = sys.stdout
+
+    written = set()
+    for entry in entries:
+        if entry.file in written:
+            continue
+        written.add(entry.file)
+
+        output.write(f"===== {entry.file} =====\n")
+        try:
+            if ".sgld" in Path(entry.file).suffixes:
+                from .BinaryDump import render_binary_dump
+                render_binary_dump(entry.file, output)
+            else:
+                with _read_dump(entry.file, "rt") as file:
+                    shutil.copyfileobj(file, output)
+        except FileNotFoundError:
+            output.write("(The file doesn't exist anymore)\n")
+
+    return len(written)
+
@@ -0,0 +1,361 @@
+import logging
+import re
+import time
+from datetime import datetime as dt
+from pathlib import Path
+from typing import Callable, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .Retention import CrashLogRetention
+    from .CrashArchive import CrashIndex
+    from .CollectorShipping import CrashDumpShipper
+
+# compression: suffix of the file
+_compression_suffixes = {
+    "gzip": ".gz",
+    "lzma": ".xz",
+}
+
+
+def _open_dump(filepath: Path, mode: str, compression: str = None):
+    """
+    Open a crash-file, compressed or not.
+    The compression-modules are only imported when they are used.
+
+    :param filepath:
+    :param mode: Same as for open(...)
+    :param compression: None, "gzip" or "lzma"
+    :return:
+    """
+    if compression is None:
+        return open(filepath, mode)
+
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+
+    # Low levels, because the file is written while the program crashes. It still compresses logs very well
+    writing = "r" not in mode
+    if compression == "gzip":
+        import gzip
+        return gzip.open(filepath, mode, compresslevel=6) if writing else gzip.open(filepath, mode)
+    if compression == "lzma":
+        import lzma
+        return lzma.open(filepath, mode, preset=1) if writing else lzma.open(filepath, mode)
+
+    raise ValueError(f"Unknown compression {compression!r}, use one of {list(_compression_suffixes)}")
+
+
+def _read_dump(filepath: str | Path, mode: str = "rb"):
+    """
+    Open a crash-file for reading. The compression is detected by its suffix
+    """
+    filepath = Path(filepath)
+    for compression, suffix in _compression_suffixes.items():
+        if filepath.suffix == suffix:
+            return _open_dump(filepath, mode, compression)
+    return open(filepath, mode)
+
+
+_percent_field = re.compile(r"%(?:\((\w+)\)([#0+ -]*\d*(?:\.\d+)?[diouxXeEfFgGcrsa])|(%))|%")
+_msecs_text = tuple(f"{i:03d}" for i in range(1000))
+
+
+def _compile_format(fmt: str) -> Callable[[dict], str] | None:
+    """
+    Turn a %-style format like "%(asctime)s - %(message)s" into a function that fills it in from a record's __dict__.
+    The function is a single f-string, which is a lot faster than parsing the format for every record.
+
+    :param fmt:
+    :return: None, if the format contains something that can't be compiled
+    """
+    literals = []
+    conversions = []
+    expressions = []
+    position = 0
+
+    for match in _percent_field.finditer(fmt):
+        key, conversion, percent = match.groups()
+        if not key and not percent:
+            return None     # Unnamed fields can't be taken from a dict
+
+        literals.append(fmt[position:match.start()] + ("%" if percent else ""))
+        expressions.append(f"{{_L[{len(literals) - 1}]}}")
+        position = match.end()
+
+        if percent:
+            continue
+
+        if conversion == "s":
+            expressions.append(f"{{d[{key!r}]!s}}")
+        else:
+            conversions.append("%" + conversion)
+            expressions.append(f"{{_C[{len(conversions) - 1}] % (d[{key!r}],)}}")
+
+    literals.append(fmt[position:])
+    expressions.append(f"{{_L[{len(literals) - 1}]}}")
+
+    return eval(f"lambda d: f\"{''.join(expressions)}\"", {"_L": tuple(literals), "_C": tuple(conversions)})
+
+
+def _record_formatter(formatter: logging.Formatter, fallback: Callable[[logging.LogRecord], str] = None) -> Callable[[logging.LogRecord], str]:
+    """
+    Return a function that formats a single record like formatter.format.
+
+    For a plain logging.Formatter with %-style, the format is done "by hand", so asctime only needs to be calculated once per second.
+    Other formatters are simply used as they are.
+    :param formatter:
+    :param fallback: Used instead of formatter.format, if the format can't be done by hand
+    :return:
+    """
+    if fallback is None:
+        fallback = formatter.format
+
+    style = formatter._style
+
+    if (
+            type(formatter).format is not logging.Formatter.format
+            or type(formatter).formatTime is not logging.Formatter.formatTime
+            or type(style) is not logging.PercentStyle
+            or getattr(style, "_defaults", None)
+    ):
+        return fallback
+
+    fill_in = _compile_format(style._fmt)
+    if fill_in is None:
+        return fallback
+
+    uses_time = formatter.usesTime()
+    converter = formatter.converter
+    datefmt = formatter.datefmt
+    time_format = datefmt or formatter.default_time_format
+    msec_format = None if datefmt else formatter.default_msec_format
+    format_exception = formatter.formatException
+    format_stack = formatter.formatStack
+
+    fast_msecs = msec_format == "%s,%03d"   # The default, which can be done without formatting
+
+    last_second = None
+    last_time = ""
+
+    def format_record(record: logging.LogRecord) -> str:
+        nonlocal last_second, last_time
+
+        record.message = record.getMessage()
+
+        if uses_time:
+            second = int(record.created)
+            if second != last_second:   # strftime only needs to run once per second
+                last_second = second
+                last_time = time.strftime(time_format, converter(record.created))
+                if fast_msecs:
+                    last_time += ","
+
+            if fast_msecs:
+                record.asctime = last_time + _msecs_text[int(record.msecs)]
+            elif msec_format:
+                record.asctime = msec_format % (last_time, record.msecs)
+            else:
+                record.asctime = last_time
+
+        s = fill_in(record.__dict__)
+
+        # Same as logging.Formatter.format
+        if record.exc_info and not record.exc_text:
+            record.exc_text = format_exception(record.exc_info)
+        if record.exc_text:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + record.exc_text
+        if record.stack_info:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + format_stack(record.stack_info)
+
+        return s
+
+    return format_record
+
+
+class CrashFileHandler(logging.Handler):
+
+    def __init__(
+            self,
+            filepath: str | Path,
+            datetime_format: str = "_%Y-%m-%d_%H-%M-%S",
+            batch_size: int = 1000,
+            compression: str = None,
+            retention: "CrashLogRetention" = None,
+            index: "CrashIndex" = None,
+            shipper: "CrashDumpShipper" = None,
+    ):
+        """
+        Writes records straight into a file with a timestamp in its name.
+        The file is opened with the first record and closed by calling finish_file.
+        The next record after that opens a new file.
+
+        Formatted records are collected and written in batches, so memory only depends on the batch_size.
+
+        :param filepath: Path to the file WITHOUT THE TIMESTAMP. The timestamp is added at the end before the suffix
+        :param datetime_format: Format of the timestamp that extends the filename
+        :param batch_size: How many formatted records are collected before writing them to the file
+        :param compression: None, "gzip" or "lzma". The file is compressed while it's written and gets an additional suffix (.gz/.xz)
+        :param retention: Finished files are reported to it, so old ones can be deleted
+        :param index: Crash-records (at or above the index's level) are added to it, with the file and their position in it
+        :param shipper: Finished files are passed to it, so they are sent to a collector
+        """
+        super().__init__()
+        if compression is not None and compression not in _compression_suffixes:
+            raise ValueError(f"Unknown compression {compression!r}, use one of {list(_compression_suffixes)}")
+
+        self.filepath = Path(filepath)
+        self.datetime_format = datetime_format
+        self.batch_size = batch_size
+        self.compression = compression
+        self.retention = retention
+        self.index = index
+        self.shipper = shipper
+
+        self._file = None
+        self._file_path = None
+        self._batch = []
+        self._index_entries = []
+
+        # Totals over all files, so the buffer can tell formatting- and writing-time apart
+        self.bytes_written = 0  # Before compression. Characters for text-files
+        self.io_seconds = 0.0   # Including compression
+
+    def _dump_path(self) -> Path:
+        """
+        Path of a new file, with the current datetime in its name
+        :return:
+        """
+        suffix = self.filepath.suffix + _compression_suffixes.get(self.compression, "")
+        return self.filepath.parent / (self.filepath.stem + dt.now().strftime(self.datetime_format) + suffix)
+
+    def _open_file(self):
+        """
+        Open a new file for the current dump
+        :return:
+        """
+        self._file_path = self._dump_path()
+        self._file = _open_dump(self._file_path, "a", self.compression)
+
+    def _write_batch(self):
+        """
+        Write all collected records to the file
+        :return:
+        """
+        batch = self._batch
+        start = time.perf_counter()
+        self._file.writelines(batch)
+        self.io_seconds += time.perf_counter() - start
+        self.bytes_written += sum(map(len, batch))
+        batch.clear()
+
+    def _add_to_index(self, record: logging.LogRecord):
+        """
+        Remember the record and its position for the index. Called right before the record is added to the batch
+        :param record:
+        :return:
+        """
+        self._write_batch()     # Crash-records are rare, so writing everything before them to get the position is fine
+        try:
+            offset = self._file.tell()
+        except (OSError, ValueError):
+            offset = None
+
+        self._index_entries.append(self.index.entry(record, offset=offset))
+
+    def emit(self, record):
+        try:
+            if self._file is None:
+                self._open_file()
+
+            if self.index is not None and record.levelno >= self.index.level:
+                self._add_to_index(record)
+
+            self._batch.append(self.format(record) + "\n")
+
+            if len(self._batch) >= self.batch_size:
+                self._write_batch()
+        except Exception:
+            self.handleError(record)
+
+    def _batch_formatter(self) -> Callable[[logging.LogRecord], str]:
+        """
+        Return a function that formats a single record.
+        :return:
+        """
+        return _record_formatter(self.formatter or logging._defaultFormatter, self.format)
+
+    def handle_batch(self, records: Iterable[logging.LogRecord]):
+        """
+        Write a lot of records at once.
+        The lock is only acquired once and asctime is cached, which is a lot faster than calling handle for every record.
+        :param records:
+        :return:
+        """
+        self.acquire()
+        try:
+            format_record = self._batch_formatter()
+            batch = self._batch
+            batch_size = self.batch_size
+            filters = self.filters
+            index_level = self.index.level if self.index is not None else None
+
+            for record in records:
+                if filters and not self.filter(record):
+                    continue
+
+                try:
+                    if self._file is None:
+                        self._open_file()
+
+                    if index_level is not None and record.levelno >= index_level:
+                        self._add_to_index(record)
+
+                    batch.append(format_record(record) + "\n")
+
+                    if len(batch) >= batch_size:
+                        self._write_batch()
+                except Exception:
+                    self.handleError(record)
+        finally:
+            self.release()
+
+    def finish_file(self, *_):
+        """
+        Write everything that is left and close the file.
+        Does nothing, if there is no open file.
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._file is None:
+                return  # Nothing to report
+
+            try:
+                self._write_batch()
+            finally:
+                start = time.perf_counter()
+                self._file.close()
+                self.io_seconds += time.perf_counter() - start
+                self._file = None
+                self._batch.clear()
+
+            if self._index_entries:
+                self.index.add(self._file_path, self._index_entries)
+                self._index_entries.clear()
+
+            if self.shipper is not None:    # Before retention, which might delete the file
+                self.shipper.add(self._file_path)
+
+            if self.retention is not None:
+                self.retention.add(self._file_path)
+        finally:
+            self.release()
+
+    def close(self):
+        self.finish_file()
+        super().close()
+
@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from types import TracebackType
+
+
+def _digest(text: str) -> str:
+    """
+    Short hash that is the same in every process and on every host, unlike hash()
+    """
+    import hashlib  # Only needed once something triggers, importing it takes a while
+
+    return hashlib.blake2b(text.encode("utf-8", "replace"), digest_size=4).hexdigest()
+
+
+def exception_fingerprint(exctype: type, tb: TracebackType | None) -> str:
+    """
+    Identify an exception by its type and the code-locations of its traceback.
+    The message is ignored, so "the same error with different values" has the same fingerprint.
+    Locations are module-names instead of paths, so the same error has the same fingerprint on every host.
+
+    :param exctype: Type of the exception
+    :param tb: Its traceback
+    :return:
+    """
+    locations = "\n".join(
+        f"{frame.f_globals.get('__name__', frame.f_code.co_filename)}:{frame.f_code.co_name}:{lineno}"
+        for frame, lineno in traceback.walk_tb(tb)
+    )
+    return f"{exctype.__qualname__}@{_digest(locations)}"
+
+
+def record_fingerprint(record: logging.LogRecord) -> str:
+    """
+    Fingerprint of a record.
+    Uses the exception if there is one, otherwise the place it was logged from and the unformatted message.
+    :param record:
+    :return:
+    """
+    fingerprint = getattr(record, "exception_fingerprint", None)    # Added by reroute_exceptions
+    if fingerprint:
+        return fingerprint
+
+    if record.exc_info and record.exc_info[0]:
+        return exception_fingerprint(record.exc_info[0], record.exc_info[2])
+
+    return f"{record.name}:{record.module}:{record.lineno}:{_digest(str(record.msg))}"
+
+
+class TriggerDeduplicator:
+
+    def __init__(self, window: float = 60, max_fingerprints: int = 1000, summary_interval: float = None):
+        """
+        Suppresses repeated triggers of the same error.
+        After a fingerprint triggered, the same fingerprint is only counted for the next 'window' seconds.
+        The counts are added to the next dump as a summary.
+        If nothing triggers anymore, the buffer writes the summary on its own: at exit, and every summary_interval seconds if provided.
+
+        :param window: Seconds after a trigger, in which the same fingerprint doesn't trigger again
+        :param max_fingerprints: How many fingerprints to remember. The least recently seen ones are forgotten first
+        :param summary_interval: Seconds between checks, if a summary is due (counts are waiting, but nothing triggered for 'window' seconds)
+        """
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self.summary_interval = summary_interval
+        self._last_trigger = None
+
+        self._fingerprints: OrderedDict[str, list] = OrderedDict()    # fingerprint: [time of last trigger, suppressed since then]
+        self._forgotten_suppressed = 0  # Suppressed counts of fingerprints that were removed from the LRU
+        self._lock = threading.Lock()
+
+    def should_trigger(self, record: logging.LogRecord) -> bool:
+        """
+        Check if the record should trigger a dump, or if it is a repeat
+        :param record:
+        :return:
+        """
+        fingerprint = record_fingerprint(record)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._fingerprints.get(fingerprint)
+
+            if entry is not None and now - entry[0] < self.window:
+                entry[1] += 1
+                self._fingerprints.move_to_end(fingerprint)
+                return False
+
+            if entry is None:
+                self._fingerprints[fingerprint] = [now, 0]
+                if len(self._fingerprints) > self.max_fingerprints:
+                    _, (_, suppressed) = self._fingerprints.popitem(last=False)
+                    self._forgotten_suppressed += suppressed
+            else:
+                entry[0] = now  # The suppressed count stays until the next summary
+                self._fingerprints.move_to_end(fingerprint)
+
+            self._last_trigger = now
+            return True
+
+    def summary_due(self) -> bool:
+        """
+        True, if suppressed counts are waiting, but nothing triggered for 'window' seconds.
+        The next dump might take a long time then, so the summary should be written on its own
+        :return:
+        """
+        with self._lock:
+            if self._last_trigger is None or time.monotonic() - self._last_trigger < self.window:
+                return False
+            return bool(self._forgotten_suppressed) or any(entry[1] for entry in self._fingerprints.values())
+
+    def summary(self) -> str | None:
+        """
+        Text about all suppressed triggers since the last summary.
+        The counts are reset.
+        :return: None, if nothing was suppressed
+        """
+        with self._lock:
+            lines = []
+            for fingerprint, entry in self._fingerprints.items():
+                if entry[1]:
+                    lines.append(f"    {fingerprint}: {entry[1]} times")
+                    entry[1] = 0
+
+            if self._forgotten_suppressed:
+                lines.append(f"    Other: {self._forgotten_suppressed} times")
+                self._forgotten_suppressed = 0
+
+        if not lines:
+            return None
+
+        return f"Suppressed repeated triggers (within {self.window}s of the last dump):\n" + "\n".join(lines)
+
+    def summary_record(self) -> logging.LogRecord | None:
+        """
+        Same as summary, but as a record that can be written with the others
+        :return:
+        """
+        summary = self.summary()
+        if summary is None:
+            return None
+
+        return logging.LogRecord("SwiftGUI_Logging", logging.WARNING, __file__, 0, summary, (), None)
+
@@ -1,13 +1,87 @@
+import importlib.abc
+import importlib.util
 import logging.handlers
 import threading
 import traceback
 import sys
+from types import ModuleType, TracebackType
 from typing import Callable, Any
 
-try:
-    import tkinter as tk
-except ImportError:
-    tk = None
+from .Deduplication import exception_fingerprint
+
+# tkinter is only patched once it is actually imported, so programs without a GUI don't need to load it
+_tkinter_patches: list[Callable[[ModuleType], Any]] = []
+
+
+def _apply_tkinter_patches(tk: ModuleType):
+    while _tkinter_patches:
+        _tkinter_patches.pop(0)(tk)
+
+
+class _PatchingLoader(importlib.abc.Loader):
+    """
+    Loads tkinter like usual, then applies the patches
+    """
+
+    def __init__(self, loader: importlib.abc.Loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        _apply_tkinter_patches(module)
+
+
+class _TkinterImportHook(importlib.abc.MetaPathFinder):
+    """
+    Waits for tkinter to be imported
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != "tkinter":
+            return None
+
+        sys.meta_path.remove(self)  # Only needed once, also lets find_spec find the real module
+        spec = importlib.util.find_spec(fullname)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _PatchingLoader(spec.loader)
+        return spec
+
+
+def _patch_tkinter_when_imported(patch: Callable[[ModuleType], Any]):
+    """
+    Call patch(tkinter) right away if tkinter is already imported, otherwise as soon as it is
+    """
+    _tkinter_patches.append(patch)
+
+    tk = sys.modules.get("tkinter")
+    if tk is not None:
+        _apply_tkinter_patches(tk)
+        return
+
+    if not any(isinstance(finder, _TkinterImportHook) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _TkinterImportHook())
+
+
+def _format_exception(exctype: type, value: BaseException, tb: TracebackType | None) -> str:
+    """
+    Default traceback_formatter, the same text Python prints itself
+    """
+    return "".join(traceback.format_exception(exctype, value, tb))
+
+
+def _innermost_module(tb: TracebackType | None) -> str | None:
+    """
+    Name of the module the exception was raised in
+    """
+    if tb is None:
+        return None
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    return tb.tb_frame.f_globals.get("__name__")
+
 
 def reroute_exceptions(
         logger: logging.Logger = logging.getLogger(),
@@ -21,6 +95,7 @@ def reroute_exceptions(
         reraise: bool = False,
         print_to_console: bool = False,
         pass_text_to_function: Callable[[str], Any] = None,
+        traceback_formatter: Callable[[type, BaseException, TracebackType], str] = None,
 ) -> Callable:
     """
     Catch all unhandled exceptions and log them
@@ -32,9 +107,10 @@ def reroute_exceptions(
     :param reraise: True, if the exception should be raised again. THIS DOESN'T WORK FOR THREAD EXCEPTIONS!
     :param include_main_thread: True, if the "normal thread's" exceptions should be caught
     :param include_threads: True, if Thread-exceptions should be caught too
-    :param include_tkinter: True, if Tkinter-exceptions should be caught too
+    :param include_tkinter: True, if Tkinter-exceptions should be caught too. If tkinter isn't imported yet, this happens as soon as it is
     :param pass_text_to_function: Pass a function/method and the exception-text is passed to it
     :param print_to_console: True, if the text should be printed to the console using print(...)
+    :param traceback_formatter: Function that turns the exception into text. Defaults to traceback.format_exception. Pass a TracebackFormatter for deep or recursive stacks
     :return: Returns the function that gets called with the exception-info. You may use it to add your own exception-"catching"
     """
     if logger_warnings is None:
@@ -43,20 +119,30 @@ def reroute_exceptions(
     if loglevel_warnings is None:
         loglevel_warnings = loglevel
 
+    if traceback_formatter is None:
+        traceback_formatter = _format_exception
+
     def catch(exctype, value, tb, additional_text: str = ""):
-        text = additional_text + "".join(traceback.format_exception(exctype, value, tb))
+        text = additional_text + traceback_formatter(exctype, value, tb)
+        extra = {
+            "exception_fingerprint": exception_fingerprint(exctype, tb),
+            "exception_type": exctype.__qualname__,
+            "exception_module": _innermost_module(tb),
+        }
 
         if issubclass(exctype, Warning):    # Warnings
             if logger_warnings is not None:
                 logger_warnings.log(
                     loglevel_warnings,
                     text,
+                    extra=extra,
                 )
         elif issubclass(exctype, Exception):    # Real exceptions
             if logger is not None:
                 logger.log(
                     loglevel,
                     text,
+                    extra=extra,
                 )
         else:
             # Keyboard interrupts and such
@@ -83,16 +169,19 @@ def reroute_exceptions(
     if include_threads:
         threading.excepthook = catch_thread
 
-    if include_tkinter and tk is not None:
+    if include_tkinter:
         # Catch tkinter exceptions
-        actual_callback = tk.Tk.report_callback_exception
-        def catch_tkinter(self, exctype, value, tb):
-            catch(exctype, value, tb, additional_text="Tkinter exception:\n")
+        def patch_tkinter(tk: ModuleType):
+            actual_callback = tk.Tk.report_callback_exception
+            def catch_tkinter(self, exctype, value, tb):
+                catch(exctype, value, tb, additional_text="Tkinter exception:\n")
+
+                if reraise:
+                    actual_callback(self, exctype, value, tb)   # I know this shows warnings, but it works
 
-            if reraise:
-                actual_callback(self, exctype, value, tb)   # I know this shows warnings, but it works
+            tk.Tk.report_callback_exception = catch_tkinter
 
-        tk.Tk.report_callback_exception = catch_tkinter
+        _patch_tkinter_when_imported(patch_tkinter)
 
     return catch
 
@@ -0,0 +1,107 @@
+import logging
+import sys
+import threading
+import time
+
+from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer, _LazyRecord
+
+
+class FastCapture:
+
+    def __init__(
+            self,
+            logger: str | logging.Logger = "",
+            handler: MemoryHandlerRotatingBuffer = None,
+            *,
+            level: int = None,
+            caller_info: bool = True,
+    ):
+        """
+        A cheap replacement for logger.debug/info/warning in hot loops.
+
+        Records below the handler's flushLevel are put directly into the crash-buffer, without creating a LogRecord.
+        The LogRecord is only created when the buffer is flushed.
+        THESE RECORDS ONLY GO TO THE CRASH-BUFFER, other handlers (console, ...) don't receive them.
+
+        Records at or above the flushLevel are logged normally through the logger, so they trigger like always.
+
+        :param logger: Logger that receives the "important" records. Also, if no handler is provided, its first MemoryHandlerRotatingBuffer is used
+        :param handler: The crash-buffer to capture into
+        :param level: Records below this level are ignored. Defaults to the logger's level
+        :param caller_info: True, if the file, line and function of the call should be saved. Costs a bit of time
+        """
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+
+        if handler is None:
+            handler = next((h for h in logger.handlers if isinstance(h, MemoryHandlerRotatingBuffer)), None)
+            if handler is None:
+                raise ValueError(f"{logger} has no MemoryHandlerRotatingBuffer, pass a handler")
+        self.handler = handler
+
+        self.level = logger.getEffectiveLevel() if level is None else level
+        self.caller_info = caller_info
+
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= self.level
+
+    def _capture(self, level: int, msg, args: tuple):
+        caller = None
+        if self.caller_info:
+            frame = sys._getframe(2)    # Whoever called debug/info/...
+            code = frame.f_code
+            caller = (code.co_filename, frame.f_lineno, code.co_name)
+
+        thread = threading.current_thread()
+        self.handler.capture(_LazyRecord(self.logger.name, level, time.time(), msg, args, thread.ident, thread.name, caller))
+
+    def log(self, level: int, msg, *args, **kwargs):
+        if level < self.level:
+            return
+
+        if level >= self.handler.flushLevel or kwargs:
+            self.logger.log(level, msg, *args, stacklevel=2, **kwargs)
+            return
+
+        self._capture(level, msg, args)
+
+    def debug(self, msg, *args, **kwargs):
+        if logging.DEBUG < self.level:
+            return
+
+        if kwargs or logging.DEBUG >= self.handler.flushLevel:
+            self.logger.debug(msg, *args, stacklevel=2, **kwargs)
+            return
+
+        self._capture(logging.DEBUG, msg, args)
+
+    def info(self, msg, *args, **kwargs):
+        if logging.INFO < self.level:
+            return
+
+        if kwargs or logging.INFO >= self.handler.flushLevel:
+            self.logger.info(msg, *args, stacklevel=2, **kwargs)
+            return
+
+        self._capture(logging.INFO, msg, args)
+
+    def warning(self, msg, *args, **kwargs):
+        if logging.WARNING < self.level:
+            return
+
+        if kwargs or logging.WARNING >= self.handler.flushLevel:
+            self.logger.warning(msg, *args, stacklevel=2, **kwargs)
+            return
+
+        self._capture(logging.WARNING, msg, args)
+
+    def error(self, msg, *args, **kwargs):
+        self.logger.error(msg, *args, stacklevel=2, **kwargs)
+
+    def exception(self, msg, *args, exc_info=True, **kwargs):
+        self.logger.error(msg, *args, exc_info=exc_info, stacklevel=2, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.logger.critical(msg, *args, stacklevel=2, **kwargs)
+
@@ -0,0 +1,112 @@
+import bisect
+import heapq
+import logging
+from collections import deque
+from typing import Callable
+
+from .BackgroundWriter import BackgroundWriter
+from .Deduplication import TriggerDeduplicator
+from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer, _LazyRecord, _compact_record, _created_key, _to_record
+
+
+class MemoryHandlerLevelTieredBuffer(MemoryHandlerRotatingBuffer):
+
+    def __init__(
+            self,
+            capacities: dict[int, int],
+            flushLevel=logging.ERROR,
+            target=None,
+            call_after_flushing: Callable = None,
+            *,
+            compact: bool = False,
+            writer: BackgroundWriter = None,
+            deduplicator: TriggerDeduplicator = None,
+            post_trigger_records: int = None,
+            post_trigger_seconds: float = None,
+            collect_stats: bool = True,
+    ):
+        """
+        Same as MemoryHandlerRotatingBuffer, but every level has its own ring.
+        A lot of DEBUG-records can't push out the few WARNINGs that explain a crash anymore.
+        When flushing, all rings are merged in the order the records were created.
+        The rings are only limited by their count, there is no max_bytes or max_age for them.
+
+        Example: {logging.DEBUG: 5000, logging.INFO: 20000, logging.WARNING: 50000}
+        keeps the last 5000 DEBUG-records, the last 20000 INFO-records and the last 50000 records of WARNING and above.
+
+        :param capacities: Lowest level of a ring: How many records it keeps. Records below the lowest level go into the lowest ring
+        :param flushLevel: At which level of record the whole buffer is passed to the target-handler
+        :param target: Handler to receive all records if necessary
+        :param call_after_flushing: Call this function after passing the entries to the target
+        :param compact: True, if records should be stored as a compact snapshot and only rebuilt when flushing
+        :param writer: If provided, the merged records are passed to the target on the writer's thread
+        :param deduplicator: If provided, repeated triggers of the same error don't flush again
+        :param post_trigger_records: If provided, a trigger only flushes after this many more records arrived
+        :param post_trigger_seconds: If provided, a trigger only flushes after this many seconds
+        :param collect_stats: False, if captured records shouldn't be counted and flushes shouldn't be measured
+        """
+        if not capacities:
+            raise ValueError("At least one level needs a capacity")
+
+        super().__init__(
+            0,  # The rings below replace the buffer
+            flushLevel,
+            target,
+            call_after_flushing,
+            compact=compact,
+            writer=writer,
+            deduplicator=deduplicator,
+            post_trigger_records=post_trigger_records,
+            post_trigger_seconds=post_trigger_seconds,
+            collect_stats=collect_stats,
+        )
+
+        self._levels = sorted(capacities)
+        self._capacities = [capacities[level] for level in self._levels]
+        self._rings = [deque(maxlen=capacity) for capacity in self._capacities]
+        self._ring_index: dict[int, int] = dict()   # levelno: index of its ring, filled when a level is used the first time
+
+    def _ring_for(self, levelno: int) -> deque:
+        """
+        The ring a record of this level belongs into
+        :param levelno:
+        :return:
+        """
+        index = self._ring_index.get(levelno)
+        if index is None:
+            index = self._ring_index[levelno] = max(bisect.bisect_right(self._levels, levelno) - 1, 0)
+        return self._rings[index]
+
+    def emit(self, record):
+        self._ring_for(record.levelno).append(_compact_record(record) if self.compact else record)
+        if self.collect_stats:
+            self._captured += 1
+        self._check_trigger(record)
+
+    def capture(self, record: _LazyRecord):
+        self.acquire()
+        try:
+            self._ring_for(record.levelno).append(record)
+            if self.collect_stats:
+                self._captured += 1
+            self._check_trigger(record)
+        finally:
+            self.release()
+
+    def snapshot(self) -> list[logging.LogRecord]:
+        self.acquire()
+        try:
+            rings = [list(ring) for ring in self._rings]
+        finally:
+            self.release()
+
+        return [_to_record(record, self.compact) for record in heapq.merge(*rings, key=_created_key(self.compact))]
+
+    def _take_records(self) -> deque:
+        rings = self._rings     # Swapping the rings is cheaper than copying them
+        self._rings = [deque(maxlen=capacity) for capacity in self._capacities]
+
+        return deque(heapq.merge(*rings, key=_created_key(self.compact)))
+
+    def _buffered_count(self) -> int:
+        return sum(map(len, self._rings))
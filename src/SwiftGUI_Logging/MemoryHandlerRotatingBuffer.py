@@ -1,39 +1,725 @@
+import atexit
+import bisect
+import copy
 import logging.handlers
-from typing import Callable
+import operator
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Any
+
+from .BackgroundWriter import BackgroundWriter
+from .Deduplication import TriggerDeduplicator
+from .Metrics import BufferStats
+
+# Attributes every LogRecord carries. filename, module and levelname are derived from the others, so they aren't stored
+_record_attributes = tuple(logging.LogRecord("", logging.NOTSET, "", 0, "", (), None).__dict__)
+_derived_attributes = ("filename", "module", "levelname")
+_stored_attributes = tuple(key for key in _record_attributes if key not in _derived_attributes)
+_formatter_attributes = ("message", "asctime")  # Added by formatters, recalculated on every format anyway
+_get_stored_attributes = operator.itemgetter(*_stored_attributes)
+
+
+def _compact_record(record: logging.LogRecord) -> tuple:
+    """
+    Snapshot of a LogRecord as a single tuple, without the per-record __dict__.
+    The last two entries are the record-class and any additional attributes (or None).
+    """
+    d = record.__dict__
+
+    extra = None
+    if len(d) != len(_record_attributes):   # Something was added by extra=... or a record-factory
+        extra = {
+            key: value for key, value in d.items()
+            if key not in _record_attributes and key not in _formatter_attributes
+        } or None
+
+    return _get_stored_attributes(d) + (record.__class__, extra)
+
+
+def _rebuild_record(compact: tuple) -> logging.LogRecord:
+    """
+    Turn a snapshot from _compact_record back into a LogRecord
+    """
+    cls = compact[-2]
+    record = cls.__new__(cls)
+    d = record.__dict__
+    d.update(zip(_stored_attributes, compact))
+
+    pathname = d["pathname"]
+    try:
+        d["filename"] = os.path.basename(pathname)
+        d["module"] = os.path.splitext(d["filename"])[0]
+    except (TypeError, ValueError, AttributeError):
+        d["filename"] = pathname
+        d["module"] = "Unknown module"
+    d["levelname"] = logging.getLevelName(d["levelno"])
+
+    if compact[-1]:
+        d.update(compact[-1])
+
+    return record
+
+
+_lazy_record_defaults = {key: None for key in _record_attributes}
+
+
+def _process_name() -> str:
+    """
+    Same as LogRecord.processName
+    """
+    multiprocessing = sys.modules.get("multiprocessing")
+    if multiprocessing is not None:
+        try:
+            return multiprocessing.current_process().name
+        except Exception:
+            pass
+    return "MainProcess"
+_start_time = time.time() - logging.LogRecord("", logging.NOTSET, "", 0, "", (), None).relativeCreated / 1000   # logging._startTime, but in seconds on every version
+
+
+class _LazyRecord:
+    """
+    What FastCapture stores instead of a LogRecord.
+    Only the things that are needed right away, the rest is filled in when the buffer is flushed.
+    """
+    __slots__ = ("name", "levelno", "created", "msg", "args", "thread", "threadName", "caller")
+    exc_text = None
+
+    def __init__(self, name: str, levelno: int, created: float, msg, args: tuple, thread: int, threadName: str, caller: tuple | None):
+        self.name = name
+        self.levelno = levelno
+        self.created = created
+        self.msg = msg
+        self.args = args
+        self.thread = thread
+        self.threadName = threadName
+        self.caller = caller    # (pathname, lineno, funcName) or None
+
+    def getMessage(self) -> str:
+        msg = str(self.msg)
+        if self.args:
+            msg = msg % self.args
+        return msg
+
+    def to_record(self) -> logging.LogRecord:
+        pathname, lineno, func_name = self.caller or ("(unknown file)", 0, "(unknown function)")
+        filename = os.path.basename(pathname)
+
+        # Filling the __dict__ directly skips all the lookups LogRecord.__init__ would do
+        record = logging.LogRecord.__new__(logging.LogRecord)
+        d = record.__dict__
+        d.update(_lazy_record_defaults)
+        d.update(
+            name=self.name,
+            msg=self.msg,
+            args=self.args,
+            levelname=logging.getLevelName(self.levelno),
+            levelno=self.levelno,
+            pathname=pathname,
+            filename=filename,
+            module=os.path.splitext(filename)[0],
+            lineno=lineno,
+            funcName=func_name,
+            created=self.created,
+            msecs=int((self.created - int(self.created)) * 1000) + 0.0,
+            relativeCreated=(self.created - _start_time) * 1000,
+            thread=self.thread,
+            threadName=self.threadName,
+            process=os.getpid(),
+            processName=_process_name(),
+        )
+
+        return record
+
+
+def _to_record(item, compact: bool) -> logging.LogRecord:
+    """
+    Turn whatever is stored in the buffer into a LogRecord
+    """
+    if type(item) is _LazyRecord:
+        return item.to_record()
+    if compact:
+        return _rebuild_record(item)
+    return item
+
+
+_compact_created_index = _stored_attributes.index("created")
+
+
+def _created_key(compact: bool) -> Callable:
+    """
+    Key-function that returns the creation-time of whatever is stored in a buffer, e.g. to merge multiple buffers
+    """
+    if compact:
+        return lambda item: item.created if type(item) is _LazyRecord else item[_compact_created_index]
+    return lambda record: record.created
+
+
+# logging.shutdown flushes every handler at exit, which would write the buffer even if nothing went wrong.
+# atexit runs this before logging.shutdown, because logging registered its hook earlier.
+_interpreter_exiting = False
+
+
+def _set_interpreter_exiting():
+    global _interpreter_exiting
+    _interpreter_exiting = True
+
+
+atexit.register(_set_interpreter_exiting)
+
+
+# Memory a record takes up without its message and arguments
+_dummy_record = logging.LogRecord("", logging.NOTSET, "", 0, "", (), None)
+_record_overhead = sys.getsizeof(_dummy_record) + sys.getsizeof(_dummy_record.__dict__)
+_compact_record_overhead = sys.getsizeof(_compact_record(_dummy_record))
+
+
+def _approximate_size(record: logging.LogRecord, overhead: int) -> int:
+    """
+    Approximate amount of memory a record takes up.
+    Only counts the "first level" of message and arguments, so this is only an estimate.
+    """
+    size = overhead + sys.getsizeof(record.msg)
+
+    args = record.args
+    if args:
+        size += sys.getsizeof(args)
+        size += sum(map(sys.getsizeof, args.values() if isinstance(args, dict) else args))
+
+    if record.exc_text:
+        size += sys.getsizeof(record.exc_text)
+
+    return size
+
+
+def _truncated_record(record: logging.LogRecord, max_length: int) -> logging.LogRecord:
+    """
+    Return a copy of the record with its message cut to max_length characters.
+    The original is left alone, other handlers might still need it.
+    If the message can't be formatted, the record is returned as it is. The target reports the error when it formats it.
+    """
+    try:
+        message = record.getMessage()
+    except Exception:
+        return record
+
+    if len(message) <= max_length:
+        return record
+
+    record = copy.copy(record)
+    record.msg = message[:max_length] + f"... [{len(message) - max_length} characters truncated]"
+    record.args = ()
+    return record
 
 
 class MemoryHandlerRotatingBuffer(logging.handlers.MemoryHandler):
 
-    def __init__(self, capacity, flushLevel=logging.ERROR, target=None, call_after_flushing: Callable = None):
+    def __init__(
+            self,
+            capacity,
+            flushLevel=logging.ERROR,
+            target=None,
+            call_after_flushing: Callable = None,
+            *,
+            compact: bool = False,
+            max_bytes: int = None,
+            truncate_message: int = None,
+            writer: BackgroundWriter = None,
+            deduplicator: TriggerDeduplicator = None,
+            post_trigger_records: int = None,
+            post_trigger_seconds: float = None,
+            max_age: float = None,
+            collect_stats: bool = True,
+    ):
         """
         This handler saves the last n records.
         Following records replace the oldest ones.
         If something with a higher level than 'flushLevel' is logged, the handler passes all entries to another, specified handler.
 
-        THE BUFFER STILL FLUSHES WHEN THE SCRIPT ENDS, I COULDN'T AVOID THAT...
-        Happy for suggestions.
+        Once the interpreter exits, flushing does nothing anymore, so the buffer isn't written just because the script ended.
 
-        :param capacity: How many records to buffer before the oldest ones get deleted
+        :param capacity: How many records to buffer before the oldest ones get deleted. None, if only max_bytes or max_age should limit the buffer
         :param flushLevel: At which level of record the whole buffer is passed to the target-handler
         :param call_after_flushing: Call this function after passing the entries to the target
-        :param target: Handler to receive all records if necessary
+        :param target: Handler to receive all records if necessary. If it has a method handle_batch(records), all records are passed to that at once instead of calling handle for each one
+        :param compact: True, if records should be stored as a compact snapshot and only rebuilt when flushing. Saves a lot of memory for big buffers
+        :param max_bytes: Approximate memory the buffer may take up. The oldest records are deleted until the buffer fits again. The newest record is always kept
+        :param truncate_message: Messages longer than this many characters are cut off before buffering. Only checked for records that are bigger than this in memory
+        :param writer: If provided, flushing only takes a snapshot of the buffer. Passing it to the target and call_after_flushing happen on the writer's thread
+        :param deduplicator: If provided, repeated triggers of the same error don't flush again. Their counts are added to the next flush
+        :param post_trigger_records: If provided, a trigger doesn't flush right away. The buffer keeps recording until this many more records arrived. Triggers in the meantime are written in the same flush
+        :param post_trigger_seconds: Same as post_trigger_records, but flushes after this many seconds. If both are provided, whatever happens first flushes
+        :param max_age: If provided, only records of the last max_age seconds are kept (capacity still limits the count). Older ones are removed when new records arrive, and when flushing
+        :param collect_stats: False, if captured records shouldn't be counted and flushes shouldn't be measured
         """
         super().__init__(capacity, flushLevel, target, flushOnClose=False)
         self.call_after_flushing = call_after_flushing if call_after_flushing else lambda *_:_
 
+        # Ring-buffer: Appending to a full deque drops the oldest record in O(1)
+        self.buffer = deque(maxlen=capacity)
+        self.compact = compact
+
+        self.max_bytes = max_bytes
+        self.truncate_message = truncate_message
+        self._sizes = deque(maxlen=capacity)    # Approximate size of every buffered record, only used with max_bytes
+        self._bytes = 0
+
+        # Creation-time of every buffered record, only used with max_age.
+        # Never decreases, so the oldest records are always at the start and the cutoff can be found with bisect
+        self.max_age = max_age
+        self._times = deque(maxlen=capacity) if max_age is not None else None
+        self._newest_time = 0.0
+
+        self.writer = writer
+        self.deduplicator = deduplicator
+
+        self.post_trigger_records = post_trigger_records
+        self.post_trigger_seconds = post_trigger_seconds
+        self._post_trigger_pending = False
+        self._post_trigger_remaining = None
+        self._post_trigger_timer = None
+        if post_trigger_records is not None or post_trigger_seconds is not None:
+            atexit.register(self.flush_pending)     # There won't be any more records to wait for
+
+        self._stop_summaries = None
+        if deduplicator is not None:
+            self._stop_summaries = self._start_summaries(deduplicator, self.flush_summary)
+
+        self.collect_stats = collect_stats
+        self.stats = BufferStats()
+        self._captured = 0  # Records stored so far. Counted in emit and capture, which hold the handler-lock
+        self._stats_reporter = None
+
+    def emit(self, record):
+        """
+        Save the record and flush, if necessary
+        :param record:
+        :return:
+        """
+        if self._times is not None:
+            self._append_timed(record)
+        elif self.max_bytes is None:
+            self.buffer.append(_compact_record(record) if self.compact else record)
+        else:
+            self._append_limited(record)
+
+        if self.collect_stats:
+            self._captured += 1
+
+        self._check_trigger(record)
+
+    def capture(self, record: _LazyRecord):
+        """
+        Buffer a record from FastCapture.
+        Filters are skipped, the record is stored as it is.
+        :param record:
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._times is not None:
+                self._append_timed(record)
+            elif self.max_bytes is None:
+                self.buffer.append(record)
+            else:
+                self._append_limited(record)
+
+            if self.collect_stats:
+                self._captured += 1
+
+            self._check_trigger(record)
+        finally:
+            self.release()
+
+    def _check_trigger(self, record):
+        """
+        Flush, or start the post-trigger window, if the record requires it
+        :param record:
+        :return:
+        """
+        if self._post_trigger_pending:
+            self._count_post_trigger()
+        elif self.shouldFlush(record):
+            if self.post_trigger_records is None and self.post_trigger_seconds is None:
+                self.flush()
+            else:
+                self._start_post_trigger()
+
+    def _captured_count(self) -> int:
+        """
+        How many records were captured so far
+        :return:
+        """
+        return self._captured
+
+    def _start_post_trigger(self):
+        """
+        Keep recording for a bit, then flush
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._post_trigger_pending:
+                return
+
+            if self.post_trigger_records is not None and self.post_trigger_records <= 0:
+                self.flush()
+                return
+
+            self._post_trigger_pending = True
+            self._post_trigger_remaining = self.post_trigger_records
+
+            if self.post_trigger_seconds is not None:
+                self._post_trigger_timer = threading.Timer(self.post_trigger_seconds, self.flush_pending)
+                self._post_trigger_timer.daemon = True
+                self._post_trigger_timer.start()
+        finally:
+            self.release()
+
+    def _count_post_trigger(self):
+        """
+        A record arrived during the post-trigger window
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._post_trigger_remaining is None:
+                return
+
+            self._post_trigger_remaining -= 1
+            if self._post_trigger_remaining <= 0:
+                self.flush_pending()
+        finally:
+            self.release()
+
+    def flush_pending(self):
+        """
+        End the post-trigger window right away, if there is one
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._post_trigger_pending:
+                self.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        """
+        A post-trigger window that is still open is written first, a trigger already happened.
+        Afterwards, no timer or exit-hook touches the handler anymore
+        :return:
+        """
+        self.flush_pending()
+
+        self.acquire()
+        try:
+            if self._post_trigger_timer is not None:
+                self._post_trigger_timer.cancel()
+                self._post_trigger_timer = None
+            self._post_trigger_pending = False
+        finally:
+            self.release()
+
+        atexit.unregister(self.flush_pending)
+        self.report_stats(None)
+        if self._stop_summaries is not None:
+            self._stop_summaries()
+            self._stop_summaries = None
+
+        super().close()
+
+    def _start_summaries(self, deduplicator: TriggerDeduplicator, flush_summary: Callable[[bool], Any]) -> Callable[[], None]:
+        """
+        Write the deduplicator's summary at exit, and every summary_interval seconds if it is due
+        :param deduplicator:
+        :param flush_summary: Called with only_if_due
+        :return: Function that stops both again
+        """
+        atexit.register(flush_summary, False)  # Runs before pending writes are joined and before _interpreter_exiting is set
+        stop = threading.Event()
+
+        interval = deduplicator.summary_interval
+        if interval is not None:
+            def loop():
+                while not stop.wait(interval):
+                    try:
+                        flush_summary(True)
+                    except Exception:
+                        pass    # Must never break the program
+
+            threading.Thread(target=loop, name="SwiftGUI_Logging summaries", daemon=True).start()
+
+        def stop_summaries():
+            stop.set()
+            atexit.unregister(flush_summary)
+
+        return stop_summaries
+
+    def flush_summary(self, only_if_due: bool = False):
+        """
+        Write the counts of suppressed triggers on their own, without the buffer.
+        Otherwise they would only be written with the next dump, which might never come
+        :param only_if_due: True, if nothing should be written while a dump (with the summary) is still likely to come
+        :return:
+        """
+        deduplicator = self.deduplicator
+        if deduplicator is None or not self.target or _interpreter_exiting:
+            return
+        if only_if_due and not deduplicator.summary_due():
+            return
+
+        self.acquire()
+        try:
+            summary = deduplicator.summary_record()
+            if summary is None:
+                return
+
+            target = self.target
+            records = deque([_compact_record(summary) if self.compact else summary])
+            if self.writer is None:
+                self._pass_to_target(target, records)
+        finally:
+            self.release()
+
+        if self.writer is not None:
+            self.writer.submit(self._pass_to_target, target, records)
+
+    def _append_limited(self, record):
+        """
+        Append a record and keep track of the buffer-size
+        :param record:
+        :return:
+        """
+        overhead = _compact_record_overhead if self.compact else _record_overhead
+        size = _approximate_size(record, overhead)
+
+        if self.truncate_message is not None and size - overhead > self.truncate_message:
+            record = _truncated_record(record, self.truncate_message)
+            size = _approximate_size(record, overhead)
+
+        if len(self._sizes) == self._sizes.maxlen:  # The deque is about to drop its oldest record
+            self._bytes -= self._sizes[0]
+
+        self.buffer.append(_compact_record(record) if self.compact and type(record) is not _LazyRecord else record)
+        self._sizes.append(size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes and len(self.buffer) > 1:
+            self.buffer.popleft()
+            self._bytes -= self._sizes.popleft()
+            if self._times is not None:
+                self._times.popleft()
+
+    def _append_timed(self, record):
+        """
+        Append a record and remove all records that are older than max_age.
+        Every record is removed at most once, so this is O(1) on average
+        :param record:
+        :return:
+        """
+        created = record.created
+        if created < self._newest_time:     # Records of other threads can arrive slightly out of order
+            created = self._newest_time
+        self._newest_time = created
+
+        times = self._times
+        times.append(created)   # Same maxlen as the buffer, so both drop their oldest entry together
+
+        if self.max_bytes is None:
+            self.buffer.append(_compact_record(record) if self.compact and type(record) is not _LazyRecord else record)
+        else:
+            self._append_limited(record)
+
+        oldest_allowed = created - self.max_age
+        buffer = self.buffer
+        while times[0] < oldest_allowed:
+            times.popleft()
+            buffer.popleft()
+            if self.max_bytes is not None:
+                self._bytes -= self._sizes.popleft()
+
+    def _expired_count(self, times: deque) -> int:
+        """
+        How many of the oldest records are older than max_age right now
+        :param times:
+        :return:
+        """
+        if times is None:
+            return 0
+        return bisect.bisect_left(times, time.time() - self.max_age)
+
     def shouldFlush(self, record):
         """
         New records are checked if the "flushing-condition" is met.
+        The buffer "rotates" by itself, so only the level needs to be checked.
         :param record:
         :return:
         """
-        if len(self.buffer) > self.capacity:    # Remove 0th element so the buffer doesn't "overflow"
-            self.buffer.pop(0)
+        if record.levelno < self.flushLevel:
+            return False
+
+        if self.deduplicator is None or self.deduplicator.should_trigger(record):
+            return True
 
-        return record.levelno >= self.flushLevel
+        self.stats.count_suppressed()
+        return False
+
+    def snapshot(self) -> list[logging.LogRecord]:
+        """
+        Copy of all buffered records, oldest first. The buffer stays as it is.
+        :return:
+        """
+        self.acquire()
+        try:
+            records = list(self.buffer)[self._expired_count(self._times):]
+        finally:
+            self.release()
+
+        return [_to_record(record, self.compact) for record in records]
+
+    def _take_records(self) -> deque:
+        """
+        Remove all records from the buffer and return them in order.
+        Must be called while holding the lock.
+        :return:
+        """
+        records = self.buffer    # Swapping the buffer is cheaper than copying it
+        self.buffer = deque(maxlen=self.capacity)
+        self._sizes.clear()
+        self._bytes = 0
+
+        if self._times is not None:
+            # Nothing might have been logged for a while, so some records could be too old by now
+            times = self._times
+            self._times = deque(maxlen=self.capacity)
+            for _ in range(self._expired_count(times)):
+                records.popleft()
+
+        return records
+
+    def _pass_to_target(self, target: logging.Handler | None, records: deque, call_after_flushing: Callable = None):
+        """
+        Hand the records to the target, then call call_after_flushing
+        :param target:
+        :param records:
+        :param call_after_flushing: Called instead of self.call_after_flushing, if provided
+        :return:
+        """
+        start = time.perf_counter()
+        count = len(records)
+        io_before = getattr(target, "io_seconds", 0.0)
+        bytes_before = getattr(target, "bytes_written", 0)
+
+        if target:
+            records = self._consume_records(records)
+
+            handle_batch = getattr(target, "handle_batch", None)
+            if handle_batch is not None:    # The target can take all records at once
+                handle_batch(records)
+            else:
+                for record in records:
+                    target.handle(record)
+
+        (call_after_flushing or self.call_after_flushing)()
+
+        if not self.collect_stats:
+            return
+
+        self.stats.add_flush(
+            count,
+            time.perf_counter() - start,
+            getattr(target, "io_seconds", 0.0) - io_before,
+            getattr(target, "bytes_written", 0) - bytes_before,
+        )
+
+    def _consume_records(self, records: deque):
+        """
+        Yield the records in order and remove them from the deque.
+        Formatting adds the message to every record, so each one is dropped as soon as it was handled.
+        :param records:
+        :return:
+        """
+        while records:
+            yield _to_record(records.popleft(), self.compact)
 
     def flush(self):
-        super().flush()
-        self.call_after_flushing()
+        if _interpreter_exiting:
+            return
+
+        self.acquire()
+        try:
+            self._post_trigger_pending = False
+            if self._post_trigger_timer is not None:
+                self._post_trigger_timer.cancel()
+                self._post_trigger_timer = None
+
+            target = self.target
+            records = self._take_records() if target else deque()   # The buffer is only cleared if there is a target
+            self.stats.count_taken(len(records))
+
+            if target and self.deduplicator is not None:
+                summary = self.deduplicator.summary_record()
+                if summary is not None:
+                    records.append(_compact_record(summary) if self.compact else summary)
+
+            if self.writer is None:
+                self._pass_to_target(target, records)
+        finally:
+            self.release()
+
+        if self.writer is not None:
+            self.writer.submit(self._pass_to_target, target, records)
+
+    def _buffered_count(self) -> int:
+        """
+        How many records are in the buffer right now
+        :return:
+        """
+        return len(self.buffer)
+
+    def stats_snapshot(self) -> dict:
+        """
+        All counters of self.stats, and the current occupancy of the buffer.
+        "records_evicted" are records that were dropped to make room (or because they were too old)
+        :return:
+        """
+        self.acquire()
+        try:
+            return self.stats.snapshot(self._captured_count(), self._buffered_count())
+        finally:
+            self.release()
+
+    def report_stats(self, interval: float, report: Callable[[dict], Any] = None):
+        """
+        Call report with stats_snapshot() every interval seconds, on a daemon-thread.
+        Calling it again replaces the previous reporting, interval=None stops it.
+        :param interval: Seconds between two reports
+        :param report: Receives the snapshot. Logs it to the logger "SwiftGUI_Logging.stats" if not provided
+        :return:
+        """
+        if self._stats_reporter is not None:
+            self._stats_reporter.set()
+            self._stats_reporter = None
+
+        if interval is None:
+            return
+
+        if report is None:
+            logger = logging.getLogger("SwiftGUI_Logging.stats")
+            report = lambda snapshot: logger.info("Buffer stats: %s", snapshot)
+
+        stop = threading.Event()
+        self._stats_reporter = stop
 
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    report(self.stats_snapshot())
+                except Exception:
+                    pass    # Reporting must never break the program
 
+        threading.Thread(target=loop, name="SwiftGUI_Logging stats", daemon=True).start()
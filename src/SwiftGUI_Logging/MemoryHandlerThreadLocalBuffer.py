@@ -0,0 +1,171 @@
+import heapq
+import logging
+import threading
+from collections import deque
+from typing import Callable
+
+from .BackgroundWriter import BackgroundWriter
+from .Deduplication import TriggerDeduplicator
+from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer, _LazyRecord, _compact_record, _created_key, _to_record
+
+
+def _drain(ring: deque) -> list:
+    """
+    Take all records out of a ring, while its thread might still append to it
+    """
+    records = []
+    try:
+        for _ in range(len(ring)):
+            records.append(ring.popleft())
+    except IndexError:  # The owning thread rotated the ring in the meantime
+        pass
+    return records
+
+
+class MemoryHandlerThreadLocalBuffer(MemoryHandlerRotatingBuffer):
+
+    def __init__(
+            self,
+            capacity,
+            flushLevel=logging.ERROR,
+            target=None,
+            call_after_flushing: Callable = None,
+            *,
+            compact: bool = False,
+            writer: BackgroundWriter = None,
+            deduplicator: TriggerDeduplicator = None,
+            post_trigger_records: int = None,
+            post_trigger_seconds: float = None,
+            collect_stats: bool = True,
+    ):
+        """
+        Same as MemoryHandlerRotatingBuffer, but every thread buffers its records in its own ring.
+        Logging doesn't need the handler-lock, so threads don't wait for each other.
+        The lock is only used when flushing, where all rings are merged in the order the records were created.
+
+        :param capacity: How many records to buffer PER THREAD before the oldest ones get deleted
+        :param flushLevel: At which level of record the whole buffer is passed to the target-handler
+        :param target: Handler to receive all records if necessary
+        :param call_after_flushing: Call this function after passing the entries to the target
+        :param compact: True, if records should be stored as a compact snapshot and only rebuilt when flushing
+        :param writer: If provided, the merged records are passed to the target on the writer's thread
+        :param deduplicator: If provided, repeated triggers of the same error don't flush again
+        :param post_trigger_records: If provided, a trigger only flushes after this many more records arrived
+        :param post_trigger_seconds: If provided, a trigger only flushes after this many seconds
+        :param collect_stats: False, if captured records shouldn't be counted and flushes shouldn't be measured
+        """
+        super().__init__(
+            capacity,
+            flushLevel,
+            target,
+            call_after_flushing,
+            compact=compact,
+            writer=writer,
+            deduplicator=deduplicator,
+            post_trigger_records=post_trigger_records,
+            post_trigger_seconds=post_trigger_seconds,
+            collect_stats=collect_stats,
+        )
+
+        self._local = threading.local()
+        # Rings of all threads that logged something, with how many records the thread captured. None for the finished ones.
+        # Only the owning thread increments its count, so counting needs no lock either
+        self._rings: list[tuple[threading.Thread | None, deque, list[int]]] = []
+
+    def _get_ring(self) -> deque:
+        """
+        Return the ring of the current thread, create it if necessary
+        :return:
+        """
+        try:
+            return self._local.ring
+        except AttributeError:
+            ring = deque(maxlen=self.capacity)
+            captured = [0]
+            self._local.ring = ring
+            self._local.captured = captured
+
+            self.acquire()
+            try:
+                self._prune_rings()
+                self._rings.append((threading.current_thread(), ring, captured))
+            finally:
+                self.release()
+
+            return ring
+
+    def _prune_rings(self):
+        """
+        Combine the rings of finished threads into a single one, which only keeps the newest records of all of them.
+        Otherwise, every short-lived thread would leave a whole ring behind until the next flush.
+        Their counts of captured records are added to the handler's count.
+        :return:
+        """
+        alive = []
+        finished = []
+        for thread, ring, captured in self._rings:
+            if thread is not None and thread.is_alive():
+                alive.append((thread, ring, captured))
+                continue
+
+            self._captured += captured[0]   # Nobody appends to these anymore
+            captured[0] = 0
+            if ring:
+                finished.append(ring)
+
+        if len(finished) == 1:
+            alive.append((None, finished[0], [0]))
+        elif finished:
+            alive.append((None, deque(heapq.merge(*finished, key=_created_key(self.compact)), maxlen=self.capacity), [0]))
+
+        self._rings = alive
+
+    def handle(self, record):
+        """
+        Same as logging.Handler.handle, but without acquiring the lock
+        :param record:
+        :return:
+        """
+        rv = self.filter(record)
+        if isinstance(rv, logging.LogRecord):   # Python 3.12+ filters may replace the record
+            record = rv
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        self._get_ring().append(_compact_record(record) if self.compact else record)
+        if self.collect_stats:
+            self._local.captured[0] += 1    # The lock isn't held, but only this thread changes its count
+        self._check_trigger(record)
+
+    def capture(self, record: _LazyRecord):
+        self._get_ring().append(record)
+        if self.collect_stats:
+            self._local.captured[0] += 1
+        self._check_trigger(record)
+
+    def snapshot(self) -> list[logging.LogRecord]:
+        self.acquire()
+        try:
+            rings = [list(ring) for _, ring, _ in self._rings]
+        finally:
+            self.release()
+
+        rings = [[_to_record(record, self.compact) for record in ring] for ring in rings]
+        return list(heapq.merge(*rings, key=lambda record: record.created))
+
+    def _take_records(self) -> deque:
+        self._prune_rings()
+        records = deque(heapq.merge(*(_drain(ring) for _, ring, _ in self._rings), key=_created_key(self.compact)))
+
+        # The ring of finished threads is empty now and not needed anymore
+        self._rings = [entry for entry in self._rings if entry[0] is not None]
+
+        return records
+
+    def _captured_count(self) -> int:
+        return self._captured + sum(captured[0] for _, _, captured in self._rings)
+
+    def _buffered_count(self) -> int:
+        return sum(len(ring) for _, ring, _ in self._rings)
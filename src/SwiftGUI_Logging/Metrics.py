@@ -0,0 +1,118 @@
+import bisect
+import threading
+
+# Upper bounds of the histogram-buckets in seconds. Everything above the last one goes into an overflow-bucket
+_LATENCY_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+
+
+class LatencyHistogram:
+
+    def __init__(self, bounds: tuple[float, ...] = _LATENCY_BOUNDS):
+        """
+        Counts durations in buckets
+        :param bounds: Upper bounds of the buckets in seconds, ascending
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Bucket-name ("<=5ms", ..., ">10s"): count, and some totals
+        :return:
+        """
+        buckets = {
+            f"<={bound * 1000:g}ms" if bound < 1 else f"<={bound:g}s": count
+            for bound, count in zip(self.bounds, self.counts)
+        }
+        buckets[f">{self.bounds[-1]:g}s"] = self.counts[-1]
+
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / count if count else 0.0,
+            "max_seconds": self.maximum,
+            "buckets": buckets,
+        }
+
+
+class BufferStats:
+
+    def __init__(self):
+        """
+        Counters of a buffering handler.
+        Captured records aren't counted here, the handler counts them itself under the lock it holds anyway, and passes the count to snapshot.
+        Evicted records aren't counted at all, they are calculated from the other counters.
+        """
+        self.records_taken = 0  # Records that left the buffer by flushing
+        self.flushes = 0
+        self.flushed_records = 0
+        self.last_records_per_flush = 0
+        self.max_records_per_flush = 0
+        self.bytes_written = 0
+        self.suppressed_triggers = 0
+
+        self.flush_seconds = LatencyHistogram()
+        self.format_seconds = LatencyHistogram()
+        self.io_seconds = LatencyHistogram()
+
+        self._lock = threading.Lock()
+
+    def count_suppressed(self):
+        with self._lock:
+            self.suppressed_triggers += 1
+
+    def count_taken(self, records: int):
+        with self._lock:
+            self.records_taken += records
+
+    def add_flush(self, records: int, seconds: float, io_seconds: float, bytes_written: int):
+        """
+        A flush is done
+        :param records: How many records were passed to the target
+        :param seconds: How long passing them (and call_after_flushing) took
+        :param io_seconds: How much of that time the target spent writing
+        :param bytes_written: How much the target wrote
+        :return:
+        """
+        with self._lock:
+            self.flushes += 1
+            self.flushed_records += records
+            self.last_records_per_flush = records
+            self.max_records_per_flush = max(self.max_records_per_flush, records)
+            self.bytes_written += bytes_written
+
+            self.flush_seconds.add(seconds)
+            self.io_seconds.add(io_seconds)
+            self.format_seconds.add(max(seconds - io_seconds, 0.0))
+
+    def snapshot(self, captured: int, buffered: int) -> dict:
+        """
+        All counters as a dict
+        :param captured: How many records the handler captured so far
+        :param buffered: How many records are in the buffer right now
+        :return:
+        """
+        with self._lock:
+            return {
+                "records_captured": captured,
+                "records_evicted": max(captured - buffered - self.records_taken, 0),
+                "records_buffered": buffered,
+                "flushes": self.flushes,
+                "records_flushed": self.flushed_records,
+                "records_per_flush_last": self.last_records_per_flush,
+                "records_per_flush_max": self.max_records_per_flush,
+                "records_per_flush_mean": self.flushed_records / self.flushes if self.flushes else 0.0,
+                "bytes_written": self.bytes_written,
+                "suppressed_triggers": self.suppressed_triggers,
+                "flush_seconds": self.flush_seconds.snapshot(),
+                "format_seconds": self.format_seconds.snapshot(),
+                "io_seconds": self.io_seconds.snapshot(),
+            }
@@ -0,0 +1,446 @@
+import faulthandler
+import logging
+import mmap
+import os
+import struct
+import weakref
+from pathlib import Path
+
+# File-layout:
+#   Header: magic, slot-size, slot-count, clean-flag, pid
+#   Slots: sequence-number, payload-length, payload
+# A slot is only valid while its sequence-number is not 0.
+# It is set to 0 before the slot is overwritten and written last, so a crash in the middle of a write only loses that one record.
+_MAGIC = b"SGLRING1"
+_HEADER = struct.Struct("<8sIIB3xI")
+_DATA_OFFSET = 64
+_CLEAN_OFFSET = 16  # Position of the clean-flag inside the header
+
+_SLOT_HEADER = struct.Struct("<QH")
+_SEQUENCE = struct.Struct("<Q")
+_RECORD = struct.Struct("<dHIQIHHHHH")  # created, levelno, lineno, thread, process, then the lengths of name, threadName, pathname, funcName, message
+
+
+def _faulthandler_path(filepath: Path) -> Path:
+    return filepath.parent / (filepath.name + ".faulthandler")
+
+
+def _pid_alive(pid: int) -> bool:
+    """
+    True, if a process with this pid is running
+    """
+    if os.name == "nt":
+        return _pid_alive_windows(pid)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:     # E.g. no permission, so it exists
+        pass
+    return True
+
+
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_STILL_ACTIVE = 259
+_ERROR_ACCESS_DENIED = 5
+
+
+def _pid_alive_windows(pid: int) -> bool:
+    """
+    os.kill doesn't check anything on Windows, it terminates the process (or fails for any reason).
+    So the process is opened and asked for its exit-code instead
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    handle = kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return ctypes.get_last_error() == _ERROR_ACCESS_DENIED   # It exists, but belongs to someone else
+
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == _STILL_ACTIVE    # Ended processes stay "openable" while someone holds a handle to them
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+# Handlers that need a ring of their own in forked children
+_handlers_to_reopen = weakref.WeakSet()
+
+
+def _writer_running(pid: int, filepath: str | Path | None = None) -> bool:
+    """
+    True, if the process with this pid still writes the ring
+    """
+    if pid != os.getpid():
+        return _pid_alive(pid)
+
+    # The same pid as an earlier, crashed run (pid 1 in containers, ...), unless this process has the ring open itself
+    if filepath is None:
+        return False
+    filepath = Path(filepath).resolve()
+    return any(handler._mmap is not None and handler.filepath.resolve() == filepath for handler in list(_handlers_to_reopen))
+
+
+def _reopen_after_fork():
+    for handler in list(_handlers_to_reopen):
+        handler._reopen_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen_after_fork)
+
+
+class _RingWriter:
+
+    def __init__(self, buffer, slot_count: int, slot_size: int):
+        """
+        Writes encoded records into the slots of a writable buffer (mmap, shared memory, ...)
+        The buffer must have room for the header and all slots.
+        """
+        self.buffer = buffer
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self._payload_size = slot_size - _SLOT_HEADER.size
+        self._sequence = 0
+
+        buffer[:_HEADER.size] = _HEADER.pack(_MAGIC, slot_size, slot_count, 0, os.getpid())
+
+    def encode(self, record: logging.LogRecord) -> bytes:
+        """
+        Turn the record into bytes that fit into a slot
+        :param record:
+        :return:
+        """
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
+        if record.exc_text:
+            message = message + "\n" + record.exc_text
+
+        name = str(record.name).encode("utf-8")[:255]
+        thread_name = str(record.threadName).encode("utf-8")[:255]
+        pathname = str(record.pathname).encode("utf-8")[-255:]  # The end of the path is more interesting
+        func_name = str(record.funcName).encode("utf-8")[:255]
+
+        available = self._payload_size - _RECORD.size - len(name) - len(thread_name) - len(pathname) - len(func_name)
+        message = message.encode("utf-8")[:max(available, 0)]
+
+        return _RECORD.pack(
+            record.created,
+            record.levelno,
+            record.lineno or 0,
+            record.thread or 0,
+            record.process or 0,
+            len(name), len(thread_name), len(pathname), len(func_name), len(message),
+        ) + name + thread_name + pathname + func_name + message
+
+    def write(self, record: logging.LogRecord):
+        payload = self.encode(record)
+
+        self._sequence += 1
+        offset = _DATA_OFFSET + (self._sequence % self.slot_count) * self.slot_size
+        buffer = self.buffer
+
+        _SEQUENCE.pack_into(buffer, offset, 0)     # Invalidate the slot while writing
+        buffer[offset + _SLOT_HEADER.size: offset + _SLOT_HEADER.size + len(payload)] = payload
+        _SLOT_HEADER.pack_into(buffer, offset, self._sequence, len(payload))
+
+    def mark_clean(self):
+        """
+        Mark the ring as "cleanly closed", so it isn't recovered
+        :return:
+        """
+        self.buffer[_CLEAN_OFFSET] = 1
+
+
+def _ring_size(slot_count: int, slot_size: int) -> int:
+    return _DATA_OFFSET + slot_count * slot_size
+
+
+class MmapRingHandler(logging.Handler):
+
+    def __init__(self, filepath: str | Path, slot_count: int = 4096, slot_size: int = 512, enable_faulthandler: bool = True):
+        """
+        Saves the last n records in a memory-mapped file.
+        Writing a record is just copying bytes into memory, the operating system saves them to the file.
+        That way, the records survive even if the process is killed or crashes inside a C-extension.
+
+        Use recover_mmap_ring when the program starts again to get the records of a crashed run.
+        THE FILE IS OVERWRITTEN WHEN THIS HANDLER IS CREATED, so recover first.
+
+        "{pid}" in filepath is replaced by the pid, so multiple instances of a program (and forked children) get their own rings.
+        Without it, forked children don't write into a ring at all.
+
+        :param filepath: Where to put the ring-file
+        :param slot_count: How many records to keep
+        :param slot_size: Bytes per record. Longer messages are cut off
+        :param enable_faulthandler: True, if faulthandler should write native crashes (segfaults, ...) to a file next to the ring. There can only be one faulthandler-file per process
+        """
+        super().__init__()
+        self._path_template = str(filepath)
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.enable_faulthandler = enable_faulthandler
+
+        self._mmap = None
+        self._ring = None
+        self._faulthandler_file = None
+        self._open()
+
+        _handlers_to_reopen.add(self)
+
+    def _open(self):
+        """
+        Create a fresh ring-file for the current process and map it
+        :return:
+        """
+        self.filepath = Path(self._path_template.replace("{pid}", str(os.getpid())))
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.filepath, "wb") as f:  # A fresh file is filled with zeros, so all slots are invalid
+            f.truncate(_ring_size(self.slot_count, self.slot_size))
+
+        self._file = open(self.filepath, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._ring = _RingWriter(self._mmap, self.slot_count, self.slot_size)
+
+        if self.enable_faulthandler:
+            self._faulthandler_file = open(_faulthandler_path(self.filepath), "w")
+            faulthandler.enable(self._faulthandler_file)
+
+    def _reopen_in_child(self):
+        """
+        After a fork, the child still has the parent's mapping. It must not write into it (or mark it clean)
+        :return:
+        """
+        if self._mmap is None:
+            return
+
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+        self._ring = None
+
+        if self._faulthandler_file is not None:
+            faulthandler.disable()
+            self._faulthandler_file.close()
+            self._faulthandler_file = None
+
+        if "{pid}" in self._path_template:
+            self._open()
+
+    def emit(self, record):
+        ring = self._ring
+        if ring is None:    # Closed, or a forked child without a ring of its own
+            return
+
+        try:
+            ring.write(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """
+        Mark the ring as "cleanly closed", so it isn't recovered
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._mmap is not None:
+                self._ring.mark_clean()
+                self._ring = None
+                self._mmap.close()
+                self._file.close()
+                self._mmap = None
+
+            if self._faulthandler_file is not None:
+                faulthandler.disable()
+                self._faulthandler_file.close()
+                self._faulthandler_file = None
+        finally:
+            self.release()
+
+        super().close()
+
+
+def _read_header(filepath: str | Path) -> bytes:
+    try:
+        with open(filepath, "rb") as f:
+            return f.read(_HEADER.size)
+    except OSError:
+        return b""
+
+
+def mmap_ring_crashed(filepath: str | Path) -> bool:
+    """
+    True, if the ring-file exists and wasn't closed properly, so the process that wrote it crashed.
+    False, while that process is still running
+    :param filepath:
+    :return:
+    """
+    return _ring_crashed(_read_header(filepath), filepath)
+
+
+def mmap_ring_in_use(filepath: str | Path) -> bool:
+    """
+    True, if the process that writes the ring-file is still running
+    :param filepath:
+    :return:
+    """
+    header = _read_header(filepath)
+    if len(header) < _HEADER.size:
+        return False
+
+    magic, _, _, clean, pid = _HEADER.unpack_from(header)
+    return magic == _MAGIC and not clean and _writer_running(pid, filepath)
+
+
+def read_mmap_ring(filepath: str | Path) -> list[logging.LogRecord]:
+    """
+    Read all records from a ring-file, oldest first
+    :param filepath:
+    :return:
+    """
+    return _read_ring(Path(filepath).read_bytes())
+
+
+def _ring_crashed(data, filepath: str | Path = None) -> bool:
+    """
+    True, if the header is valid, but the ring wasn't closed properly
+    """
+    if len(data) < _HEADER.size:
+        return False
+
+    magic, _, _, clean, pid = _HEADER.unpack_from(data)
+    return magic == _MAGIC and not clean and not _writer_running(pid, filepath)  # A running process isn't crashed, even if it's another instance
+
+
+def _read_ring(data) -> list[logging.LogRecord]:
+    """
+    Decode all valid slots of a ring, oldest first
+    :param data: bytes or other buffer containing the whole ring
+    :return:
+    """
+    magic, slot_size, slot_count, _, _ = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Not a SwiftGUI_Logging ring")
+
+    slots = []
+    for i in range(slot_count):
+        offset = _DATA_OFFSET + i * slot_size
+        sequence, length = _SLOT_HEADER.unpack_from(data, offset)
+        if sequence and _RECORD.size <= length <= slot_size - _SLOT_HEADER.size:
+            slots.append((sequence, offset + _SLOT_HEADER.size, length))
+
+    slots.sort()
+
+    records = []
+    for _, offset, length in slots:
+        created, levelno, lineno, thread, process, *lengths = _RECORD.unpack_from(data, offset)
+
+        position = offset + _RECORD.size
+        texts = []
+        for text_length in lengths:
+            texts.append(bytes(data[position: position + text_length]).decode("utf-8", errors="replace"))
+            position += text_length
+        name, thread_name, pathname, func_name, message = texts
+
+        filename = os.path.basename(pathname)
+        records.append(logging.makeLogRecord({
+            "name": name,
+            "msg": message,
+            "args": None,
+            "levelno": levelno,
+            "levelname": logging.getLevelName(levelno),
+            "pathname": pathname,
+            "filename": filename,
+            "module": os.path.splitext(filename)[0],
+            "lineno": lineno,
+            "funcName": func_name,
+            "created": created,
+            "msecs": int((created - int(created)) * 1000) + 0.0,
+            "thread": thread,
+            "threadName": thread_name,
+            "process": process,
+        }))
+
+    return records
+
+
+def recover_mmap_ring(filepath: str | Path, target: logging.Handler) -> bool:
+    """
+    If the process that wrote the ring-file crashed, pass its records to target.
+    Output of faulthandler (native tracebacks) is added as a last, critical record.
+
+    :param filepath: Path of the ring-file
+    :param target: Receives the records
+    :return: True, if there was something to recover
+    """
+    filepath = Path(filepath)
+    if not mmap_ring_crashed(filepath):
+        return False
+
+    records = read_mmap_ring(filepath)
+
+    try:
+        native_traceback = _faulthandler_path(filepath).read_text(errors="replace").strip()
+    except OSError:
+        native_traceback = ""
+
+    if native_traceback:
+        records.append(logging.LogRecord(
+            "SwiftGUI_Logging", logging.CRITICAL, str(filepath), 0,
+            "Native crash (faulthandler):\n%s", (native_traceback,), None,
+        ))
+
+    _pass_to_target(target, records)
+    return True
+
+
+def recover_mmap_rings(directory: str | Path, pattern: str, target: logging.Handler) -> int:
+    """
+    recover_mmap_ring for every ring-file matching the glob-pattern, e.g. the rings of all earlier instances of a program ("Crash.*.ring").
+    Rings of running processes are skipped, all others are deleted afterwards (with their faulthandler-files).
+    If target has a method finish_file, it is called after every recovered ring, so every ring gets its own file.
+
+    :param directory: Where the ring-files are
+    :param pattern: Glob-pattern of the ring-files
+    :param target: Receives the records
+    :return: How many rings were recovered
+    """
+    recovered = 0
+    for filepath in sorted(Path(directory).glob(pattern)):
+        if mmap_ring_in_use(filepath):
+            continue
+
+        if recover_mmap_ring(filepath, target):
+            recovered += 1
+
+            finish_file = getattr(target, "finish_file", None)
+            if finish_file is not None:
+                finish_file()
+
+        filepath.unlink(missing_ok=True)
+        _faulthandler_path(filepath).unlink(missing_ok=True)
+
+    return recovered
+
+
+def _pass_to_target(target: logging.Handler, records: list[logging.LogRecord]):
+    handle_batch = getattr(target, "handle_batch", None)
+    if handle_batch is not None:
+        handle_batch(records)
+    else:
+        for record in records:
+            target.handle(record)
+
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Any
+
+
+class CrashLogRetention:
+
+    def __init__(
+            self,
+            manifest_path: str | Path,
+            max_files: int = None,
+            max_bytes: int = None,
+            max_age: float = None,
+            pattern: str = None,
+            on_delete: Callable[[Path], Any] = None,
+    ):
+        """
+        Deletes old crash-files, so a program that crashes over and over can't fill up the disk.
+
+        Every finished file is added to a small manifest-file (one line per file, oldest first).
+        Limits are checked against the manifest only, so the directory never needs to be listed (except once, if there is no manifest yet).
+        The newest file is never deleted, even if it is larger than max_bytes on its own.
+
+        :param manifest_path: Where to save the manifest. Usually next to the crash-files
+        :param max_files: Keep at most this many files
+        :param max_bytes: Keep at most this many bytes (of the files, not counting the manifest)
+        :param max_age: Delete files older than this many seconds
+        :param pattern: Glob-pattern of the files, used once to find existing files if there is no manifest yet
+        :param on_delete: Called with the path of every deleted file, e.g. CrashIndex.forget
+        """
+        self.manifest_path = Path(manifest_path)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pattern = pattern
+        self.on_delete = on_delete
+
+        self._entries: list[tuple[float, int, str]] = []     # (created, bytes, filename), oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Read the manifest, or create it if it doesn't exist yet.
+        It is read again every time, because other processes might write crash-files into the same directory
+        :return:
+        """
+        self._entries = []
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        created, size, name = line.rstrip("\n").split("\t", 2)
+                        self._entries.append((float(created), int(size), name))
+                    except ValueError:  # Probably cut off by a crash while it was written
+                        continue
+        except FileNotFoundError:
+            self._entries = self._existing_files()
+            self._save()
+
+        self._total_bytes = sum(size for _, size, _ in self._entries)
+
+    def _existing_files(self) -> list[tuple[float, int, str]]:
+        """
+        Files that were written before there was a manifest
+        :return:
+        """
+        if not self.pattern:
+            return []
+
+        entries = []
+        for path in self.manifest_path.parent.glob(self.pattern):
+            if path == self.manifest_path or not path.is_file():
+                continue
+
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path.name))
+
+        entries.sort()
+        return entries
+
+    def _save(self):
+        """
+        Rewrite the whole manifest
+        :return:
+        """
+        temporary_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{created}\t{size}\t{name}\n" for created, size, name in self._entries)
+        os.replace(temporary_path, self.manifest_path)  # The old manifest stays valid until the new one is complete
+
+    def _expired(self) -> int:
+        """
+        How many of the oldest entries need to go
+        :return:
+        """
+        entries = self._entries
+        count = 0
+        remaining_bytes = self._total_bytes
+        oldest_allowed = time.time() - self.max_age if self.max_age is not None else None
+
+        while count < len(entries) - 1:     # Keep the newest
+            created, size, _ = entries[count]
+            if (
+                    (self.max_files is not None and len(entries) - count > self.max_files)
+                    or (self.max_bytes is not None and remaining_bytes > self.max_bytes)
+                    or (oldest_allowed is not None and created < oldest_allowed)
+            ):
+                count += 1
+                remaining_bytes -= size
+                continue
+            break
+
+        return count
+
+    def add(self, path: str | Path):
+        """
+        Add a finished file and delete the oldest ones that exceed the limits
+        :param path: The file. It must be in the same directory as the manifest
+        :return:
+        """
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+
+        with self._lock:
+            self._load()
+
+            for index, (_, old_size, name) in enumerate(self._entries):
+                if name == path.name:   # Same file again (appended to). Otherwise it would be deleted with its old entry
+                    del self._entries[index]
+                    self._total_bytes -= old_size
+                    self._save()
+                    break
+
+            entry = (time.time(), size, path.name)
+            self._entries.append(entry)
+            self._total_bytes += size
+
+            expired = self._expired()
+            if not expired:
+                with open(self.manifest_path, "a", encoding="utf-8") as f:
+                    f.write(f"{entry[0]}\t{entry[1]}\t{entry[2]}\n")
+                return
+
+            for _, size, name in self._entries[:expired]:
+                path = self.manifest_path.parent / name
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._total_bytes -= size
+
+                if self.on_delete is not None:
+                    self.on_delete(path)
+
+            del self._entries[:expired]
+            self._save()
+
+    def files(self) -> list[Path]:
+        """
+        All files that are currently kept, oldest first
+        :return:
+        """
+        with self._lock:
+            self._load()
+            return [self.manifest_path.parent / name for _, _, name in self._entries]
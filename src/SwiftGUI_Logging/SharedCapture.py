@@ -0,0 +1,368 @@
+import importlib
+import logging
+import sys
+import threading
+from collections import deque
+from typing import Callable
+
+from .BackgroundWriter import BackgroundWriter
+from .Deduplication import TriggerDeduplicator
+from .ExceptionHandling import _format_exception, reroute_exceptions
+from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer, _stored_attributes
+
+# The package-attribute of the same name is the class, not the module
+_rotating = importlib.import_module(".MemoryHandlerRotatingBuffer", __package__)
+
+_compact_name_index = _stored_attributes.index("name")
+_compact_levelno_index = _stored_attributes.index("levelno")
+
+# Unhandled exceptions are logged here, exactly once. Every sink that catches exceptions writes them
+_exception_logger_name = "SwiftGUI_Logging.exceptions"
+
+
+def _name_and_level(item) -> tuple[str, int]:
+    """
+    Logger-name and level of whatever is stored in the buffer
+    """
+    if type(item) is tuple:     # Compact record
+        return item[_compact_name_index], item[_compact_levelno_index]
+    return item.name, item.levelno
+
+
+class CaptureSink:
+
+    def __init__(
+            self,
+            logger_name: str = "",
+            level: int = logging.NOTSET,
+            trigger_level: int = logging.ERROR,
+            target: logging.Handler = None,
+            call_after_flushing: Callable = None,
+            *,
+            writer: BackgroundWriter = None,
+            deduplicator: TriggerDeduplicator = None,
+            catch_exceptions: bool = True,
+    ):
+        """
+        A filtered view of the SharedCaptureBuffer with its own trigger and output.
+        When triggered, all matching records since its last flush are passed to the target.
+
+        :param logger_name: Only records of this logger and its children. "" for all records
+        :param level: Only records at or above this level
+        :param trigger_level: Matching records at or above this level flush the sink
+        :param target: Handler to receive the records. If it has a method handle_batch(records), all records are passed to that at once
+        :param call_after_flushing: Call this function after passing the records to the target
+        :param writer: If provided, the records are passed to the target on the writer's thread
+        :param deduplicator: If provided, repeated triggers of the same error don't flush again
+        :param catch_exceptions: True, if unhandled exceptions (caught by SharedCaptureBuffer.catch_exceptions) should flush this sink too, no matter where they happened
+        """
+        self.logger_name = logger_name
+        self.level = level
+        self.trigger_level = trigger_level
+        self.target = target
+        self.call_after_flushing = call_after_flushing if call_after_flushing else lambda *_:_
+        self.writer = writer
+        self.deduplicator = deduplicator
+        self.catch_exceptions = catch_exceptions
+
+        self._prefix = logger_name + "."
+        self._written_upto = 0  # Sequence-number of the newest record that was already passed to the target
+
+    def matches(self, name: str, levelno: int) -> bool:
+        """
+        True, if a record of this logger and level belongs into this sink
+        :param name:
+        :param levelno:
+        :return:
+        """
+        if levelno < self.level:
+            return False
+
+        if not self.logger_name or name == self.logger_name or name.startswith(self._prefix):
+            return True
+
+        return self.catch_exceptions and name == _exception_logger_name
+
+
+class SharedCaptureBuffer(MemoryHandlerRotatingBuffer):
+
+    def __init__(
+            self,
+            capacity,
+            *,
+            compact: bool = False,
+            max_bytes: int = None,
+            max_age: float = None,
+    ):
+        """
+        One ring for the whole process, usually attached to the root-logger (see shared_capture_buffer).
+        Every record is stored once, no matter how many sinks are interested in it.
+        The buffer itself never flushes, every CaptureSink has its own trigger and target.
+
+        :param capacity: How many records to buffer before the oldest ones get deleted
+        :param compact: True, if records should be stored as a compact snapshot and only rebuilt when flushing
+        :param max_bytes: Approximate memory the buffer may take up
+        :param max_age: If provided, only records of the last max_age seconds are kept
+        """
+        super().__init__(capacity, compact=compact, max_bytes=max_bytes, max_age=max_age)
+
+        self.sinks: list[CaptureSink] = []
+        self._sequence = 0  # How many records were stored so far
+        self._lowest_trigger = None     # Records below this can't trigger any sink
+
+        self._sink_summaries: dict[CaptureSink, Callable[[], None]] = dict()   # Stops the summaries of a sink
+        self._hooks: set[str] = set()   # Exception-hooks that are already installed
+        self._catch = None
+        self._traceback_formatter = None
+
+    def add_sink(self, sink: CaptureSink):
+        """
+        Start passing matching records to the sink.
+        Records that are already buffered are included in its first flush.
+        :param sink:
+        :return:
+        """
+        self.acquire()
+        try:
+            self.sinks.append(sink)
+            self._lowest_trigger = min(s.trigger_level for s in self.sinks)
+        finally:
+            self.release()
+
+        if sink.deduplicator is not None:
+            self._sink_summaries[sink] = self._start_summaries(sink.deduplicator, lambda only_if_due: self.flush_sink_summary(sink, only_if_due))
+
+    def remove_sink(self, sink: CaptureSink):
+        self.acquire()
+        try:
+            self.sinks.remove(sink)
+            self._lowest_trigger = min((s.trigger_level for s in self.sinks), default=None)
+        finally:
+            self.release()
+
+        stop_summaries = self._sink_summaries.pop(sink, None)
+        if stop_summaries is not None:
+            stop_summaries()
+
+    def close(self):
+        for stop_summaries in self._sink_summaries.values():
+            stop_summaries()
+        self._sink_summaries.clear()
+
+        super().close()
+
+    def grow(self, capacity: int | None):
+        """
+        Make the ring bigger (never smaller). None for unlimited
+        :param capacity:
+        :return:
+        """
+        self.acquire()
+        try:
+            if self.capacity is None or (capacity is not None and capacity <= self.capacity):
+                return
+
+            self.capacity = capacity
+            self.buffer = deque(self.buffer, maxlen=capacity)
+            self._sizes = deque(self._sizes, maxlen=capacity)
+            if self._times is not None:
+                self._times = deque(self._times, maxlen=capacity)
+        finally:
+            self.release()
+
+    def _check_trigger(self, record):
+        """
+        Flush every sink the record triggers
+        :param record:
+        :return:
+        """
+        self._sequence += 1
+
+        levelno = record.levelno
+        if self._lowest_trigger is None or levelno < self._lowest_trigger:
+            return
+
+        name = record.name
+        for sink in self.sinks:
+            if levelno < sink.trigger_level or not sink.matches(name, levelno):
+                continue
+
+            if sink.deduplicator is None or sink.deduplicator.should_trigger(record):
+                self.flush_sink(sink)
+            else:
+                self.stats.count_suppressed()
+
+    def flush_sink(self, sink: CaptureSink):
+        """
+        Pass all matching records since the sink's last flush to its target.
+        The buffer stays as it is, other sinks might still need the records
+        :param sink:
+        :return:
+        """
+        if _rotating._interpreter_exiting:
+            return
+
+        self.acquire()
+        try:
+            items = list(self.buffer)[self._expired_count(self._times):]
+            new = self._sequence - sink._written_upto
+            sink._written_upto = self._sequence
+
+            matches = sink.matches
+            records = deque(
+                item for item in items[max(len(items) - new, 0):]
+                if matches(*_name_and_level(item))
+            )
+
+            if sink.deduplicator is not None:
+                summary = sink.deduplicator.summary_record()
+                if summary is not None:
+                    records.append(_rotating._compact_record(summary) if self.compact else summary)
+
+            if sink.writer is None:
+                self._pass_to_target(sink.target, records, sink.call_after_flushing)
+        finally:
+            self.release()
+
+        if sink.writer is not None:
+            sink.writer.submit(self._pass_to_target, sink.target, records, sink.call_after_flushing)
+
+    def flush_sink_summary(self, sink: CaptureSink, only_if_due: bool = False):
+        """
+        flush_summary for a single sink
+        :param sink:
+        :param only_if_due:
+        :return:
+        """
+        deduplicator = sink.deduplicator
+        if deduplicator is None or _rotating._interpreter_exiting:
+            return
+        if only_if_due and not deduplicator.summary_due():
+            return
+
+        summary = deduplicator.summary_record()
+        if summary is None:
+            return
+
+        records = deque([_rotating._compact_record(summary) if self.compact else summary])
+        if sink.writer is None:
+            self.acquire()
+            try:
+                self._pass_to_target(sink.target, records, sink.call_after_flushing)
+            finally:
+                self.release()
+        else:
+            sink.writer.submit(self._pass_to_target, sink.target, records, sink.call_after_flushing)
+
+    def flush(self):
+        """
+        Does nothing, every sink is flushed by its own trigger (or flush_sink)
+        :return:
+        """
+        pass
+
+    def _join_writers(self):
+        """
+        Wait until every sink's pending writes are done
+        :return:
+        """
+        for sink in list(self.sinks):
+            if sink.writer is not None:
+                sink.writer.join()
+
+    def catch_exceptions(
+            self,
+            include_main_thread: bool = True,
+            include_threads: bool = True,
+            include_tkinter: bool = True,
+            reraise: bool = False,
+            traceback_formatter: Callable = None,
+    ) -> Callable:
+        """
+        Install a single exception-hook for all sinks.
+        Every unhandled exception is formatted and logged once (to "SwiftGUI_Logging.exceptions"), which flushes every sink with catch_exceptions.
+        Calling this again only installs the hooks that are still missing, existing ones keep their reraise and traceback_formatter.
+
+        :param include_main_thread: True, if the "normal thread's" exceptions should be caught
+        :param include_threads: True, if Thread-exceptions should be caught too
+        :param include_tkinter: True, if Tkinter-exceptions should be caught too
+        :param reraise: True, if the exception should still be raised, even though it was logged
+        :param traceback_formatter: Function that turns exceptions into text. Only used by the first call
+        :return: The function that gets called with the exception-info
+        """
+        self.acquire()
+        try:
+            requested = {
+                "main_thread": include_main_thread,
+                "threads": include_threads,
+                "tkinter": include_tkinter,
+            }
+            missing = {kind for kind, wanted in requested.items() if wanted and kind not in self._hooks}
+
+            if self._catch is not None and not missing:
+                return self._catch
+
+            if self._traceback_formatter is None:
+                self._traceback_formatter = traceback_formatter or _format_exception
+
+            catch = reroute_exceptions(
+                logging.getLogger(_exception_logger_name),
+                logging.CRITICAL,
+                include_main_thread="main_thread" in missing,
+                include_threads="threads" in missing,
+                include_tkinter="tkinter" in missing,
+                reraise=reraise,
+                traceback_formatter=self._traceback_formatter,
+            )
+            if self._catch is None:
+                self._catch = catch
+            self._hooks |= missing
+
+            if "main_thread" in missing:
+                # The program ends after an unhandled exception, so pending crash-logs have to be written first
+                excepthook = sys.excepthook
+                def excepthook_and_wait(*args):
+                    excepthook(*args)
+                    self._join_writers()
+
+                sys.excepthook = excepthook_and_wait
+
+            return self._catch
+        finally:
+            self.release()
+
+
+_shared_buffer: SharedCaptureBuffer | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_capture_buffer(
+        capacity: int | None = 5000,
+        *,
+        compact: bool = False,
+        max_bytes: int = None,
+        max_age: float = None,
+) -> SharedCaptureBuffer:
+    """
+    The process-wide SharedCaptureBuffer, attached to the root-logger.
+    It is created by the first call, later calls only make it bigger if necessary.
+    compact, max_bytes and max_age are only used when it is created.
+
+    Only records that reach the root-logger are captured, so loggers with propagate=False can't use it.
+
+    :param capacity: How many records to buffer at least. None for unlimited
+    :param compact: True, if records should be stored as a compact snapshot
+    :param max_bytes: Approximate memory the buffer may take up
+    :param max_age: If provided, only records of the last max_age seconds are kept
+    :return:
+    """
+    global _shared_buffer
+
+    with _shared_lock:
+        if _shared_buffer is None:
+            _shared_buffer = SharedCaptureBuffer(capacity, compact=compact, max_bytes=max_bytes, max_age=max_age)
+            logging.getLogger().addHandler(_shared_buffer)
+        else:
+            _shared_buffer.grow(capacity)
+
+        return _shared_buffer
@@ -0,0 +1,260 @@
+import atexit
+import heapq
+import logging
+import multiprocessing
+import os
+import struct
+from multiprocessing import util
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable
+
+from .MmapRingBuffer import _RingWriter, _pass_to_target, _pid_alive, _read_ring, _ring_crashed, _ring_size
+
+# Control-segment: Number of entries, then the pid of every attached worker (0 = free)
+# Entry i belongs to ring-segment i, all of them are created (and held) by the parent
+_CONTROL_HEADER = struct.Struct("<I")
+_CONTROL_ENTRY = struct.Struct("<I")
+
+
+def _segment_name(control_name: str, index: int) -> str:
+    return f"{control_name}_{index}"
+
+
+class SharedMemoryRingHandler(logging.Handler):
+
+    def __init__(self, control_name: str, lock, slot_count: int, slot_size: int):
+        """
+        Writes records of a worker-process into its own shared-memory ring.
+        Usually created by attach_worker, not directly.
+        """
+        super().__init__()
+        self._control_name = control_name
+        self._lock = lock
+
+        # Claim a free entry, its segment becomes this worker's ring
+        control = SharedMemory(control_name)
+        try:
+            with lock:
+                count, = _CONTROL_HEADER.unpack_from(control.buf)
+                for index in range(count):
+                    offset = _CONTROL_HEADER.size + index * _CONTROL_ENTRY.size
+                    if not _CONTROL_ENTRY.unpack_from(control.buf, offset)[0]:
+                        break
+                else:
+                    raise RuntimeError("SharedMemoryCrashBuffer has no free entries left, increase max_workers")
+
+                self._segment = SharedMemory(_segment_name(control_name, index))   # Owned by the parent, it deletes it
+                size = _ring_size(slot_count, slot_size)
+                self._segment.buf[:size] = bytes(size)  # The previous worker of this entry might have left records behind
+                self._ring = _RingWriter(self._segment.buf, slot_count, slot_size)
+
+                _CONTROL_ENTRY.pack_into(control.buf, offset, os.getpid())  # Only now the parent reads the ring
+        finally:
+            control.close()
+
+    def emit(self, record):
+        try:
+            self._ring.write(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        """
+        Mark the ring as "cleanly closed", so the parent doesn't treat it as crashed
+        :return:
+        """
+        self.acquire()
+        try:
+            if self._ring is not None:
+                self._ring.mark_clean()
+                self._ring = None
+                self._segment.close()
+        finally:
+            self.release()
+
+        super().close()
+
+
+def attach_worker(control_name: str, lock, slot_count: int, slot_size: int, logger: str = "", log_level: int = logging.DEBUG):
+    """
+    Set up crash-buffering inside a worker-process.
+    Meant to be used as initializer of a pool, with SharedMemoryCrashBuffer.worker_args() as initargs.
+
+    :param control_name: Passed by worker_args
+    :param lock: Passed by worker_args
+    :param slot_count: Passed by worker_args
+    :param slot_size: Passed by worker_args
+    :param logger: Name of the logger to buffer
+    :param log_level: Logs below this level are ignored
+    :return:
+    """
+    handler = SharedMemoryRingHandler(control_name, lock, slot_count, slot_size)
+
+    logger = logging.getLogger(logger)
+    logger.setLevel(log_level)
+    logger.addHandler(handler)
+
+    # Workers end with os._exit, so atexit only runs for spawned ones. multiprocessing runs its finalizers either way
+    util.Finalize(handler, handler.close, exitpriority=10)
+    atexit.register(handler.close)
+
+
+class SharedMemoryCrashBuffer:
+
+    def __init__(self, max_workers: int = 64, slot_count: int = 1024, slot_size: int = 512, mp_context=None):
+        """
+        Crash-buffers for worker-processes (multiprocessing, ProcessPoolExecutor, ...).
+        Every worker writes its last records into its own shared-memory ring, without sending anything to the parent.
+        If a worker dies, the parent can still read what it logged.
+
+        Create this in the parent and pass attach_worker/worker_args() as initializer to the pool:
+            crash_buffer = SharedMemoryCrashBuffer()
+            ProcessPoolExecutor(initializer=attach_worker, initargs=crash_buffer.worker_args())
+
+        The parent creates and holds the segments of all max_workers entries up front.
+        That way, the ring of a crashed worker survives even where shared memory is deleted with its last handle (Windows).
+        Rings of crashed workers are kept until they are dumped, so the parent needs to stay alive.
+        The segments only take up memory once workers write into them, but they count towards the commit-limit on Windows.
+
+        :param max_workers: How many workers may attach over the lifetime of this buffer
+        :param slot_count: How many records every worker keeps
+        :param slot_size: Bytes per record. Longer messages are cut off
+        :param mp_context: The multiprocessing-context the workers are started with, if it isn't the default one
+        """
+        self.max_workers = max_workers
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+
+        self._control = SharedMemory(create=True, size=_CONTROL_HEADER.size + max_workers * _CONTROL_ENTRY.size)
+        _CONTROL_HEADER.pack_into(self._control.buf, 0, max_workers)
+        self._lock = (mp_context or multiprocessing).Lock()
+
+        size = _ring_size(slot_count, slot_size)
+        self._segments = [SharedMemory(_segment_name(self._control.name, i), create=True, size=size) for i in range(max_workers)]
+
+        atexit.register(self.close)
+
+    def worker_args(self, logger: str = "", log_level: int = logging.DEBUG) -> tuple:
+        """
+        Arguments for attach_worker
+        :param logger: Name of the logger to buffer inside the workers
+        :param log_level: Logs below this level are ignored
+        :return:
+        """
+        return self._control.name, self._lock, self.slot_count, self.slot_size, logger, log_level
+
+    def _entries(self) -> list[tuple[int, int]]:
+        """
+        (index, pid) of every attached worker
+        """
+        entries = []
+        for i in range(self.max_workers):
+            pid, = _CONTROL_ENTRY.unpack_from(self._control.buf, _CONTROL_HEADER.size + i * _CONTROL_ENTRY.size)
+            if pid:
+                entries.append((i, pid))
+        return entries
+
+    def _index(self, pid: int) -> int:
+        """
+        Entry of an attached worker
+        """
+        for index, entry_pid in self._entries():
+            if entry_pid == pid:
+                return index
+        raise KeyError(f"No worker with pid {pid} is attached")
+
+    def _release(self, index: int):
+        """
+        Free the entry of a worker, so another one can use its segment
+        """
+        with self._lock:
+            _CONTROL_ENTRY.pack_into(self._control.buf, _CONTROL_HEADER.size + index * _CONTROL_ENTRY.size, 0)
+
+    def crashed_workers(self) -> list[int]:
+        """
+        Pids of all workers that ended without closing their ring.
+        Entries of workers that ended normally are freed on the way.
+        :return:
+        """
+        crashed = []
+        for index, pid in self._entries():
+            if _pid_alive(pid):
+                continue
+
+            if _ring_crashed(self._segments[index].buf):
+                crashed.append(pid)
+            else:
+                self._release(index)
+
+        return crashed
+
+    def read_worker(self, pid: int) -> list[logging.LogRecord]:
+        """
+        Records of a worker, oldest first. The worker may still be alive
+        :param pid:
+        :return:
+        """
+        return _read_ring(self._segments[self._index(pid)].buf)
+
+    def dump_worker(self, pid: int, target: logging.Handler, context: Iterable[logging.LogRecord] = ()):
+        """
+        Pass the records of a worker to target, merged with the parent's own records in order of creation.
+        If the worker died without closing its ring, a critical record says so.
+        Its entry is freed afterwards, if the worker is dead.
+
+        :param pid: Pid of the worker
+        :param target: Receives the records
+        :param context: Records of the parent, e.g. MemoryHandlerRotatingBuffer.snapshot()
+        :return:
+        """
+        index = self._index(pid)
+        buffer = self._segments[index].buf
+        records = _read_ring(buffer)
+
+        crashed = _ring_crashed(buffer)     # False while it's still running
+        if crashed:
+            records.append(logging.LogRecord(
+                "SwiftGUI_Logging", logging.CRITICAL, __file__, 0,
+                "Worker-process %s ended without closing its crash-buffer", (pid,), None,
+            ))
+
+        _pass_to_target(target, list(heapq.merge(records, context, key=lambda record: record.created)))
+
+        if crashed or not _pid_alive(pid):
+            self._release(index)
+
+    def dump_crashed_workers(self, target: logging.Handler, context: Iterable[logging.LogRecord] = ()) -> list[int]:
+        """
+        Dump every crashed worker, see dump_worker
+        :param target: Receives the records
+        :param context: Records of the parent, e.g. MemoryHandlerRotatingBuffer.snapshot()
+        :return: Pids of the dumped workers
+        """
+        context = list(context)
+        crashed = self.crashed_workers()
+        for pid in crashed:
+            self.dump_worker(pid, target, context)
+
+            call_after = getattr(target, "finish_file", None)
+            if call_after is not None:  # One file per worker
+                call_after()
+
+        return crashed
+
+    def close(self):
+        """
+        Delete all segments
+        :return:
+        """
+        if self._control is None:
+            return
+
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+        self._control.close()
+        self._control.unlink()
+        self._control = None
+
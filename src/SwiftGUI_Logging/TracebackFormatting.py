@@ -0,0 +1,201 @@
+import builtins
+import linecache
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from types import TracebackType, CodeType
+
+# Only a builtin since Python 3.11
+_exception_group = getattr(builtins, "BaseExceptionGroup", None)
+
+
+class _Repeated:
+    __slots__ = ("frames", "times")
+
+    def __init__(self, frames: int, times: int):
+        self.frames = frames
+        self.times = times
+
+    def text(self) -> str:
+        if self.frames == 1:
+            return f"  [Previous line repeated {self.times} more times]\n"
+        return f"  [Previous {self.frames} frames repeated {self.times} more times]\n"
+
+
+def _collapse_repeats(keys: list, max_period: int, min_repeats: int) -> list:
+    """
+    Replace recursion (the same block of frames, multiple times in a row) by one block and a _Repeated-marker.
+    :param keys: The frames
+    :param max_period: Longest block to look for (1 is "a function calling itself")
+    :param min_repeats: How often the block must occur before it is collapsed
+    :return:
+    """
+    collapsed = []
+    count = len(keys)
+    i = 0
+
+    while i < count:
+        for period in range(1, min(max_period, (count - i) // min_repeats) + 1):
+            block = keys[i:i + period]
+            end = i + period
+            while keys[end:end + period] == block:
+                end += period
+
+            repeats = (end - i) // period
+            if repeats >= min_repeats:
+                collapsed.extend(block)
+                collapsed.append(_Repeated(period, repeats - 1))
+                i = end
+                break
+        else:
+            collapsed.append(keys[i])
+            i += 1
+
+    return collapsed
+
+
+class TracebackFormatter:
+
+    def __init__(
+            self,
+            max_cached_lines: int = 4096,
+            max_frames: int = 200,
+            max_period: int = 8,
+            min_repeats: int = 3,
+            time_budget: float = 0.05,
+    ):
+        """
+        Cheaper replacement for traceback.format_exception.
+        Rendered frame-lines are cached by code-object and line-number, so the same frames don't need to be looked up again.
+        Recursion is collapsed and very deep stacks are shortened, so a traceback can't become too long.
+
+        The output is the same as traceback's, without the ~~^^^-markers under the source-lines.
+        It isn't used by default, pass it as traceback_formatter to reroute_exceptions or exceptions_to_file.
+
+        :param max_cached_lines: How many frame-lines to remember. The least recently used ones are forgotten first
+        :param max_frames: More frames (after collapsing recursion) than this are cut out of the middle of the stack
+        :param max_period: Longest block of frames that is detected as recursion (a->b->a->b... is 2)
+        :param min_repeats: How often a block must repeat to be collapsed
+        :param time_budget: Seconds a single exception may take to format. After that, source-lines are skipped for frames that aren't cached
+        """
+        self.max_cached_lines = max_cached_lines
+        self.max_frames = max_frames
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.time_budget = time_budget
+
+        self._lines: OrderedDict[tuple[int, int], tuple[CodeType, str]] = OrderedDict()    # The code is kept so its id can't be reused
+        self._lock = threading.Lock()
+
+    def _frame_text(self, code: CodeType, lineno: int, with_source: bool = True) -> str:
+        """
+        Text of a single frame, from the cache if possible
+        :param code:
+        :param lineno:
+        :param with_source: False, if the source-line shouldn't be looked up (if it isn't cached)
+        :return:
+        """
+        key = (id(code), lineno)
+
+        with self._lock:
+            cached = self._lines.get(key)
+            if cached is not None and cached[0] is code:
+                self._lines.move_to_end(key)
+                return cached[1]
+
+        text = f'  File "{code.co_filename}", line {lineno}, in {code.co_name}\n'
+        if not with_source:
+            return text
+
+        if lineno is not None:
+            line = linecache.getline(code.co_filename, lineno).strip()
+            if line:
+                text += f"    {line}\n"
+
+        with self._lock:
+            self._lines[key] = (code, text)
+            if len(self._lines) > self.max_cached_lines:
+                self._lines.popitem(last=False)
+
+        return text
+
+    def _format_stack(self, tb: TracebackType, deadline: float) -> str:
+        """
+        Text of all frames of a traceback
+        :param tb:
+        :param deadline: perf_counter-time after which source-lines are skipped
+        :return:
+        """
+        frames = [(frame.f_code, lineno) for frame, lineno in traceback.walk_tb(tb)]
+        keys = [(id(code), lineno) for code, lineno in frames]
+        codes = dict(zip(keys, frames))
+
+        entries = _collapse_repeats(keys, self.max_period, self.min_repeats)
+
+        if len(entries) > self.max_frames:
+            # The innermost frames are usually more interesting
+            head = self.max_frames // 4
+            tail = self.max_frames - head
+            omitted = len(entries) - head - tail
+            entries = entries[:head] + [f"  [... {omitted} frames omitted ...]\n"] + entries[-tail:]
+
+        parts = ["Traceback (most recent call last):\n"]
+        skipped_source = False
+        for entry in entries:
+            if entry.__class__ is tuple:
+                with_source = time.perf_counter() < deadline
+                skipped_source = skipped_source or not with_source
+                parts.append(self._frame_text(*codes[entry], with_source))
+            elif entry.__class__ is _Repeated:
+                parts.append(entry.text())
+            else:
+                parts.append(entry)
+
+        if skipped_source:
+            parts.append(f"  [Some source-lines were skipped, formatting took longer than {self.time_budget}s]\n")
+
+        return "".join(parts)
+
+    def format_exception(self, exctype: type, value: BaseException | None, tb: TracebackType | None) -> str:
+        """
+        Like "".join(traceback.format_exception(...)), including chained exceptions
+        :param exctype:
+        :param value:
+        :param tb:
+        :return:
+        """
+        if _exception_group is not None and isinstance(value, _exception_group):
+            return "".join(traceback.format_exception(exctype, value, tb))  # Rare enough to not bother
+
+        deadline = time.perf_counter() + self.time_budget
+
+        # Walk the chain first, the oldest exception is printed first
+        chain = [(exctype, value, tb, "")]
+        seen = {id(value)}
+        while value is not None:
+            if value.__cause__ is not None:
+                value = value.__cause__
+                separator = "\nThe above exception was the direct cause of the following exception:\n\n"
+            elif value.__context__ is not None and not value.__suppress_context__:
+                value = value.__context__
+                separator = "\nDuring handling of the above exception, another exception occurred:\n\n"
+            else:
+                break
+
+            if id(value) in seen:
+                break
+            seen.add(id(value))
+            chain.append((type(value), value, value.__traceback__, separator))
+
+        parts = []
+        for exctype, value, tb, separator in reversed(chain):
+            if tb is not None:
+                parts.append(self._format_stack(tb, deadline))
+            parts.extend(traceback.format_exception_only(exctype, value))
+            parts.append(separator)    # How this exception led to the next one
+
+        return "".join(parts)
+
+    def __call__(self, exctype: type, value: BaseException | None, tb: TracebackType | None) -> str:
+        return self.format_exception(exctype, value, tb)
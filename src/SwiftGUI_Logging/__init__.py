@@ -1,9 +1,109 @@
+import importlib
+import sys
+from types import ModuleType
 
-from .ExceptionHandling import reroute_exceptions
-from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer
-from .Utils import disable_root_handlers
+# Everything is only imported when it's used for the first time, so "import SwiftGUI_Logging" stays cheap.
+# name: submodule
+_lazy_attributes = {
+    "BackgroundWriter": "BackgroundWriter",
+    "CrashFileHandler": "CrashFileHandler",
+    "MemoryHandlerRotatingBuffer": "MemoryHandlerRotatingBuffer",
+    "MemoryHandlerThreadLocalBuffer": "MemoryHandlerThreadLocalBuffer",
+    "MemoryHandlerLevelTieredBuffer": "MemoryHandlerLevelTieredBuffer",
+    "FastCapture": "FastCapture",
+    "reroute_exceptions": "ExceptionHandling",
+    "reroute_asyncio_exceptions": "AsyncioHandling",
+    "TracebackFormatter": "TracebackFormatting",
+    "TriggerDeduplicator": "Deduplication",
+    "exception_fingerprint": "Deduplication",
+    "MmapRingHandler": "MmapRingBuffer",
+    "mmap_ring_crashed": "MmapRingBuffer",
+    "read_mmap_ring": "MmapRingBuffer",
+    "recover_mmap_ring": "MmapRingBuffer",
+    "recover_mmap_rings": "MmapRingBuffer",
+    "mmap_ring_in_use": "MmapRingBuffer",
+    "SharedMemoryCrashBuffer": "SharedMemoryBuffer",
+    "SharedMemoryRingHandler": "SharedMemoryBuffer",
+    "attach_worker": "SharedMemoryBuffer",
+    "BinaryCrashFileHandler": "BinaryDump",
+    "iter_binary_dump": "BinaryDump",
+    "render_binary_dump": "BinaryDump",
+    "CrashLogRetention": "Retention",
+    "CrashIndex": "CrashArchive",
+    "CrashEntry": "CrashArchive",
+    "stream_dumps": "CrashArchive",
+    "BufferStats": "Metrics",
+    "LatencyHistogram": "Metrics",
+    "SharedCaptureBuffer": "SharedCapture",
+    "CaptureSink": "SharedCapture",
+    "shared_capture_buffer": "SharedCapture",
+    "CrashDumpShipper": "CollectorShipping",
+    "encode_crash_batch": "CollectorShipping",
+    "decode_crash_batch": "CollectorShipping",
+    "disable_root_handlers": "Utils",
+    "Configs": "Configs",
+}
 
-from . import Configs
 
+# These classes are named like their module.
+# Importing the module (from anywhere) sets it as attribute of the package, which would hide the class
+_classes_named_like_their_module = {
+    "BackgroundWriter",
+    "CrashFileHandler",
+    "MemoryHandlerRotatingBuffer",
+    "MemoryHandlerThreadLocalBuffer",
+    "MemoryHandlerLevelTieredBuffer",
+    "FastCapture",
+}
 
 
+class _Package(ModuleType):
+
+    def __setattr__(self, name, value):
+        if name in _classes_named_like_their_module and isinstance(value, ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+TYPE_CHECKING = False   # Same as typing.TYPE_CHECKING, without importing typing
+
+
+def __getattr__(name: str):
+    submodule = _lazy_attributes.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{submodule}", __name__)
+    value = getattr(module, name) if name != submodule or name in _classes_named_like_their_module else module
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
+
+
+if TYPE_CHECKING:
+    from .BackgroundWriter import BackgroundWriter
+    from .CrashFileHandler import CrashFileHandler
+    from .MemoryHandlerRotatingBuffer import MemoryHandlerRotatingBuffer
+    from .MemoryHandlerThreadLocalBuffer import MemoryHandlerThreadLocalBuffer
+    from .MemoryHandlerLevelTieredBuffer import MemoryHandlerLevelTieredBuffer
+    from .FastCapture import FastCapture
+    from .ExceptionHandling import reroute_exceptions
+    from .AsyncioHandling import reroute_asyncio_exceptions
+    from .TracebackFormatting import TracebackFormatter
+    from .Deduplication import TriggerDeduplicator, exception_fingerprint
+    from .MmapRingBuffer import MmapRingHandler, mmap_ring_crashed, mmap_ring_in_use, read_mmap_ring, recover_mmap_ring, recover_mmap_rings
+    from .SharedMemoryBuffer import SharedMemoryCrashBuffer, SharedMemoryRingHandler, attach_worker
+    from .BinaryDump import BinaryCrashFileHandler, iter_binary_dump, render_binary_dump
+    from .Retention import CrashLogRetention
+    from .CrashArchive import CrashIndex, CrashEntry, stream_dumps
+    from .Metrics import BufferStats, LatencyHistogram
+    from .SharedCapture import SharedCaptureBuffer, CaptureSink, shared_capture_buffer
+    from .CollectorShipping import CrashDumpShipper, encode_crash_batch, decode_crash_batch
+    from .Utils import disable_root_handlers
+    from . import Configs
+
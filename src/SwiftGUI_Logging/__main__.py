@@ -0,0 +1,117 @@
+import argparse
+import logging
+import sys
+from datetime import datetime as dt
+
+
+def _time(text: str) -> float:
+    """
+    Timestamp or ISO-datetime (2024-01-31 12:00:00)
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return dt.fromisoformat(text).timestamp()
+
+
+def _level(text: str) -> int | str:
+    return int(text) if text.isdigit() else text
+
+
+def _level_number(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+
+    level = logging.getLevelName(text.upper())
+    if not isinstance(level, int):
+        raise argparse.ArgumentTypeError(f"Unknown level {text}")
+    return level
+
+
+def render(args: argparse.Namespace) -> int:
+    from .BinaryDump import render_binary_dump
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        render_binary_dump(
+            args.file,
+            output,
+            fmt=args.format,
+            datefmt=args.datefmt,
+            level=args.level,
+            loggers=args.logger,
+            since=args.since,
+            until=args.until,
+        )
+    finally:
+        if args.output:
+            output.close()
+
+    return 0
+
+
+def query(args: argparse.Namespace) -> int:
+    from .CrashArchive import CrashIndex, stream_dumps
+
+    index = CrashIndex(args.database)
+    try:
+        entries = index.query(
+            exception_type=args.type,
+            fingerprint=args.fingerprint,
+            logger=args.logger,
+            module=args.module,
+            thread=args.thread,
+            level=args.level,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+        )
+    finally:
+        index.close()
+
+    if args.dumps:
+        stream_dumps(entries)
+        return 0
+
+    for entry in entries:
+        message = (entry.message or "").strip().rsplit("\n", 1)[-1]     # Last line of a traceback is the exception itself
+        print(f"{dt.fromtimestamp(entry.created):%Y-%m-%d %H:%M:%S}  {entry.exception_type or '-':24} {entry.module or '-':24} {entry.file}:{entry.offset}  {message}")
+
+    return 0
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m SwiftGUI_Logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser("render", help="Write a binary crash-dump as text")
+    render_parser.add_argument("file", help="The binary dump")
+    render_parser.add_argument("-o", "--output", help="Write to this file instead of stdout")
+    render_parser.add_argument("--format", help="Format of the records. Defaults to the one the dump was written with")
+    render_parser.add_argument("--datefmt", help="Format of asctime. Defaults to the one the dump was written with")
+    render_parser.add_argument("--level", type=_level, help="Only records at or above this level (name or number)")
+    render_parser.add_argument("--logger", action="append", help="Only records of this logger and its children. Can be given multiple times")
+    render_parser.add_argument("--since", type=_time, help="Only records at or after this time (timestamp or ISO-datetime)")
+    render_parser.add_argument("--until", type=_time, help="Only records at or before this time (timestamp or ISO-datetime)")
+    render_parser.set_defaults(function=render)
+
+    query_parser = commands.add_parser("query", help="Search the crash-index (see CrashIndex)")
+    query_parser.add_argument("database", help="The SQLite-file of the index")
+    query_parser.add_argument("--type", help="Name of the exception-class")
+    query_parser.add_argument("--fingerprint", help="Fingerprint of the exception")
+    query_parser.add_argument("--logger", help="Only records of this logger and its children")
+    query_parser.add_argument("--module", help="Only exceptions raised in this module and its submodules")
+    query_parser.add_argument("--thread", help="Name of the thread")
+    query_parser.add_argument("--level", type=_level_number, help="Only records at or above this level (name or number)")
+    query_parser.add_argument("--since", type=_time, help="Only records at or after this time (timestamp or ISO-datetime)")
+    query_parser.add_argument("--until", type=_time, help="Only records at or before this time (timestamp or ISO-datetime)")
+    query_parser.add_argument("--limit", type=int, help="Show at most this many records")
+    query_parser.add_argument("--dumps", action="store_true", help="Write the matching crash-files instead of a list")
+    query_parser.set_defaults(function=query)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
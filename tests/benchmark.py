@@ -0,0 +1,800 @@
+import argparse
+import asyncio
+import http.server
+import io
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+import SwiftGUI_Logging as sgl
+
+# Benchmarks for the crash-logging hot paths.
+# Run this file directly, it doesn't need a display or network:
+#   python tests/benchmark.py --output results.json
+#   python tests/benchmark.py --baseline results.json     (compare a later run with the stored one)
+
+
+def _make_record(i: int) -> logging.LogRecord:
+    return logging.LogRecord("bench", logging.DEBUG, __file__, 0, "Test %s", (i,), None)
+
+
+def bench_debug_overhead(calls: int = 200_000):
+    """
+    ns per logging.debug-call with exceptions_to_file installed, compared to a logger without handlers
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in (
+                ("no_handler", None),
+                ("default", {}),
+                ("compact", {"compact_buffer": True}),
+                ("per_thread", {"per_thread_buffers": True}),
+        ):
+            logger = logging.getLogger(f"bench_debug_overhead_{name}")
+            logger.propagate = False
+            logger.setLevel(logging.DEBUG)
+
+            if options is not None:
+                sgl.Configs.exceptions_to_file(
+                    Path(directory) / f"Crash_{name}.log",
+                    logger,
+                    include_main_thread=False,
+                    include_threads=False,
+                    include_tkinter=False,
+                    **options,
+                )
+
+            debug = logger.debug
+            start = time.perf_counter()
+            for i in range(calls):
+                debug("Test %s", i)
+            results[name] = (time.perf_counter() - start) / calls * 1e9
+
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
+                handler.close()
+
+            print(f"logging.debug, {name:10}: {results[name]:8.1f} ns/call")
+
+    return results
+
+
+def bench_buffer_capacity(capacities=(1_000, 10_000, 100_000, 1_000_000), records: int = 200_000):
+    """
+    Per-record cost of MemoryHandlerRotatingBuffer, once the buffer is full and every record evicts the oldest one.
+    The cost should stay the same, no matter the capacity.
+    """
+    record = _make_record(0)
+    results = {}
+
+    for capacity in capacities:
+        handler = sgl.MemoryHandlerRotatingBuffer(capacity, target=logging.NullHandler())
+
+        for _ in range(capacity):   # Fill the buffer so every following record causes an eviction
+            handler.handle(record)
+
+        start = time.perf_counter()
+        for _ in range(records):
+            handler.handle(record)
+        results[capacity] = (time.perf_counter() - start) / records * 1e9
+
+        print(f"capacity {capacity:>9}: {results[capacity]:8.1f} ns/record")
+
+    return results
+
+
+def bench_compact_memory(records: int = 50_000):
+    """
+    Memory per buffered record, with and without compact storage.
+    Also checks that both modes produce the same flushed output.
+    """
+    results = {}
+    outputs = {}
+    all_records = [_make_record(i) for i in range(records)]
+
+    for compact in (False, True):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"))
+        handler = sgl.MemoryHandlerRotatingBuffer(records, target=target, compact=compact)
+
+        # Only the records that are still referenced by the buffer count
+        tracemalloc.start()
+        for i in range(records):
+            handler.handle(logging.makeLogRecord(all_records[i].__dict__))
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        results[compact] = used / records
+        print(f"compact={compact!s:5}: {results[compact]:8.1f} bytes/record")
+
+        handler.flush()
+        outputs[compact] = stream.getvalue()
+
+    assert outputs[False] == outputs[True], "Compact mode changed the flushed output"
+    print(f"Compact storage uses {results[False] / results[True]:.2f}x less memory")
+
+    return results
+
+
+def bench_thread_contention(thread_count: int = 32, records: int = 20_000):
+    """
+    Many threads logging into the same handler at once.
+    Compares the shared ring with the per-thread rings.
+    """
+    results = {}
+
+    for cls in (sgl.MemoryHandlerRotatingBuffer, sgl.MemoryHandlerThreadLocalBuffer):
+        handler = cls(5000, target=logging.NullHandler())
+        barrier = threading.Barrier(thread_count + 1)
+
+        def worker():
+            record = _make_record(0)
+            barrier.wait()
+            for _ in range(records):
+                handler.handle(record)
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        results[cls.__name__] = (time.perf_counter() - start) / (records * thread_count) * 1e9
+
+        print(f"{cls.__name__:32}: {results[cls.__name__]:8.1f} ns/record with {thread_count} threads")
+
+    return results
+
+
+def bench_flush_to_file(sizes=(5_000, 50_000, 500_000)):
+    """
+    Time and peak memory of writing a full buffer to a crash-file
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            target = sgl.CrashFileHandler(Path(directory) / f"Crash_{size}.log")
+            target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+            handler = sgl.MemoryHandlerRotatingBuffer(size, target=target, call_after_flushing=target.finish_file)
+
+            for i in range(size):
+                handler.handle(_make_record(i))
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            handler.flush()
+            duration = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[size] = {"seconds": duration, "peak_bytes": peak}
+            print(f"flush {size:>7} records: {duration * 1000:9.1f} ms, peak {peak / 1024:9.1f} KiB")
+
+    return results
+
+
+class _PerRecordCrashFileHandler(sgl.CrashFileHandler):
+    handle_batch = None     # Forces the buffer to call handle for every record
+
+
+def bench_batch_flush(size: int = 50_000):
+    """
+    Flushing into a target that supports handle_batch vs. one record at a time
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for cls in (_PerRecordCrashFileHandler, sgl.CrashFileHandler):
+            target = cls(Path(directory) / f"{cls.__name__}.log")
+            target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+            handler = sgl.MemoryHandlerRotatingBuffer(size, target=target, call_after_flushing=target.finish_file)
+
+            for i in range(size):
+                handler.handle(_make_record(i))
+
+            start = time.perf_counter()
+            handler.flush()
+            results[cls.__name__] = time.perf_counter() - start
+
+            print(f"{cls.__name__:27}: {results[cls.__name__] * 1000:9.1f} ms for {size} records")
+
+    return results
+
+
+def bench_fast_capture(calls: int = 200_000):
+    """
+    ns per call of logger.debug vs. FastCapture.debug:
+    Disabled (below the level), captured, and captured plus flushed into a crash-file
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        logger = logging.getLogger("bench_fast_capture")
+        logger.propagate = False
+
+        target = sgl.CrashFileHandler(Path(directory) / "Crash.log")
+        target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        handler = sgl.MemoryHandlerRotatingBuffer(calls, target=target, call_after_flushing=target.finish_file)
+        logger.addHandler(handler)
+
+        for name in ("logger", "fast_capture"):
+            for level, label in ((logging.INFO, "disabled"), (logging.DEBUG, "captured")):
+                logger.setLevel(level)
+                debug = logger.debug if name == "logger" else sgl.FastCapture(logger, handler).debug
+
+                start = time.perf_counter()
+                for i in range(calls):
+                    debug("Test %s", i)
+                duration = time.perf_counter() - start
+                results[f"{name}_{label}"] = duration / calls * 1e9
+
+            start = time.perf_counter()
+            handler.flush()
+            results[f"{name}_captured_flushed"] = (duration + time.perf_counter() - start) / calls * 1e9
+
+        logger.removeHandler(handler)
+
+    for name, value in results.items():
+        print(f"{name:30}: {value:8.1f} ns/call")
+
+    return results
+
+
+# Modules "import SwiftGUI_Logging" must not load, they are only needed by some features
+_not_imported = (
+    "tkinter", "multiprocessing", "mmap", "faulthandler", "socket", "pickle", "queue",
+    "datetime", "hashlib", "pathlib", "logging.handlers", "typing",
+)
+
+
+def bench_import_time(budget_ms: float = 8, runs: int = 5):
+    """
+    Time of "import SwiftGUI_Logging" in a fresh interpreter, measured with -X importtime.
+    Only logging is imported first, every program that uses the package has it anyway.
+    Fails if the import takes longer than budget_ms or loads any of _not_imported.
+
+    The budget comes from measurements: The package takes 2-4 ms, importing everything eagerly (with tkinter) took 30-40 ms.
+    """
+    code = (
+        "import logging, sys;"
+        "import SwiftGUI_Logging;"
+        f"print(sorted(m for m in {_not_imported!r} if m in sys.modules))"
+    )
+
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]", f"Unnecessary modules were imported: {result.stdout.strip()}"
+
+        for line in result.stderr.splitlines():
+            if line.rstrip().endswith("| SwiftGUI_Logging"):
+                timings.append(int(line.split("|")[1]) / 1000)
+
+    best = min(timings)
+    print(f"import SwiftGUI_Logging: {best:8.1f} ms (budget {budget_ms} ms)")
+    assert best <= budget_ms, f"Importing took {best:.1f} ms, the budget is {budget_ms} ms"
+
+    return best
+
+
+def bench_asyncio_latency(dumps: int = 5, buffer_size: int = 50_000, tick: float = 0.001, budget_ms: float = 50):
+    """
+    How late the event-loop gets while crash-logs are written, with and without an executor.
+    A ticker measures the lateness of every sleep while failing callbacks each flush a full buffer to a file.
+    Fails if a tick is more than budget_ms late while the dumps are written in the executor.
+    """
+    results = {}
+
+    async def run(in_executor: bool, directory: str) -> float:
+        logger = logging.getLogger(f"bench_asyncio_{in_executor}")
+        logger.propagate = False
+        target = sgl.CrashFileHandler(Path(directory) / f"Crash_{in_executor}.log")
+        target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        handler = sgl.MemoryHandlerRotatingBuffer(buffer_size, target=target, call_after_flushing=target.finish_file)
+        logger.addHandler(handler)
+
+        catch = sgl.reroute_exceptions(logger, include_main_thread=False, include_threads=False, include_tkinter=False)
+        sgl.reroute_asyncio_exceptions(catch, in_executor=in_executor)
+        loop = asyncio.get_running_loop()
+
+        lateness = []
+        stop = False
+        measuring = False   # Filling the buffer blocks the loop too, so only the dumps are measured
+
+        async def ticker():
+            while not stop:
+                start = loop.time()
+                await asyncio.sleep(tick)
+                if measuring:
+                    lateness.append(loop.time() - start - tick)
+
+        def fail():
+            raise RuntimeError("Benchmark")
+
+        ticking = asyncio.create_task(ticker())
+        for _ in range(dumps):
+            measuring = False
+            for i in range(buffer_size):
+                handler.handle(_make_record(i))
+            await asyncio.sleep(tick * 10)  # Let the ticker catch up first
+
+            measuring = True
+            loop.call_soon(fail)
+            await asyncio.sleep(0.5)
+
+        stop = True
+        await ticking
+        logger.removeHandler(handler)
+        lateness.sort()
+        return {"median": lateness[len(lateness) // 2], "worst": lateness[-1]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for in_executor in (False, True):
+            results[in_executor] = asyncio.run(run(in_executor, directory))
+            timing = results[in_executor]
+            print(
+                f"asyncio dumps {'in executor' if in_executor else 'on the loop':12}: "
+                f"ticks {timing['median'] * 1000:7.1f} ms late (median), {timing['worst'] * 1000:7.1f} ms (worst)"
+            )
+
+    worst = results[True]["worst"] * 1000
+    assert worst <= budget_ms, f"Dumps in the executor blocked the loop for {worst:.1f} ms, the budget is {budget_ms} ms"
+
+    return results
+
+
+def _recurse(depth: int):
+    if depth <= 0:
+        raise ValueError("Benchmark")
+    return _recurse(depth - 1)
+
+
+def bench_traceback_format(depth: int = 900, repeats: int = 50):
+    """
+    traceback.format_exception vs. TracebackFormatter for an almost recursion-limit deep stack, formatted repeatedly (an "error storm")
+    """
+    import traceback
+
+    try:
+        _recurse(depth)
+    except ValueError as exc:
+        exc_info = (type(exc), exc, exc.__traceback__)
+
+    results = {}
+    formatter = sgl.TracebackFormatter()
+    for name, function in (
+            ("traceback.format_exception", lambda *args: "".join(traceback.format_exception(*args))),
+            ("TracebackFormatter", formatter),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            text = function(*exc_info)
+        results[name] = (time.perf_counter() - start) / repeats
+
+        print(f"{name:27}: {results[name] * 1000:9.2f} ms per exception, {len(text.splitlines()):5} lines")
+
+    return results
+
+
+def bench_binary_dump(size: int = 200_000):
+    """
+    Flushing into a text crash-file vs. a binary dump, and rendering the binary dump afterwards
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for cls, suffix in ((sgl.CrashFileHandler, ".log"), (sgl.BinaryCrashFileHandler, ".sgld")):
+            target = cls(Path(directory) / f"Crash{suffix}", datetime_format="")
+            target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+            handler = sgl.MemoryHandlerRotatingBuffer(size, target=target, call_after_flushing=target.finish_file)
+
+            for i in range(size):
+                handler.handle(_make_record(i))
+
+            start = time.perf_counter()
+            handler.flush()
+            duration = time.perf_counter() - start
+            file_size = (Path(directory) / f"Crash{suffix}").stat().st_size
+
+            results[cls.__name__] = {"seconds": duration, "bytes": file_size}
+            print(f"{cls.__name__:27}: {duration * 1000:9.1f} ms, {file_size / 1024:9.1f} KiB for {size} records")
+
+        start = time.perf_counter()
+        sgl.render_binary_dump(Path(directory) / "Crash.sgld", io.StringIO())
+        results["render"] = time.perf_counter() - start
+        print(f"{'render_binary_dump':27}: {results['render'] * 1000:9.1f} ms")
+
+    return results
+
+
+def bench_compression(size: int = 100_000):
+    """
+    Flush time and file size of a crash-file without compression, with gzip and with lzma
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in (None, "gzip", "lzma"):
+            target = sgl.CrashFileHandler(Path(directory) / f"Crash_{compression}.log", datetime_format="", compression=compression)
+            target.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+            handler = sgl.MemoryHandlerRotatingBuffer(size, target=target, call_after_flushing=target.finish_file)
+
+            for i in range(size):
+                handler.handle(_make_record(i))
+
+            start = time.perf_counter()
+            handler.flush()
+            duration = time.perf_counter() - start
+            file_size = target._file_path.stat().st_size
+
+            results[compression] = {"seconds": duration, "bytes": file_size}
+            print(f"compression {str(compression):5}: {duration * 1000:9.1f} ms, {file_size / 1024:9.1f} KiB for {size} records")
+
+    return results
+
+
+def bench_crash_index(files: int = 20_000, entries_per_file: int = 3, queries: int = 100):
+    """
+    Query time of a CrashIndex with a lot of crash-files in it
+    """
+    exception_types = ("ZeroDivisionError", "KeyError", "ValueError", "TypeError", "OSError")
+    modules = ("app", "app.gui", "app.db", "worker", "worker.jobs")
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = sgl.CrashIndex(Path(directory) / "Crash.sqlite3")
+
+        start = time.perf_counter()
+        for i in range(files):
+            index.add(f"Crash_{i}.log", [
+                sgl.CrashEntry(
+                    created=now - (files - i) * 60 - j,
+                    level=logging.ERROR,
+                    logger="root",
+                    thread="MainThread",
+                    module=modules[(i + j) % len(modules)],
+                    exception_type=exception_types[(i * 7 + j) % len(exception_types)],
+                    fingerprint=f"fingerprint{(i * 7 + j) % 50}",
+                    message="Benchmark",
+                    file="",
+                    offset=j * 100,
+                )
+                for j in range(entries_per_file)
+            ])
+        filling = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(queries):
+            found = index.query(exception_type="ZeroDivisionError", module="app", since=now - 7 * 24 * 3600)
+        duration = (time.perf_counter() - start) / queries
+        index.close()
+
+    print(f"crash-index with {files * entries_per_file} entries: filled in {filling:6.1f} s, query {duration * 1000:7.2f} ms ({len(found)} results)")
+    return {"fill_seconds": filling, "query_seconds": duration}
+
+
+def bench_time_window(records: int = 200_000, max_age: float = 1.0):
+    """
+    Cost of appending with max_age compared to a plain count-limited buffer, and how many records each keeps at a constant log-rate
+    """
+    results = {}
+    start_time = time.time()
+    prepared = []
+    for i in range(records):
+        record = _make_record(i)
+        record.created = start_time + i / 10_000     # 10k records per second
+        prepared.append(record)
+
+    for name, kwargs in (("count", {}), ("max_age", {"max_age": max_age})):
+        handler = sgl.MemoryHandlerRotatingBuffer(100_000, **kwargs)
+
+        start = time.perf_counter()
+        for record in prepared:
+            handler.handle(record)
+        duration = time.perf_counter() - start
+
+        results[name] = {"seconds_per_record": duration / records, "kept": len(handler.buffer)}
+        print(f"buffer limited by {name:8}: {duration / records * 1e6:6.2f} µs per record, keeps {len(handler.buffer):7} records")
+
+    return results
+
+
+def bench_level_tiers(records: int = 500_000, warning_every: int = 1000):
+    """
+    How many WARNING-records survive a lot of DEBUG-output, single ring vs. one ring per level with the same total capacity
+    """
+    results = {}
+    prepared = []
+    for i in range(records):
+        level = logging.WARNING if i % warning_every == 0 else logging.DEBUG
+        prepared.append(logging.LogRecord("bench", level, __file__, 0, "Test %s", (i,), None))
+
+    for name, handler in (
+            ("single ring", sgl.MemoryHandlerRotatingBuffer(55_000)),
+            ("level tiers", sgl.MemoryHandlerLevelTieredBuffer({logging.DEBUG: 5_000, logging.WARNING: 50_000})),
+    ):
+        start = time.perf_counter()
+        for record in prepared:
+            handler.handle(record)
+        duration = time.perf_counter() - start
+
+        warnings = sum(record.levelno == logging.WARNING for record in handler.snapshot())
+        results[name] = {"seconds_per_record": duration / records, "warnings_kept": warnings}
+        print(f"{name:12}: {duration / records * 1e6:6.2f} µs per record, keeps {warnings:5} of {records // warning_every} warnings")
+
+    return results
+
+
+def bench_stats_overhead(records: int = 500_000, budget_percent: float = 12):
+    """
+    What the always-on counters cost per record: handle() with stats, compared to handle() without them.
+    Also shows a stats-snapshot after a few flushes into a file.
+    Fails if the stats make handle() more than budget_percent slower.
+    Measured: About 40 ns of 700-850 ns per record (3-9%, depending on the run), the budget leaves room for noise
+    """
+    prepared = [logging.LogRecord("bench", logging.DEBUG, __file__, 0, "Test %s", (i,), None) for i in range(records)]
+
+    # Best of a few alternating runs, the difference is small and noisy
+    timings = {True: float("inf"), False: float("inf")}
+    for _ in range(7):
+        for collect_stats in timings:
+            handler = sgl.MemoryHandlerRotatingBuffer(10_000, collect_stats=collect_stats)
+            start = time.perf_counter()
+            for record in prepared:
+                handler.handle(record)
+            timings[collect_stats] = min(timings[collect_stats], time.perf_counter() - start)
+
+    with_stats = timings[True] / records
+    without_stats = timings[False] / records
+    stats_cost = with_stats - without_stats
+
+    overhead = stats_cost / without_stats * 100
+    print(f"stats overhead: {with_stats * 1e9:6.1f} ns with stats, {without_stats * 1e9:6.1f} ns without ({overhead:.1f}%, budget {budget_percent}%)")
+    assert overhead <= budget_percent, f"The stats cost {overhead:.1f}% per record, the budget is {budget_percent}%"
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_handler = sgl.CrashFileHandler(Path(directory) / "bench.log")
+        handler = sgl.MemoryHandlerRotatingBuffer(10_000, target=file_handler, call_after_flushing=file_handler.finish_file)
+        for i, record in enumerate(prepared[:100_000]):
+            handler.handle(record)
+            if i % 25_000 == 24_999:
+                handler.flush()
+
+        snapshot = handler.stats_snapshot()
+        file_handler.close()
+
+    print(
+        f"after 4 flushes: {snapshot['records_captured']} captured, {snapshot['records_evicted']} evicted, "
+        f"{snapshot['bytes_written']} bytes, format {snapshot['format_seconds']['mean_seconds'] * 1000:.1f} ms / "
+        f"io {snapshot['io_seconds']['mean_seconds'] * 1000:.1f} ms per flush"
+    )
+
+    return {"seconds_with_stats": with_stats, "seconds_without_stats": without_stats, "overhead_percent": overhead, "snapshot": snapshot}
+
+
+def bench_shared_buffer(calls: int = 200_000, subsystems: int = 3):
+    """
+    ns per logging.debug-call of a subsystem-logger, with crash-files for every subsystem and the root-logger.
+    Separate buffers store every record twice (subsystem and root), the shared buffer only once
+    """
+    results = {}
+    root = logging.getLogger()
+    root_handlers = root.handlers[:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for shared in (False, True):
+            names = [f"bench_shared_{shared}_{i}" for i in range(subsystems)]
+            for name in names + [""]:
+                sgl.Configs.exceptions_to_file(
+                    Path(directory) / f"Crash_{name or 'root'}.log",
+                    name,
+                    include_main_thread=False,
+                    include_threads=False,
+                    include_tkinter=False,
+                    shared_buffer=shared,
+                )
+
+            debug = logging.getLogger(names[0]).debug
+            start = time.perf_counter()
+            for i in range(calls):
+                debug("Test %s", i)
+            results["shared" if shared else "separate"] = (time.perf_counter() - start) / calls * 1e9
+
+            for name in names + [""]:
+                logger = logging.getLogger(name)
+                for handler in logger.handlers[:]:
+                    if handler not in root_handlers:
+                        logger.removeHandler(handler)
+
+    for name, value in results.items():
+        print(f"{subsystems} subsystems + root, {name:8} buffers: {value:8.1f} ns/call")
+
+    return results
+
+
+class _CollectorStandIn(http.server.BaseHTTPRequestHandler):
+    """
+    Local stand-in for a crash-collector, counts the dumps it receives
+    """
+    protocol_version = "HTTP/1.1"   # Keep-alive, so the shipper can reuse its connection
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.extend(sgl.decode_crash_batch(body, self.headers.get("Content-Encoding") == "gzip"))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *_):
+        pass
+
+
+def bench_collector_shipping(dumps: int = 50, dump_records: int = 2_000):
+    """
+    How long CrashDumpShipper.add blocks while the collector is down, and how long the spool takes to drain once it is up
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        files = []
+        for i in range(dumps):
+            file = directory / f"Crash_{i}.log"
+            file.write_text("".join(f"2026-01-01 00:00:00,000 - bench - DEBUG - Test {j}\n" for j in range(dump_records)))
+            files.append(file)
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _CollectorStandIn)
+        port = server.server_address[1]
+        server.server_close()   # Nobody listens on the port yet
+
+        shipper = sgl.CrashDumpShipper(f"http://127.0.0.1:{port}/crash", directory / "spool", retry_delay=0.05, max_retry_delay=0.05)
+        start = time.perf_counter()
+        for file in files:
+            shipper.add(file)
+        results["add_seconds_collector_down"] = (time.perf_counter() - start) / dumps
+
+        _CollectorStandIn.received = []
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), _CollectorStandIn)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        start = time.perf_counter()
+        assert shipper.flush(30), "The spool wasn't sent"
+        results["drain_seconds"] = time.perf_counter() - start
+        assert len(_CollectorStandIn.received) == dumps, "Not every dump arrived"
+
+        start = time.perf_counter()
+        shipper.add(files[0])
+        results["add_seconds_collector_up"] = time.perf_counter() - start
+        shipper.flush(30)
+
+        shipper.close()
+        server.shutdown()
+        server.server_close()
+
+    print(f"add, collector down: {results['add_seconds_collector_down'] * 1000:8.2f} ms per dump")
+    print(f"add, collector up  : {results['add_seconds_collector_up'] * 1000:8.2f} ms")
+    print(f"replay {dumps} dumps  : {results['drain_seconds'] * 1000:8.1f} ms")
+
+    return results
+
+
+# name: function, in the order they run
+_benchmarks = {
+    name[len("bench_"):]: function
+    for name, function in list(globals().items())
+    if name.startswith("bench_") and callable(function)
+}
+
+# Results under these keys are only recorded, not compared. Everything else is a cost, lower is better
+_not_compared = ("kept", "warnings_kept", "snapshot")
+
+
+def _flatten(results, prefix: str = "") -> dict[str, float]:
+    """
+    "bench.key.subkey": value of all numbers in the (JSON-) results
+    """
+    if isinstance(results, dict):
+        flat = {}
+        for key, value in results.items():
+            if key not in _not_compared:
+                flat.update(_flatten(value, f"{prefix}.{key}" if prefix else key))
+        return flat
+
+    if isinstance(results, (int, float)) and not isinstance(results, bool):
+        return {prefix: results}
+
+    return {}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.25) -> list[str]:
+    """
+    Print how every value changed compared to the baseline
+    :param results: "benchmarks" of the current run
+    :param baseline: "benchmarks" of a stored run
+    :param tolerance: Values that are more than this much (0.25 = 25%) higher than the baseline are regressions
+    :return: Names of all regressions
+    """
+    current = _flatten(results)
+    previous = _flatten(baseline)
+
+    regressions = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+
+        if not old:
+            change = 0.0 if not value else float("inf")
+        else:
+            change = (value - old) / abs(old)
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(name)
+
+        print(f"{name:60} {old:14.6g} -> {value:14.6g} {change * 100:+8.1f}%{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the crash-logging hot paths")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark", help=f"Only run these. One of {', '.join(_benchmarks)}")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON-file")
+    parser.add_argument("-b", "--baseline", help="Compare the results with this JSON-file (the output of an earlier run)")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.25, help="Allowed slowdown compared to the baseline, 0.25 = 25%% (default)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in _benchmarks]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results = {}
+    failed = {}
+    for name in args.benchmarks or _benchmarks:
+        print(f"--- {name}")
+        try:
+            results[name] = _benchmarks[name]()
+        except AssertionError as ex:    # A budget was exceeded, the others should still run
+            failed[name] = str(ex)
+            print(f"FAILED: {ex}")
+
+    # Round-trip, so the results look the same as a loaded baseline (keys become strings)
+    results = json.loads(json.dumps(results, default=str))
+    report = {
+        "created": time.time(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "benchmarks": results,
+        "failed": failed,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        print(f"--- Compared to {args.baseline}")
+        regressions = compare(results, baseline["benchmarks"], args.tolerance)
+        print(f"{len(regressions)} regressions")
+
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
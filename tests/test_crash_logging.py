@@ -0,0 +1,1200 @@
+import asyncio
+import gc
+import io
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import signal
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+import SwiftGUI_Logging as sgl
+from SwiftGUI_Logging.CollectorShipping import _TCP_ACK, _TCP_HEADER
+
+# Regression-tests for the crash-logging. Run with pytest, or run this file directly.
+
+_src = str(Path(sgl.__file__).resolve().parent.parent)
+
+
+def _run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    """
+    Run code in a fresh interpreter that can import SwiftGUI_Logging
+    """
+    env = dict(os.environ, PYTHONPATH=_src + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.run([sys.executable, "-c", code, *args], capture_output=True, text=True, env=env, timeout=60)
+
+
+def test_import_is_lazy():
+    result = _run_python(
+        "import logging, sys\n"
+        "before = set(sys.modules)\n"
+        "import SwiftGUI_Logging as sgl\n"
+        "print(sorted(name for name in set(sys.modules) - before if not name.startswith('importlib')))\n"
+        "print(sgl.MemoryHandlerRotatingBuffer.__name__, sgl.CrashFileHandler.__name__)\n"
+        "import SwiftGUI_Logging.SharedCapture\n"     # Imports the module MemoryHandlerRotatingBuffer, the class must stay
+        "print(isinstance(sgl.MemoryHandlerRotatingBuffer, type))\n"
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == ["['SwiftGUI_Logging']", "MemoryHandlerRotatingBuffer CrashFileHandler", "True"]
+
+
+def test_traceback_formatter_without_exception_groups():
+    """
+    Python 3.10 has no BaseExceptionGroup.
+    The traceback-module of newer versions still gets it, it needs it itself
+    """
+    result = _run_python(
+        "import builtins, traceback\n"
+        "group = builtins.__dict__.pop('BaseExceptionGroup', None)\n"
+        "if group is not None:\n"
+        "    traceback.BaseExceptionGroup = group\n"
+        "import SwiftGUI_Logging as sgl, sys\n"
+        "try:\n"
+        "    1 / 0\n"
+        "except ZeroDivisionError:\n"
+        "    print(sgl.TracebackFormatter()(*sys.exc_info()))\n"
+    )
+    assert result.returncode == 0, result.stderr
+    assert "ZeroDivisionError" in result.stdout
+
+
+def _divide(numbers: list[int]) -> float:
+    return numbers[0] / numbers[1]
+
+
+def test_exceptions_are_formatted_like_python_by_default():
+    texts = []
+    catch = sgl.reroute_exceptions(
+        None,
+        include_main_thread=False,
+        include_threads=False,
+        include_tkinter=False,
+        pass_text_to_function=texts.append,
+    )
+
+    try:
+        _divide([1, 0])
+    except ZeroDivisionError:
+        exc_info = sys.exc_info()
+    catch(*exc_info)
+
+    assert texts == ["".join(traceback.format_exception(*exc_info))]
+
+
+def _log_in_worker(i: int) -> int:
+    logging.getLogger("test_worker").info("Working on %s", i)
+    return i
+
+
+def test_forked_workers_close_their_rings():
+    """
+    Forked workers end with os._exit, which skips atexit
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs the fork start-method")
+
+    context = multiprocessing.get_context("fork")
+    crash_buffer = sgl.SharedMemoryCrashBuffer(max_workers=8, mp_context=context)
+    try:
+        with ProcessPoolExecutor(2, mp_context=context, initializer=sgl.attach_worker, initargs=crash_buffer.worker_args("test_worker")) as pool:
+            assert sorted(pool.map(_log_in_worker, range(10))) == list(range(10))
+
+        assert crash_buffer.crashed_workers() == []
+    finally:
+        crash_buffer.close()
+
+
+def test_ended_processes_are_not_alive():
+    """
+    On Windows, os.kill(pid, 0) doesn't tell whether a process is alive
+    """
+    from SwiftGUI_Logging.MmapRingBuffer import _pid_alive
+
+    child = _start_python("pass")
+    assert _pid_alive(os.getpid())
+    child.wait()
+    assert not _pid_alive(child.pid)
+
+
+def _worker(worker_args: tuple, crash: bool, logged, finish):
+    sgl.attach_worker(*worker_args)
+    logging.getLogger("test_worker").info("Worker %s", os.getpid())
+    logged.set()
+    finish.wait(30)
+    if crash:
+        os._exit(1)
+
+
+def test_crashed_workers_can_be_dumped():
+    context = multiprocessing.get_context()
+    crash_buffer = sgl.SharedMemoryCrashBuffer(max_workers=4, mp_context=context)
+    try:
+        logged = context.Event()
+        finish = context.Event()
+        workers = [context.Process(target=_worker, args=(crash_buffer.worker_args("test_worker"), crash, logged, finish)) for crash in (True, False)]
+        for worker in workers:
+            logged.clear()
+            worker.start()
+            assert logged.wait(30)
+
+        # Still running, so nothing is said about crashing
+        running = _ListHandler()
+        crash_buffer.dump_worker(workers[0].pid, running)
+        assert running.messages == [f"Worker {workers[0].pid}"]
+
+        finish.set()
+        for worker in workers:
+            worker.join(30)
+
+        target = _ListHandler()
+        assert crash_buffer.dump_crashed_workers(target) == [workers[0].pid]
+        assert target.messages == [f"Worker {workers[0].pid}", f"Worker-process {workers[0].pid} ended without closing its crash-buffer"]
+        assert crash_buffer.crashed_workers() == []
+    finally:
+        crash_buffer.close()
+
+
+def test_fingerprints_are_stable_across_processes():
+    """
+    hash() of strings changes with every process, fingerprints must not
+    """
+    code = (
+        "import logging, sys, SwiftGUI_Logging as sgl\n"
+        "from SwiftGUI_Logging.Deduplication import record_fingerprint\n"
+        "def divide():\n"
+        "    return 1 / 0\n"
+        "try:\n"
+        "    divide()\n"
+        "except ZeroDivisionError:\n"
+        "    print(sgl.exception_fingerprint(*sys.exc_info()[::2]))\n"
+        "print(record_fingerprint(logging.LogRecord('test', logging.ERROR, '/somewhere/app.py', 3, 'Failed %s', (1,), None)))\n"
+    )
+
+    outputs = []
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONPATH=_src + os.pathsep + os.environ.get("PYTHONPATH", ""), PYTHONHASHSEED=seed)
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, timeout=60)
+        assert result.returncode == 0, result.stderr
+        outputs.append(result.stdout)
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0].startswith("ZeroDivisionError@")
+
+
+_survivable_instance = (
+    "import logging, sys, time\n"
+    "import SwiftGUI_Logging as sgl\n"
+    "sgl.Configs.exceptions_to_file(sys.argv[1], 'instance', crash_survivable=True, include_main_thread=False, include_threads=False, include_tkinter=False)\n"
+    "logging.getLogger('instance').info('Instance is running')\n"
+    "print('ready', flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+def _start_python(code: str, *args: str) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=_src + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.Popen([sys.executable, "-c", code, *args], stdout=subprocess.PIPE, text=True, env=env)
+
+
+def test_running_instance_is_not_recovered():
+    """
+    A second instance must neither recover nor overwrite the ring of one that is still running
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = str(Path(directory) / "Crash.log")
+
+        first = _start_python(_survivable_instance, filepath)
+        try:
+            assert first.stdout.readline().strip() == "ready"
+            ring = Path(directory) / f"Crash.{first.pid}.ring"
+            assert not sgl.mmap_ring_crashed(ring) and sgl.mmap_ring_in_use(ring)
+
+            result = _run_python(
+                "import sys, SwiftGUI_Logging as sgl\n"
+                "sgl.Configs.exceptions_to_file(sys.argv[1], 'second', crash_survivable=True, include_main_thread=False, include_threads=False, include_tkinter=False)\n",
+                filepath,
+            )
+            assert result.returncode == 0, result.stderr
+            assert not list(Path(directory).glob("Crash_recovered*"))
+            assert [record.getMessage() for record in sgl.read_mmap_ring(ring)] == ["Instance is running"]
+        finally:
+            first.send_signal(signal.SIGKILL)
+            first.wait()
+
+        # Now it really crashed
+        result = _run_python(
+            "import sys, SwiftGUI_Logging as sgl\n"
+            "sgl.Configs.exceptions_to_file(sys.argv[1], 'third', crash_survivable=True, include_main_thread=False, include_threads=False, include_tkinter=False)\n",
+            filepath,
+        )
+        assert result.returncode == 0, result.stderr
+        recovered = list(Path(directory).glob("Crash_recovered*"))
+        assert len(recovered) == 1 and "Instance is running" in recovered[0].read_text()
+        assert not ring.exists()
+
+
+def test_killed_instance_is_recovered_on_next_start():
+    """
+    os._exit skips atexit, so the ring stays unclean, just like after a kill or a native crash
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = str(Path(directory) / "Crash.log")
+
+        result = _run_python(
+            "import logging, os, sys, SwiftGUI_Logging as sgl\n"
+            "sgl.Configs.exceptions_to_file(sys.argv[1], 'killed', crash_survivable=True, include_main_thread=False, include_threads=False, include_tkinter=False)\n"
+            "logging.getLogger('killed').info('Last words')\n"
+            "print(os.getpid(), flush=True)\n"
+            "os._exit(3)\n",
+            filepath,
+        )
+        assert result.returncode == 3, result.stderr
+        ring = Path(directory) / f"Crash.{result.stdout.strip()}.ring"
+        assert sgl.mmap_ring_crashed(ring) and not sgl.mmap_ring_in_use(ring)
+
+        result = _run_python(
+            "import sys, SwiftGUI_Logging as sgl\n"
+            "sgl.Configs.exceptions_to_file(sys.argv[1], 'next', crash_survivable=True, include_main_thread=False, include_threads=False, include_tkinter=False)\n",
+            filepath,
+        )
+        assert result.returncode == 0, result.stderr
+        recovered = list(Path(directory).glob("Crash_recovered*"))
+        assert len(recovered) == 1 and "Last words" in recovered[0].read_text()
+        assert not ring.exists()
+        rings = list(Path(directory).glob("*.ring"))   # Only the one of the second run, which was closed cleanly
+        assert len(rings) == 1 and not sgl.mmap_ring_crashed(rings[0])
+
+
+def test_forked_child_gets_its_own_ring():
+    if not hasattr(os, "fork"):
+        pytest.skip("needs os.fork")
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = sgl.MmapRingHandler(Path(directory) / "test.{pid}.ring", slot_count=16, enable_faulthandler=False)
+        logger = logging.getLogger("test_fork_ring")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        try:
+            logger.info("Parent")
+
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    logger.info("Child")
+                    handler.close()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+
+            parent_ring = Path(directory) / f"test.{os.getpid()}.ring"
+            child_ring = Path(directory) / f"test.{pid}.ring"
+            assert [record.getMessage() for record in sgl.read_mmap_ring(parent_ring)] == ["Parent"]
+            assert [record.getMessage() for record in sgl.read_mmap_ring(child_ring)] == ["Child"]
+            assert not sgl.mmap_ring_crashed(child_ring)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def _error_storm(logger: logging.Logger):
+    for i in range(5):
+        logger.error("Always the same")
+
+
+def test_summary_is_written_without_another_dump():
+    """
+    The summary of suppressed triggers used to wait for the next dump, which might never come
+    """
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(
+        10,
+        target=target,
+        deduplicator=sgl.TriggerDeduplicator(0.2, summary_interval=0.05),
+    )
+    logger = logging.getLogger("test_summary_timer")
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        _error_storm(logger)
+        assert not any(message.startswith("Suppressed") for message in target.messages)
+
+        time.sleep(1)
+        summaries = [message for message in target.messages if message.startswith("Suppressed")]
+        assert len(summaries) == 1 and "4 times" in summaries[0]
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_summary_is_written_at_exit():
+    with tempfile.TemporaryDirectory() as directory:
+        result = _run_python(
+            "import sys, logging, SwiftGUI_Logging as sgl\n"
+            "sgl.Configs.exceptions_to_file(sys.argv[1], logger=logging.getLogger('storm'), deduplicate_window=60)\n"
+            "for i in range(5):\n"
+            "    logging.getLogger('storm').error('Always the same')\n",
+            str(Path(directory) / "crash.log"),
+        )
+        assert result.returncode == 0, result.stderr
+
+        written = "".join(file.read_text() for file in Path(directory).iterdir())
+        assert written.count("Always the same") == 1
+        assert "4 times" in written
+
+
+def test_finished_threads_dont_keep_their_rings():
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerThreadLocalBuffer(10, target=target)
+    logger = logging.getLogger("test_thread_rings")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        for i in range(50):
+            thread = threading.Thread(target=lambda i=i: [logger.info("Thread %s, record %s", i, n) for n in range(10)])
+            thread.start()
+            thread.join()
+
+        logger.info("Main thread")  # Registers its ring, which prunes the others
+        assert handler.stats_snapshot()["records_buffered"] == 11
+
+        logger.error("Trigger")
+        assert len(target.messages) == 12
+        assert target.messages[0] == "Thread 49, record 0"
+        assert handler.stats_snapshot()["records_buffered"] == 0
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_tiered_rings_are_merged_in_order():
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerLevelTieredBuffer({logging.DEBUG: 3, logging.WARNING: 2}, target=target)
+    assert handler.buffer.maxlen == 0   # Only the rings per level buffer anything
+
+    created = 1_700_000_000.0
+    for n in range(6):
+        for level in (logging.DEBUG, logging.INFO, logging.WARNING):
+            record = logging.LogRecord("test_tiered", level, __file__, 0, f"{logging.getLevelName(level)} {n}", (), None)
+            record.created = created
+            created += 1
+            handler.handle(record)
+
+    record = logging.LogRecord("test_tiered", logging.ERROR, __file__, 0, "Trigger", (), None)
+    record.created = created
+    handler.handle(record)
+
+    # DEBUG and INFO share the lowest ring (last 3 of them), WARNING and above the other one (last 2)
+    assert target.messages == ["INFO 4", "DEBUG 5", "INFO 5", "WARNING 5", "Trigger"]
+
+
+def test_tiered_buffers_refuse_byte_and_age_limits():
+    """
+    The rings of the tiered buffer are only limited by their count.
+    The combination must be refused before anything is set up
+    """
+    logger = logging.getLogger("test_tiered_limits")
+    logger.propagate = False
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = Path(directory) / "logs" / "Crash.log"
+        for limit in ({"buffer_bytes": 100_000}, {"buffer_seconds": 60}):
+            try:
+                sgl.Configs.exceptions_to_file(
+                    filepath,
+                    logger,
+                    level_buffer_sizes={logging.DEBUG: 100, logging.WARNING: 100},
+                    crash_survivable=True,
+                    background_writer=True,
+                    include_main_thread=False,
+                    include_threads=False,
+                    include_tkinter=False,
+                    **limit,
+                )
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"level_buffer_sizes was combined with {limit}")
+
+            assert logger.handlers == []
+            assert not filepath.parent.exists()
+
+
+def _stats_after_a_flush(handler: sgl.MemoryHandlerRotatingBuffer) -> dict:
+    def log(thread: int):
+        for n in range(30):
+            handler.handle(logging.LogRecord("test_stats", logging.INFO, __file__, 0, "Thread %s, record %s", (thread, n), None))
+
+    threads = [threading.Thread(target=log, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    handler.handle(logging.LogRecord("test_stats", logging.ERROR, __file__, 0, "Trigger", (), None))
+    for n in range(5):
+        handler.handle(logging.LogRecord("test_stats", logging.INFO, __file__, 0, "After %s", (n,), None))
+
+    snapshot = handler.stats_snapshot()
+    assert snapshot == handler.stats_snapshot()     # Reading the counters doesn't change them
+    return snapshot
+
+
+def test_stats_count_every_record():
+    for handler_type, flushed in ((sgl.MemoryHandlerRotatingBuffer, 10), (sgl.MemoryHandlerThreadLocalBuffer, 11)):
+        target = _ListHandler()
+        snapshot = _stats_after_a_flush(handler_type(10, target=target))
+
+        assert len(target.messages) == flushed
+        assert snapshot["records_captured"] == 126
+        assert snapshot["records_buffered"] == 5
+        assert snapshot["records_evicted"] == 126 - 5 - flushed
+        assert snapshot["flushes"] == 1
+        assert snapshot["records_flushed"] == flushed
+        assert snapshot["flush_seconds"]["count"] == 1
+
+    snapshot = _stats_after_a_flush(sgl.MemoryHandlerRotatingBuffer(10, target=_ListHandler(), collect_stats=False))
+    assert snapshot["records_captured"] == 0
+    assert snapshot["flushes"] == 0
+
+
+class _CustomRecord(logging.LogRecord):
+    pass
+
+
+def test_ring_keeps_the_newest_records():
+    target = _ListHandler()
+    flushes = []
+    handler = sgl.MemoryHandlerRotatingBuffer(5, target=target, call_after_flushing=lambda: flushes.append(len(target.messages)))
+    for n in range(1000):
+        handler.handle(logging.LogRecord("test_ring", logging.INFO, __file__, 0, "Record %s", (n,), None))
+    assert len(handler.buffer) == 5
+    assert flushes == []    # Rotating never flushes
+
+    handler.handle(logging.LogRecord("test_ring", logging.ERROR, __file__, 0, "Trigger", (), None))
+    assert target.messages == ["Record 996", "Record 997", "Record 998", "Record 999", "Trigger"]
+    assert flushes == [5]
+    assert len(handler.buffer) == 0
+
+
+def test_crash_files_are_written_in_batches():
+    with tempfile.TemporaryDirectory() as directory:
+        handler = sgl.CrashFileHandler(Path(directory) / "Crash.log", "_%H-%M-%S-%f", batch_size=10)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            for n in range(25):
+                handler.handle(logging.LogRecord("test_batches", logging.INFO, __file__, 0, "Line %02d", (n,), None))
+
+            # Full batches are already in the file, only the rest waits in memory
+            assert len(handler._batch) == 5
+            assert handler.bytes_written == 20 * len("Line 00\n")
+            first = handler._file_path
+            handler._file.flush()
+            assert first.read_text() == "".join(f"Line {n:02}\n" for n in range(20))
+
+            handler.finish_file()
+            assert handler._file is None
+            assert first.read_text() == "".join(f"Line {n:02}\n" for n in range(25))
+
+            # The next record starts a new file
+            handler.handle(logging.LogRecord("test_batches", logging.INFO, __file__, 0, "Next", (), None))
+            handler.finish_file()
+            assert handler._file_path != first
+            assert handler._file_path.read_text() == "Next\n"
+        finally:
+            handler.close()
+
+
+class _BatchTarget(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def emit(self, record):
+        raise AssertionError("Records must be passed as a batch")
+
+    def handle_batch(self, records):
+        self.batches.append([record.getMessage() for record in records])
+
+
+def test_batches_are_formatted_like_single_records():
+    target = _BatchTarget()
+    handler = sgl.MemoryHandlerRotatingBuffer(10, target=target)
+    for n in range(3):
+        handler.handle(logging.LogRecord("test_batch", logging.INFO, __file__, 0, "Record %s", (n,), None))
+    handler.handle(logging.LogRecord("test_batch", logging.ERROR, __file__, 0, "Trigger", (), None))
+    assert target.batches == [["Record 0", "Record 1", "Record 2", "Trigger"]]
+
+    try:
+        _divide([1, 0])
+    except ZeroDivisionError:
+        exc_info = sys.exc_info()
+
+    records = []
+    for n in range(50):
+        record = logging.LogRecord("test_batch.child", (logging.DEBUG, logging.INFO, logging.ERROR)[n % 3], __file__, n, "Record %s %%", (n,), exc_info if n == 7 else None)
+        record.created = 1_700_000_000 + n / 3     # Some share their second, asctime is cached
+        record.msecs = (record.created % 1) * 1000
+        records.append(record)
+
+    texts = []
+    with tempfile.TemporaryDirectory() as directory:
+        for batch in (True, False):     # The batch first, formatting the exception sets exc_text on the record
+            handler = sgl.CrashFileHandler(Path(directory) / f"Crash{batch}.log")
+            handler.setFormatter(logging.Formatter("%(asctime)s.%(msecs)03d %(levelname)-8s %(name)s:%(lineno)d %(message)s"))
+            handler.addFilter(lambda record: record.lineno % 5)
+            if batch:
+                handler.handle_batch(iter(records))
+            else:
+                for record in records:
+                    handler.handle(record)
+            handler.finish_file()
+            texts.append(handler._file_path.read_text())
+            handler.close()
+
+    assert texts[0] == texts[1]
+    assert "Record 5 %" not in texts[0] and "ZeroDivisionError" in texts[0]
+
+
+def test_fast_capture_builds_records_only_when_flushing():
+    target = logging.handlers.BufferingHandler(100)
+    handler = sgl.MemoryHandlerRotatingBuffer(10, target=target)
+    console = _ListHandler()
+    logger = logging.getLogger("test_fast_capture")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    logger.addHandler(console)
+    try:
+        fast = sgl.FastCapture(logger, level=logging.INFO)
+        fast.debug("Ignored %s", 1)    # Below its level
+        line = sys._getframe().f_lineno + 1
+        fast.info("Looping %s", 2)
+        fast.warning("Slow %s", 3)
+
+        assert [type(item).__name__ for item in handler.buffer] == ["_LazyRecord", "_LazyRecord"]
+        assert console.messages == []   # Only the crash-buffer gets these
+
+        fast.error("Failed %s", 4)      # Logged normally, so it triggers
+        assert console.messages == ["Failed 4"]
+        assert [record.getMessage() for record in target.buffer] == ["Looping 2", "Slow 3", "Failed 4"]
+
+        record = target.buffer[0]
+        assert isinstance(record, logging.LogRecord)
+        assert (record.name, record.levelname, record.lineno, record.funcName) == ("test_fast_capture", "INFO", line, "test_fast_capture_builds_records_only_when_flushing")
+        assert record.filename == Path(__file__).name
+        assert record.thread == threading.get_ident()
+        assert target.buffer[2].lineno > line
+    finally:
+        logger.removeHandler(handler)
+        logger.removeHandler(console)
+
+
+def test_asyncio_exceptions_are_logged_off_the_loop():
+    async def main(in_executor: bool) -> list:
+        calls = []
+        called = threading.Event()
+
+        def catch(*args):
+            calls.append((threading.current_thread(), args))
+            called.set()
+
+        loop = asyncio.get_running_loop()
+        sgl.reroute_asyncio_exceptions(catch, in_executor=in_executor)
+        loop.call_exception_handler({"message": "Nothing to log"})     # No exception, asyncio's own handler takes it
+        loop.call_soon(_divide, [1, 0])
+
+        assert await loop.run_in_executor(None, called.wait, 10)
+        return calls
+
+    for in_executor in (True, False):
+        loop_thread = threading.current_thread()
+        calls = asyncio.run(main(in_executor))
+
+        assert len(calls) == 1
+        thread, (exctype, value, tb, additional_text) = calls[0]
+        assert (thread is not loop_thread) == in_executor    # The loop doesn't wait for the crash-log
+        assert exctype is ZeroDivisionError and value.__traceback__ is tb
+        assert additional_text.startswith("Asyncio exception: Exception in callback")
+        assert "Handle: <Handle _divide([1, 0])" in additional_text
+
+
+def test_compact_records_round_trip():
+    try:
+        _divide([1, 0])
+    except ZeroDivisionError:
+        exc_info = sys.exc_info()
+
+    records = [
+        logging.LogRecord("test_compact", logging.INFO, "/somewhere/app.py", 12, "Plain %s and %d", ("text", 3), None, func="work"),
+        logging.LogRecord("test_compact", logging.ERROR, __file__, 34, "Failed with %(reason)s", ({"reason": "nothing"},), exc_info),
+        _CustomRecord("test_compact.child", logging.WARNING, __file__, 56, "Custom", (), None),
+    ]
+    records[0].user = "someone"     # Like extra={"user": "someone"}
+    records[1].exc_text = "Already formatted"
+
+    target = logging.handlers.BufferingHandler(100)
+    handler = sgl.MemoryHandlerRotatingBuffer(10, logging.CRITICAL, target=target, compact=True)
+    for record in records:
+        handler.handle(record)
+    assert all(type(item) is tuple for item in handler.buffer)
+    handler.flush()
+
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s %(module)s.%(funcName)s:%(lineno)d %(message)s %(user)s", defaults={"user": "-"})
+    assert [type(record) for record in target.buffer] == [type(record) for record in records]
+    assert [record.__dict__ for record in target.buffer] == [record.__dict__ for record in records]
+    assert [formatter.format(record) for record in target.buffer] == [formatter.format(record) for record in records]
+
+
+def test_excepthook_waits_for_the_background_writer():
+    """
+    The program ends right after an unhandled exception, the crash-file has to be written by then
+    """
+    handle_batch = sgl.CrashFileHandler.handle_batch
+
+    def slow_handle_batch(self, records):
+        time.sleep(0.3)
+        handle_batch(self, records)
+
+    logger = logging.getLogger("test_background_writer")
+    logger.propagate = False
+    excepthook = sys.excepthook
+    with tempfile.TemporaryDirectory() as directory, mock.patch.object(sgl.CrashFileHandler, "handle_batch", slow_handle_batch):
+        try:
+            sgl.Configs.exceptions_to_file(
+                Path(directory) / "Crash.log",
+                logger,
+                background_writer=True,
+                reraise=False,
+                include_threads=False,
+                include_tkinter=False,
+            )
+            hook = sys.excepthook
+        finally:
+            sys.excepthook = excepthook
+
+        try:
+            logger.info("Before the crash")
+            try:
+                _divide([1, 0])
+            except ZeroDivisionError:
+                hook(*sys.exc_info())
+
+            written = "".join(file.read_text() for file in Path(directory).glob("Crash*.log"))
+            assert "Before the crash" in written
+            assert "ZeroDivisionError" in written
+        finally:
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
+                handler.close()
+
+
+def test_triggers_after_a_trigger_are_written_in_the_same_flush():
+    def record(level: int, msg: str) -> logging.LogRecord:
+        return logging.LogRecord("test_post_trigger", level, __file__, 0, msg, (), None)
+
+    target = _ListHandler()
+    flushes = []
+    handler = sgl.MemoryHandlerRotatingBuffer(100, target=target, call_after_flushing=lambda: flushes.append(list(target.messages)), post_trigger_records=3)
+    try:
+        for level, msg in ((logging.INFO, "a"), (logging.ERROR, "First"), (logging.INFO, "b"), (logging.ERROR, "Second")):
+            handler.handle(record(level, msg))
+        assert flushes == []
+
+        handler.handle(record(logging.INFO, "c"))   # Third record after the trigger
+        handler.handle(record(logging.INFO, "d"))
+        assert flushes == [["a", "First", "b", "Second", "c"]]
+    finally:
+        handler.close()
+
+    target = _ListHandler()
+    flushes = []
+    handler = sgl.MemoryHandlerRotatingBuffer(100, target=target, call_after_flushing=lambda: flushes.append(list(target.messages)), post_trigger_seconds=0.2)
+    try:
+        for level, msg in ((logging.ERROR, "First"), (logging.INFO, "a"), (logging.ERROR, "Second")):
+            handler.handle(record(level, msg))
+        assert flushes == []
+
+        time.sleep(0.6)
+        assert flushes == [["First", "a", "Second"]]
+        assert handler.stats_snapshot()["flushes"] == 1
+    finally:
+        handler.close()
+
+
+def test_compressed_files_are_kept_within_the_limits():
+    from SwiftGUI_Logging.CrashFileHandler import _read_dump
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        deleted = []
+        retention = sgl.CrashLogRetention(directory / "Crash.manifest", max_files=3, on_delete=deleted.append)
+
+        written = []
+        for compression, suffix in (("gzip", ".log.gz"), ("lzma", ".log.xz")) * 2:
+            handler = sgl.CrashFileHandler(directory / "Crash.log", "_%H-%M-%S-%f", compression=compression, retention=retention)
+            handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+            for n in range(200):
+                handler.handle(logging.LogRecord("test_retention", logging.INFO, __file__, 0, "Repeated line %s", (n,), None))
+            handler.finish_file()
+
+            path = handler._file_path
+            assert path.name.endswith(suffix)
+            with _read_dump(path, "rt") as f:
+                assert f.read() == "".join(f"INFO Repeated line {n}\n" for n in range(200))
+            assert path.stat().st_size < handler.bytes_written / 5    # Repeated lines compress well
+            written.append(path)
+
+        assert retention.files() == written[1:]
+        assert deleted == written[:1]
+        assert sorted(directory.glob("Crash_*")) == sorted(written[1:])
+
+        # Limits are taken from the manifest, also in the next run
+        retention = sgl.CrashLogRetention(directory / "Crash.manifest", max_bytes=written[-1].stat().st_size, on_delete=deleted.append)
+        retention.add(written[-1])
+        assert retention.files() == written[-1:]
+        assert sorted(directory.glob("Crash_*")) == written[-1:]
+
+
+def _crash_record(logger: str, exception: Exception, created: float) -> logging.LogRecord:
+    try:
+        raise exception
+    except Exception:
+        exc_info = sys.exc_info()
+
+    record = logging.LogRecord(logger, logging.ERROR, __file__, 0, "Crashed: %s", (exception,), exc_info)
+    record.created = created
+    return record
+
+
+def test_crash_index_query():
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        index = sgl.CrashIndex(directory / "Crash.sqlite3")
+        handler = sgl.CrashFileHandler(directory / "Crash.log", "_%H-%M-%S-%f", index=index)
+        handler.setFormatter(logging.Formatter("%(name)s %(message)s"))
+        try:
+            crashes = [
+                ("app", ZeroDivisionError("first"), 1000.0),
+                ("app.network", ConnectionError("second"), 2000.0),
+                ("application", ZeroDivisionError("third"), 3000.0),
+                ("app.network.tcp", ZeroDivisionError("fourth"), 4000.0),
+            ]
+            for logger, exception, created in crashes:
+                handler.handle(_crash_record(logger, exception, created))
+            handler.handle(logging.LogRecord("app", logging.INFO, __file__, 0, "Not a crash", (), None))
+            handler.finish_file()
+            path = handler._file_path
+
+            def messages(**conditions) -> list[str]:
+                return [entry.message for entry in index.query(**conditions)]
+
+            assert messages() == ["Crashed: fourth", "Crashed: third", "Crashed: second", "Crashed: first"]
+            assert messages(exception_type="ZeroDivisionError") == ["Crashed: fourth", "Crashed: third", "Crashed: first"]
+            assert messages(logger="app") == ["Crashed: fourth", "Crashed: second", "Crashed: first"]   # Not "application"
+            assert messages(logger="app.network", exception_type="ZeroDivisionError") == ["Crashed: fourth"]
+            assert messages(since=2000.0, until=3000.0) == ["Crashed: third", "Crashed: second"]
+            assert messages(limit=1) == ["Crashed: fourth"]
+            assert messages(module=__name__) == messages()
+            assert messages(level=logging.CRITICAL) == []
+
+            # The offset points at the start of the record in the file
+            text = path.read_text()
+            for entry in index.query():
+                assert entry.file == str(path)
+                assert text[entry.offset:].startswith(f"{entry.logger} {entry.message}")
+
+            index.forget(path)
+            assert index.query() == []
+        finally:
+            handler.close()
+            index.close()
+
+
+def test_max_age_cuts_off_old_records():
+    def record(msg: str, age: float, level: int = logging.INFO) -> logging.LogRecord:
+        record = logging.LogRecord("test_max_age", level, __file__, 0, msg, (), None)
+        record.created = time.time() - age
+        return record
+
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(3, target=target, max_age=10)
+    for msg, age in (("a", 30), ("b", 20), ("c", 5), ("d", 8), ("e", 1)):    # "d" arrives out of order
+        handler.handle(record(msg, age))
+
+    # "a" and "b" are too old, the capacity only leaves room for three
+    assert [item.msg for item in handler.buffer] == ["c", "d", "e"]
+
+    handler.handle(record("Trigger", 0, logging.ERROR))
+    assert target.messages == ["d", "e", "Trigger"]
+    assert handler.stats_snapshot()["records_evicted"] == 3
+
+    # Without new records, the age is checked when the records are read
+    handler = sgl.MemoryHandlerRotatingBuffer(10, target=target, max_age=0.3, max_bytes=100_000)
+    handler.handle(record("Old", 0))
+    time.sleep(0.5)
+    assert handler.snapshot() == []
+
+    target.messages.clear()
+    handler.flush()
+    assert target.messages == []
+
+
+def test_sinks_share_one_buffer_and_one_hook():
+    root = logging.getLogger()
+    buffer = sgl.SharedCaptureBuffer(100)
+    root.addHandler(buffer)
+    hooks = sys.excepthook, threading.excepthook
+
+    targets = {name: _ListHandler() for name in ("db", "ui", "quiet")}
+    buffer.add_sink(sgl.CaptureSink("test_sinks.db", logging.INFO, target=targets["db"]))
+    buffer.add_sink(sgl.CaptureSink("test_sinks.ui", logging.WARNING, target=targets["ui"]))
+    buffer.add_sink(sgl.CaptureSink("test_sinks.quiet", logging.INFO, target=targets["quiet"], catch_exceptions=False))
+    for name in ("db", "ui", "quiet"):
+        logging.getLogger(f"test_sinks.{name}").setLevel(logging.INFO)
+    try:
+        logging.getLogger("test_sinks.db").info("db 1")
+        logging.getLogger("test_sinks.ui").info("ui info")     # Below the level of its sink
+        logging.getLogger("test_sinks.ui.dialog").warning("ui 1")
+        logging.getLogger("test_sinks.quiet").info("quiet 1")
+        logging.getLogger("test_sinks_elsewhere").error("Elsewhere")    # No sink is interested, nothing is flushed
+
+        logging.getLogger("test_sinks.db.connection").error("db failed")
+        assert targets["db"].messages == ["db 1", "db failed"]
+        assert targets["ui"].messages == targets["quiet"].messages == []
+
+        catch = buffer.catch_exceptions(include_tkinter=False)
+        hook = sys.excepthook
+        assert buffer.catch_exceptions(include_tkinter=False) is catch
+        assert sys.excepthook is hook   # Installed only once, no matter how many sinks there are
+
+        try:
+            _divide([1, 0])
+        except ZeroDivisionError:
+            hook(*sys.exc_info())
+
+        # The exception is logged once and flushes every sink that catches exceptions
+        assert len(targets["db"].messages) == 3 and "ZeroDivisionError" in targets["db"].messages[2]
+        assert targets["ui"].messages[0] == "ui 1"
+        assert len(targets["ui"].messages) == 2 and "ZeroDivisionError" in targets["ui"].messages[1]
+        assert targets["quiet"].messages == []
+        assert sum(item.name == "SwiftGUI_Logging.exceptions" for item in buffer.buffer) == 1
+    finally:
+        sys.excepthook, threading.excepthook = hooks
+        root.removeHandler(buffer)
+        buffer.close()
+
+
+def test_max_bytes_evicts_the_oldest_records():
+    from SwiftGUI_Logging.MemoryHandlerRotatingBuffer import _approximate_size, _record_overhead
+
+    def record(n: int, length: int = 1000) -> logging.LogRecord:
+        return logging.LogRecord("test_max_bytes", logging.INFO, __file__, 0, f"{n:04} " + "x" * length, (), None)
+
+    size = _approximate_size(record(0), _record_overhead)
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(100, target=target, max_bytes=size * 3 + size // 2)
+
+    for n in range(10):
+        handler.handle(record(n))
+    assert [item.msg[:4] for item in handler.buffer] == ["0007", "0008", "0009"]
+    assert handler._bytes == size * 3
+
+    # The newest record is always kept, even if it alone is too big
+    handler.handle(record(10, length=10 * size))
+    assert [item.msg[:4] for item in handler.buffer] == ["0010"]
+
+    handler.handle(record(11))
+    assert [item.msg[:4] for item in handler.buffer] == ["0011"]
+    assert handler.stats_snapshot()["records_evicted"] == 11
+
+    # The capacity drops records too, their size must be subtracted
+    handler = sgl.MemoryHandlerRotatingBuffer(2, target=target, max_bytes=size * 100)
+    for n in range(5):
+        handler.handle(record(n))
+    assert handler._bytes == size * 2
+
+    handler.handle(logging.LogRecord("test_max_bytes", logging.ERROR, __file__, 0, "Trigger", (), None))
+    assert [message[:4] for message in target.messages] == ["0004", "Trig"]
+    assert handler._bytes == 0
+
+
+def test_truncating_a_broken_message_doesnt_raise():
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(10, target=target, max_bytes=100_000, truncate_message=10)
+    logger = logging.getLogger("test_truncate")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        logger.debug("%d " + "x" * 100, "notanint")
+        logger.debug("y" * 100)
+        assert handler.stats_snapshot()["records_buffered"] == 2
+    finally:
+        logger.removeHandler(handler)
+
+
+class _TcpCollectorStandIn(socketserver.BaseRequestHandler):
+    """
+    Local stand-in for a crash-collector that speaks the tcp:// protocol.
+    answers says what to do with each batch, in order:
+    "ack", "wrong" (answer something else), "silent" (don't answer) or "drop" (close the connection).
+    Once they are used up, every batch is acknowledged.
+    """
+    answers = []
+    received = []
+
+    def _read(self, length: int) -> bytes | None:
+        data = b""
+        while len(data) < length:
+            chunk = self.request.recv(length - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        while True:
+            header = self._read(_TCP_HEADER.size)
+            if header is None:
+                return
+            compressed, length = _TCP_HEADER.unpack(header)
+            batch = self._read(length)
+            if batch is None:
+                return
+
+            answer = self.answers.pop(0) if self.answers else "ack"
+            if answer == "drop":
+                return
+            if answer == "silent":
+                self.request.recv(1)    # Until the shipper gives up and disconnects
+                return
+            if answer == "wrong":
+                self.request.sendall(b"\x15")
+                continue
+
+            self.received.extend(sgl.decode_crash_batch(batch, bool(compressed)))
+            self.request.sendall(_TCP_ACK)
+
+
+def _ship_over_tcp(directory: Path, files: dict[str, bytes], answers: list[str]) -> sgl.CrashDumpShipper:
+    """
+    Ship the files to a _TcpCollectorStandIn and wait until the spool is empty
+    """
+    _TcpCollectorStandIn.answers = list(answers)
+    _TcpCollectorStandIn.received = []
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _TcpCollectorStandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    shipper = sgl.CrashDumpShipper(
+        f"tcp://127.0.0.1:{server.server_address[1]}",
+        directory / "spool",
+        timeout=0.5,
+        retry_delay=0.01,
+        max_retry_delay=0.01,
+    )
+    try:
+        for name, content in files.items():
+            (directory / name).write_bytes(content)
+            shipper.add(directory / name)
+
+        assert shipper.flush(10), "The spool wasn't emptied"
+    finally:
+        shipper.close()
+        server.shutdown()
+        server.server_close()
+
+    return shipper
+
+
+def test_crash_dumps_are_shipped_over_tcp():
+    files = {f"Crash_{i}.log": f"Dump {i}\n".encode() * 100 for i in range(3)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        shipper = _ship_over_tcp(directory, files, [])
+
+        assert sorted(_TcpCollectorStandIn.received) == sorted(files.items())
+        assert shipper.sent == 3 and shipper.failures == 0
+        assert not list((directory / "spool").iterdir())
+        assert all((directory / name).exists() for name in files)   # The originals are left alone
+
+
+def test_crash_dumps_are_shipped_again_until_confirmed():
+    files = {"Crash.log": b"Dump\n" * 100}
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        shipper = _ship_over_tcp(directory, files, ["wrong", "drop", "silent"])
+
+        assert _TcpCollectorStandIn.received == list(files.items())
+        assert shipper.sent == 1 and shipper.failures == 3
+        assert not list((directory / "spool").iterdir())
+
+
+def test_closed_handler_is_left_alone():
+    """
+    Neither the post-trigger timer nor the exit-hooks may flush a closed handler, or keep it alive
+    """
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(10, target=target, post_trigger_seconds=0.2, post_trigger_records=100)
+    handler.report_stats(0.05, lambda snapshot: None)
+
+    handler.handle(logging.makeLogRecord({"msg": "Before", "levelno": logging.INFO}))
+    handler.handle(logging.makeLogRecord({"msg": "Trigger", "levelno": logging.ERROR}))
+    handler.close()
+    assert target.messages == ["Before", "Trigger"]     # The open window is written when closing
+
+    handler.handle(logging.makeLogRecord({"msg": "After closing", "levelno": logging.ERROR}))
+    time.sleep(0.5)
+    assert target.messages == ["Before", "Trigger"]
+
+    reference = weakref.ref(handler)
+    del handler
+    gc.collect()
+    assert reference() is None
+
+
+def test_summaries_stop_when_closed():
+    target = _ListHandler()
+    handler = sgl.MemoryHandlerRotatingBuffer(
+        10,
+        target=target,
+        deduplicator=sgl.TriggerDeduplicator(0.1, summary_interval=0.05),
+    )
+    logger = logging.getLogger("test_summary_close")
+    logger.propagate = False
+    logger.addHandler(handler)
+    _error_storm(logger)
+    logger.removeHandler(handler)
+    handler.close()
+
+    time.sleep(0.5)
+    assert not any(message.startswith("Suppressed") for message in target.messages)
+
+    reference = weakref.ref(handler)
+    del handler
+    gc.collect()
+    assert reference() is None
+
+
+class _Shown:
+    def __str__(self):
+        return "shown with str"
+
+    def __repr__(self):
+        return "shown with repr"
+
+
+def _binary_test_records() -> list[logging.LogRecord]:
+    try:
+        _divide([1, 0])
+    except ZeroDivisionError:
+        exc_info = sys.exc_info()
+
+    records = []
+    for name, level, msg, args, record_exc_info in (
+            ("app", logging.DEBUG, "plain", (), None),
+            ("app", logging.INFO, "obj %s / %r", (_Shown(), _Shown()), None),
+            ("app.db", logging.INFO, "dec %d, %.2f, %5s", (Decimal(7), Decimal("1.5"), True), None),
+            ("app.db", logging.WARNING, "mapping %(count)d %(what)s", ({"count": Decimal(3), "what": _Shown()},), None),
+            ("app.db", logging.WARNING, "native %s %d %.3f %x %r", ("text", 2 ** 70, 0.5, 255, "quoted"), None),
+            ("other", logging.ERROR, "failed %s", ("badly",), exc_info),
+    ):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, record_exc_info)
+        record.created = 1_700_000_000.25 + len(records)
+        record.msecs = 250.0
+        records.append(record)
+
+    return records
+
+
+def test_binary_dump_renders_like_the_text_handler():
+    fmt = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        text_handler = sgl.CrashFileHandler(directory / "text.log")
+        binary_handler = sgl.BinaryCrashFileHandler(directory / "binary.sgl")
+        for handler in (text_handler, binary_handler):
+            handler.setFormatter(logging.Formatter(fmt))
+            for record in _binary_test_records():
+                handler.handle(record)
+            handler.finish_file()
+
+        expected = next(directory.glob("text*.log")).read_text()
+        binary = next(directory.glob("binary*.sgl"))
+
+        output = io.StringIO()
+        assert sgl.render_binary_dump(binary, output) == 6
+        assert output.getvalue() == expected
+        assert "shown with str / shown with repr" in expected and "dec 7, 1.50,  True" in expected
+
+        filtered = sgl.iter_binary_dump(binary, level="warning", loggers=["app"], since=1_700_000_003)
+        assert [record.getMessage() for record in filtered] == ["mapping 3 shown with str", "native text 1180591620717411303424 0.500 ff 'quoted'"]
+
+
+def test_spool_is_limited_without_listing_it():
+    """
+    add runs on the crash-path, while the collector is likely down and the spool full
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        with socketserver.TCPServer(("127.0.0.1", 0), socketserver.BaseRequestHandler) as server:
+            port = server.server_address[1]     # Nobody listens on it afterwards
+
+        shipper = sgl.CrashDumpShipper(f"tcp://127.0.0.1:{port}", directory / "spool", max_spool_files=3, max_spool_bytes=250, retry_delay=10)
+        try:
+            with mock.patch.object(Path, "glob", side_effect=AssertionError("The spool was listed")):
+                for i in range(5):
+                    (directory / f"Crash_{i}.log").write_bytes(b"x" * 100)
+                    shipper.add(directory / f"Crash_{i}.log")
+
+            assert shipper.dropped == 3     # 250 bytes only fit two dumps
+            assert sorted(file.name.split("-", 2)[2] for file in (directory / "spool").iterdir()) == ["Crash_3.log.spool", "Crash_4.log.spool"]
+        finally:
+            shipper.close()
+
+        # The next run finds the rest
+        shipper = sgl.CrashDumpShipper(f"tcp://127.0.0.1:{port}", directory / "spool", max_spool_files=1, retry_delay=10)
+        try:
+            (directory / "Crash_5.log").write_bytes(b"x")
+            shipper.add(directory / "Crash_5.log")
+            assert shipper.dropped == 2
+        finally:
+            shipper.close()
+
+
+if __name__ == '__main__':
+    for name, function in list(globals().items()):
+        if name.startswith("test_") and callable(function):
+            try:
+                function()
+            except pytest.skip.Exception as ex:
+                print(f"{name}: skipped ({ex.msg})")
+            else:
+                print(f"{name}: ok")